@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from app.api.jobs import KIND_CSV, JobStore
+from app.core.analytics import AggregateState
+from app.core.config import CSV_CHUNK_ROWS, DATE_COL, PRED_LABEL_COL, TEXT_COL
+from app.core.io import iter_csv, read_columns, read_rows
+from app.core.preprocess import clean_df, iter_clean, set_predictions
+from app.core.store import FeedbackStore
+
+logger = logging.getLogger(__name__)
+
+# ジョブごとの集計結果（JobStore のディレクトリに <job_id>.analysis.json として保存）
+ANALYSIS_FILE = "analysis.json"
+
+
+def _series(s: pd.Series) -> Dict[str, list]:
+    return {"index": s.index.tolist(), "data": s.tolist()}
+
+
+def _frame(df: pd.DataFrame) -> Dict[str, list]:
+    return {"index": df.index.tolist(), "columns": df.columns.tolist(), "data": df.to_numpy().tolist()}
+
+
+def _file_digest(path: str, block: int = 1 << 24) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(block)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+class Analyzer:
+    """
+    Server-side dashboard aggregates for CSV jobs submitted via /analyze.
+
+    After the job's rows are scored, `run` re-reads the spooled CSV in
+    chunks, attaches the stored predictions and builds department counts,
+    the score histogram, department x sentiment counts, sentiment totals and
+    the top word-cloud tokens. The result is a small JSON document kept next
+    to the job, so clients fetch kilobytes instead of the scored corpus.
+    Rows with a date are also ingested into the FeedbackStore (once per
+    file content). Preview pages and the scored CSV are read lazily from the
+    same spooled input. Word-cloud tokens are counted on one process pool
+    per run (token_workers processes, 1 = in this process).
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        feedback: Optional[FeedbackStore] = None,
+        top_words: int = 200,
+        chunk_rows: int = CSV_CHUNK_ROWS,
+        token_workers: Optional[int] = None,
+    ):
+        self.store = store
+        self.feedback = feedback
+        self.top_words = top_words
+        self.chunk_rows = chunk_rows
+        self.token_workers = token_workers if token_workers is not None else (os.cpu_count() or 1)
+
+    def _input(self, job: Dict[str, Any]) -> str:
+        if job["kind"] != KIND_CSV:
+            raise ValueError("CSV で登録したジョブではありません。")
+        return str(self.store.input_path(job["id"], job["kind"]))
+
+    def iter_scored(self, job: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+        """Cleaned chunks of the job's CSV with the prediction columns from the job results."""
+        offset = 0
+        for chunk in iter_clean(iter_csv(self._input(job), chunksize=self.chunk_rows)):
+            labels, scores = self.store.results(job["id"], offset, len(chunk))
+            if len(labels) != len(chunk):
+                raise RuntimeError(f"推論結果が不足しています: offset={offset}, 行数={len(chunk)}, 結果={len(labels)}")
+            set_predictions(chunk, labels, scores)
+            offset += len(chunk)
+            yield chunk
+
+    def run(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Build and save the aggregates of a scored job (called by JobManager before it is marked done)."""
+        from app.core.wordclouds import count_tokens, token_pool
+
+        t0 = time.perf_counter()
+        path = self._input(job)
+        columns = read_columns(path)
+        ingest = self.feedback is not None and DATE_COL in columns
+        source = f"csv:{_file_digest(path)}:{self.chunk_rows}" if ingest else None
+
+        state = AggregateState()
+        words: Counter = Counter()
+        stored = 0
+        # 分かち書きのプロセスプールは集計 1 回につき 1 つだけ作り、全チャンクで使い回す
+        # （ワーカーは初回の使用時に spawn で起動する）
+        pool = token_pool(self.token_workers) if self.token_workers > 1 else None
+        with pool or nullcontext():
+            for i, chunk in enumerate(self.iter_scored(job)):
+                state.update(chunk)
+                words += count_tokens(chunk[TEXT_COL], workers=1, pool=pool)
+                if ingest:
+                    # 同じ内容のファイルはチャンク単位で一度だけ取り込む（再開・再アップロード対策）
+                    stored += self.feedback.ingest(chunk, source=f"{source}:{i}")
+
+        pivot = state.pivot_dept_sentiment()
+        counts, edges = state.score_hist()
+        sentiment = (
+            pivot.sum(axis=0).sort_values(ascending=False, kind="stable")
+            if not pivot.empty else pd.Series(dtype="int64")
+        )
+        sentiment.index.name = PRED_LABEL_COL
+        result = {
+            "rows": state.n_rows,
+            "columns": sorted(columns),
+            "dept_counts": _series(state.dept_counts()),
+            "sentiment_counts": _series(sentiment),
+            "pivot_dept_sentiment": _frame(pivot),
+            "score_hist": {"counts": [int(c) for c in counts], "edges": [float(e) for e in edges]},
+            "words": words.most_common(self.top_words),
+            "stored": stored,
+            "seconds": round(time.perf_counter() - t0, 2),
+        }
+
+        out = self.store.artifact_path(job["id"], ANALYSIS_FILE)
+        tmp = out.with_suffix(".part")
+        tmp.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, out)
+        logger.info(
+            "集計完了: id=%s, 行数=%d, 語彙数=%d, ストア取り込み=%d, sec=%.2f",
+            job["id"], state.n_rows, len(words), stored, result["seconds"],
+        )
+        return result
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self.store.artifact_path(job_id, ANALYSIS_FILE)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def rows(self, job: Dict[str, Any], offset: int, limit: int) -> pd.DataFrame:
+        """
+        Scored rows [offset, offset + limit) for a preview page.
+
+        Only the requested rows are parsed; while the job is still running
+        the page is cut at the last row that already has a prediction.
+        """
+        df = clean_df(read_rows(self._input(job), offset, limit))
+        labels, scores = self.store.results(job["id"], offset, len(df))
+        return set_predictions(df.head(len(labels)).copy(deep=False), labels, scores)
+
+    def iter_csv_bytes(self, job: Dict[str, Any]) -> Iterator[bytes]:
+        """Scored CSV (utf-8 with BOM, as the UI download used to produce) chunk by chunk."""
+        for i, chunk in enumerate(self.iter_scored(job)):
+            text = chunk.to_csv(index=False, header=(i == 0))
+            yield (("\ufeff" if i == 0 else "") + text).encode("utf-8")
+
+
+def preview_page(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    """Preview rows as {"columns": [...], "data": [[...], ...]} (NaN -> null)."""
+    page = json.loads(df.to_json(orient="split", index=False, force_ascii=False))
+    return {"columns": page["columns"], "data": page["data"]}
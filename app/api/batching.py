@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple
+
+from app.core.profiling import profile
+
+if TYPE_CHECKING:
+    from app.core.sentiment import SentimentService
+
+logger = logging.getLogger(__name__)
+
+Result = Tuple[List[str], List[Optional[float]]]
+
+
+class BatchRequest(NamedTuple):
+    """One caller's texts and rule options (picklable, sent to inference worker processes as is)."""
+    texts: List[str]
+    depts: List[str]
+    use_dept_rules: bool
+    sort_by_length: bool
+    rules_first: bool
+    profile: Optional[str] = None     # trace id when this request asked for a profile
+
+
+@dataclass
+class _Pending:
+    request: BatchRequest
+    future: asyncio.Future
+
+
+def predict_group(
+    svc: "SentimentService",
+    requests: List[BatchRequest],
+    batch_size: Optional[int] = None,
+    max_length: int = 256,
+) -> List[Result]:
+    """
+    Run several callers' texts as one predict_raw_collapsed call and apply each caller's rules to its slice.
+
+    When a request carries a trace id the whole group is profiled (the trace
+    therefore also contains the requests it was batched with). The group is
+    logged like one predict_batch call (completion line, empty-text warning).
+    """
+    names = [r.profile for r in requests if r.profile]
+    meta = {"requests": len(requests), "texts": sum(len(r.texts) for r in requests)}
+    with profile(names, meta):
+        return _predict_group(svc, requests, batch_size, max_length)
+
+
+def _predict_group(
+    svc: "SentimentService",
+    requests: List[BatchRequest],
+    batch_size: Optional[int],
+    max_length: int,
+) -> List[Result]:
+    from app.core.sentiment import BatchStats, log_completion
+
+    t0 = time.perf_counter()
+    stats = BatchStats()
+    # rules_first のリクエストは、ルールでラベルが確定しない行だけをモデルに送る
+    splits = [svc.split_rule_decided(r.texts) if r.rules_first else None for r in requests]
+    texts = [
+        t
+        for r, split in zip(requests, splits)
+        for t in (r.texts if split is None else [r.texts[i] for i in split[1]])
+    ]
+    # 近似重複の集約（NEAR_DUP_THRESHOLD）は CLI と同じく API のバッチにも適用する
+    raw_labels, scores = svc.predict_raw_collapsed(
+        texts,
+        batch_size=batch_size,
+        max_length=max_length,
+        sort_by_length=all(r.sort_by_length for r in requests),
+        stats=stats,
+    )
+    stats.rule_decided = sum(len(r.texts) - len(split[1]) for r, split in zip(requests, splits) if split is not None)
+    stats.n_rows += stats.rule_decided
+
+    # 呼び出し元ごとにスライスし、ルールは各リクエストの設定で適用
+    results = []
+    offset = 0
+    for r, split in zip(requests, splits):
+        if split is None:
+            end = offset + len(r.texts)
+            sl_scores = scores[offset:end]
+            labels = svc.apply_rules(r.texts, raw_labels[offset:end], r.depts, sl_scores, r.use_dept_rules)
+            results.append((labels, sl_scores))
+        else:
+            decided, todo = split
+            end = offset + len(todo)
+            results.append(svc.apply_rules_first(
+                r.texts, r.depts, decided, todo,
+                raw_labels[offset:end], scores[offset:end], r.use_dept_rules,
+            ))
+        offset = end
+
+    svc.last_stats = stats
+    log_completion(
+        [t for r in requests for t in r.texts],
+        [label for labels, _ in results for label in labels],
+        stats,
+        time.perf_counter() - t0,
+    )
+    return results
+
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests and runs them as one forward pass.
+
+    A batch is flushed when it reaches max_batch_size texts or when the
+    oldest queued request has waited max_wait_ms. Inference runs on a single
+    worker thread so the event loop keeps accepting requests meanwhile.
+
+    svc may be None at construction (model still loading in the background);
+    it must be set before the first submit. When svc is a ModelPool (it has
+    `dispatch`), each flushed batch is handed to the pool without waiting,
+    so several replicas work on consecutive batches at the same time.
+    """
+
+    def __init__(
+        self,
+        svc: Optional["SentimentService"],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        batch_size: Optional[int] = None,
+        max_length: int = 256,
+    ):
+        self.svc = svc
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "マイクロバッチ開始: max_batch_size=%d, max_wait_ms=%.1f",
+            self.max_batch_size, self.max_wait_ms
+        )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(
+        self,
+        texts: List[str],
+        depts: List[str],
+        use_dept_rules: bool,
+        sort_by_length: bool = True,
+        rules_first: bool = False,
+        profile: Optional[str] = None,
+    ) -> Tuple[List[str], List[Optional[float]]]:
+        if not texts:
+            return [], []
+        if self._queue is None or self.svc is None:
+            raise RuntimeError("MicroBatcher is not started")
+        fut = asyncio.get_running_loop().create_future()
+        request = BatchRequest(texts, depts, use_dept_rules, sort_by_length, rules_first, profile)
+        await self._queue.put(_Pending(request, fut))
+        return await fut
+
+    async def _collect(self) -> List[_Pending]:
+        first = await self._queue.get()
+        batch = [first]
+        n = len(first.request.texts)
+
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while n < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            n += len(item.request.texts)
+        return batch
+
+    def _predict(self, batch: List[_Pending]) -> List[Result]:
+        return predict_group(
+            self.svc, [p.request for p in batch], batch_size=self.batch_size, max_length=self.max_length
+        )
+
+    @staticmethod
+    def _fail(batch: List[_Pending], error: BaseException) -> None:
+        for p in batch:
+            if not p.future.done():
+                p.future.set_exception(error)
+
+    @staticmethod
+    def _finish(batch: List[_Pending], results: List[Result], t0: float) -> None:
+        for p, res in zip(batch, results):
+            if not p.future.done():
+                p.future.set_result(res)
+
+        logger.debug(
+            "マイクロバッチ完了: requests=%d, texts=%d, sec=%.3f",
+            len(batch), sum(len(p.request.texts) for p in batch), time.perf_counter() - t0
+        )
+
+    def _on_dispatched(self, batch: List[_Pending], t0: float, fut: asyncio.Future) -> None:
+        if fut.cancelled():
+            self._fail(batch, asyncio.CancelledError())
+        elif fut.exception() is not None:
+            logger.error("マイクロバッチ推論に失敗しました: requests=%d, error=%r", len(batch), fut.exception())
+            self._fail(batch, fut.exception())
+        else:
+            self._finish(batch, fut.result(), t0)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [p for p in batch if not p.future.cancelled()]
+            if not batch:
+                continue
+
+            t0 = time.perf_counter()
+            dispatch = getattr(self.svc, "dispatch", None)
+            if dispatch is not None:
+                # 推論ワーカープロセスに渡し、結果を待たずに次のバッチを集める
+                fut = asyncio.wrap_future(dispatch(
+                    [p.request for p in batch], batch_size=self.batch_size, max_length=self.max_length
+                ))
+                fut.add_done_callback(functools.partial(self._on_dispatched, batch, t0))
+                continue
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._predict, batch)
+            except Exception as e:
+                logger.exception("マイクロバッチ推論に失敗しました: requests=%d", len(batch))
+                self._fail(batch, e)
+                continue
+            self._finish(batch, results, t0)
@@ -0,0 +1,415 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.metrics import JOBS_FINISHED, JOBS_QUEUED
+from app.core.transport import iter_request_batches, iter_request_stream
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# 入力の種類：texts（Arrow IPC で保存）/ csv（アップロードされた CSV をそのまま保存）
+KIND_TEXTS = "texts"
+KIND_CSV = "csv"
+_SUFFIX = {KIND_TEXTS: ".arrow", KIND_CSV: ".csv"}
+
+Predict = Callable[..., Awaitable[Tuple[List[str], List[Optional[float]]]]]
+
+
+class JobStore:
+    """
+    SQLite-backed job metadata and per-chunk results.
+
+    Inputs are kept as files next to the database (root/<job_id>.arrow or
+    .csv), so queued and running jobs can be resumed after a restart from
+    the last stored chunk.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "jobs.sqlite3"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, key TEXT, kind TEXT NOT NULL, status TEXT NOT NULL,"
+            " options TEXT NOT NULL, total INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0,"
+            " chunks_done INTEGER NOT NULL DEFAULT 0, error TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs(key)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " job_id TEXT NOT NULL, idx INTEGER NOT NULL, start INTEGER NOT NULL, n INTEGER NOT NULL,"
+            " labels TEXT NOT NULL, scores TEXT NOT NULL, PRIMARY KEY (job_id, idx))"
+        )
+        self._conn.commit()
+
+    def input_path(self, job_id: str, kind: str) -> Path:
+        return self.root / f"{job_id}{_SUFFIX[kind]}"
+
+    def artifact_path(self, job_id: str, name: str) -> Path:
+        """Extra file kept with a job (removed together with it by delete)."""
+        return self.root / f"{job_id}.{name}"
+
+    def spool(self):
+        """Temporary file on the same filesystem as the inputs (moved into place by create)."""
+        return tempfile.NamedTemporaryFile(dir=self.root, suffix=".part", delete=False)
+
+    def create(self, kind: str, source: Path, total: int, options: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        os.replace(source, self.input_path(job_id, kind))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, key, kind, status, options, total, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, kind, QUEUED, json.dumps(options), total, time.time()),
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def find_by_key(self, key: str) -> Optional[Dict[str, Any]]:
+        """Latest job submitted with `key` that has not failed or been cancelled."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status NOT IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                (key, FAILED, CANCELLED),
+            ).fetchone()
+        return self._row(row)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row(r) for r in rows]
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            if status == RUNNING:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (status, now, job_id),
+                )
+            elif status in FINISHED:
+                # 完了時は推定行数（CSV）を実際の行数に置き換える
+                total = "done" if status == DONE else "total"
+                self._conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, finished_at = ?, total = {total}"
+                    " WHERE id = ? AND status NOT IN (?, ?, ?)",
+                    (status, error, now, job_id, *FINISHED),
+                )
+            else:
+                self._conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (status, job_id))
+            self._conn.commit()
+
+    def add_chunk(self, job_id: str, idx: int, start: int, labels: List[str], scores: List[Optional[float]]) -> bool:
+        """Store one chunk and advance progress atomically; False if the job was cancelled meanwhile."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET done = ?, chunks_done = ? WHERE id = ? AND status = ?",
+                (start + len(labels), idx + 1, job_id, RUNNING),
+            )
+            if cur.rowcount == 0:
+                self._conn.rollback()
+                return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (job_id, idx, start, n, labels, scores) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, idx, start, len(labels), json.dumps(labels, ensure_ascii=False), json.dumps(scores)),
+            )
+            self._conn.commit()
+        return True
+
+    def results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[str], List[Optional[float]]]:
+        """Labels / scores of rows [offset, offset + limit) that are already stored."""
+        end = offset + limit if limit is not None else 1 << 62
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start, labels, scores FROM chunks"
+                " WHERE job_id = ? AND start + n > ? AND start < ? ORDER BY idx",
+                (job_id, offset, end),
+            ).fetchall()
+        labels: List[str] = []
+        scores: List[Optional[float]] = []
+        for r in rows:
+            lo = max(offset - r["start"], 0)
+            hi = end - r["start"]
+            labels.extend(json.loads(r["labels"])[lo:hi])
+            scores.extend(json.loads(r["scores"])[lo:hi])
+        return labels, scores
+
+    def delete(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+        # 入力ファイルと、付随するファイル（/analyze の集計結果など）
+        for path in self.root.glob(f"{job_id}.*"):
+            path.unlink(missing_ok=True)
+
+    def purge(self, older_than_hours: float) -> int:
+        """Delete finished jobs older than the retention period; return how many."""
+        cutoff = time.time() - older_than_hours * 3600
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?", (*FINISHED, cutoff)
+            ).fetchall()
+        for r in rows:
+            self.delete(r["id"])
+        # 異常終了で残った一時ファイル
+        for part in self.root.glob("*.part"):
+            part.unlink(missing_ok=True)
+        return len(rows)
+
+
+class JobManager:
+    """
+    Runs submitted jobs chunk by chunk on a pool of worker threads.
+
+    Each chunk goes through `predict` (normally MicroBatcher.submit) on the
+    API event loop, so jobs share the single inference thread and batch
+    together with live /predict traffic. Progress and results are written to
+    the JobStore after every chunk; on start, queued and running jobs left
+    over from a previous process are resumed after their last stored chunk.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        predict: Predict,
+        wait_ready: Callable[[], bool],
+        workers: int = 2,
+        chunk_rows: int = 1000,
+        retention_hours: float = 168.0,
+        finalize: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.store = store
+        self.predict = predict
+        self.wait_ready = wait_ready
+        self.finalize = finalize
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.retention_hours = retention_hours
+
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = threading.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        purged = self.store.purge(self.retention_hours)
+        resumed = self.store.unfinished()
+        for job_id in resumed:
+            self._enqueue(job_id)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(
+            "ジョブワーカー開始: workers=%d, chunk_rows=%d, 再開=%d, 期限切れ削除=%d",
+            self.workers, self.chunk_rows, len(resumed), purged,
+        )
+
+    def stop(self) -> None:
+        # 実行中のチャンクが終わった時点で停止し、未完了のジョブは次回起動時に再開する
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+    def _enqueue(self, job_id: str) -> None:
+        JOBS_QUEUED.inc()
+        self._queue.put(job_id)
+
+    def submit_texts(
+        self,
+        texts: List[str],
+        depts: List[str],
+        use_dept_rules: bool = False,
+        rules_first: bool = False,
+        key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        with self.store.spool() as f:
+            for part in iter_request_stream(texts, depts, rows_per_batch=self.chunk_rows):
+                f.write(part)
+        options = {"use_dept_rules": use_dept_rules, "rules_first": rules_first, "chunk_rows": self.chunk_rows}
+        return self._create(KIND_TEXTS, Path(f.name), len(texts), options, key)
+
+    def submit_csv(
+        self,
+        path: Path,
+        use_dept_rules: Optional[bool] = None,
+        rules_first: bool = False,
+        key: Optional[str] = None,
+        analyze: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Queue a spooled CSV; use_dept_rules=None enables them when the
+        department column exists. With analyze=True, `finalize` runs on the
+        scored rows before the job is marked done.
+        """
+        from app.core.config import DEPT_COL
+        from app.core.io import count_rows, read_columns
+
+        try:
+            cols = read_columns(path)
+        except Exception:
+            path.unlink(missing_ok=True)
+            raise
+        if use_dept_rules is None:
+            use_dept_rules = DEPT_COL in cols
+        options = {"use_dept_rules": use_dept_rules, "rules_first": rules_first, "chunk_rows": self.chunk_rows}
+        if analyze:
+            options["analyze"] = True
+        return self._create(KIND_CSV, path, count_rows(path), options, key)
+
+    def _create(self, kind: str, source: Path, total: int, options: Dict[str, Any], key: Optional[str]) -> Dict[str, Any]:
+        job = self.store.create(kind, source, total, options, key)
+        self._enqueue(job["id"])
+        logger.info("ジョブ登録: id=%s, kind=%s, 行数=%d, options=%s", job["id"], kind, total, options)
+        return job
+
+    def cancel(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is not None and job["status"] not in FINISHED:
+            self.store.set_status(job_id, CANCELLED)
+            JOBS_FINISHED.labels(CANCELLED).inc()
+
+    def _iter_chunks(self, job: Dict[str, Any]) -> Iterator[Tuple[List[str], List[str]]]:
+        path = self.store.input_path(job["id"], job["kind"])
+        skip = job["chunks_done"]
+        if job["kind"] == KIND_TEXTS:
+            # 1 レコードバッチ = 1 チャンク
+            with open(path, "rb") as f:
+                for i, (texts, depts) in enumerate(iter_request_batches(f)):
+                    if i >= skip:
+                        yield texts, depts
+            return
+
+        from app.core.config import DEPT_COL, TEXT_COL
+        from app.core.io import iter_csv
+        from app.core.preprocess import iter_clean
+
+        chunks = (
+            c for i, c in enumerate(iter_csv(str(path), chunksize=job["options"]["chunk_rows"])) if i >= skip
+        )
+        for chunk in iter_clean(chunks):
+            yield chunk[TEXT_COL].tolist(), chunk[DEPT_COL].tolist()
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            JOBS_QUEUED.inc(-1)
+            if self._stopping.is_set():
+                continue
+            try:
+                self._run(job_id)
+            except Exception as e:
+                if self._stopping.is_set():
+                    # 停止中に中断されたチャンクは次回起動時にやり直す
+                    logger.info("停止のためジョブを中断しました: id=%s", job_id)
+                    continue
+                logger.exception("ジョブの実行に失敗しました: id=%s", job_id)
+                self.store.set_status(job_id, FAILED, error=f"{type(e).__name__}: {e}")
+                JOBS_FINISHED.labels(FAILED).inc()
+
+    def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return
+        if not self.wait_ready():
+            raise RuntimeError("モデルの読み込みに失敗したため、ジョブを実行できません。")
+
+        self.store.set_status(job_id, RUNNING)
+        opts = job["options"]
+        idx, start = job["chunks_done"], job["done"]
+        t0 = time.perf_counter()
+        for texts, depts in self._iter_chunks(job):
+            if self._stopping.is_set():
+                return
+            fut = asyncio.run_coroutine_threadsafe(
+                self.predict(texts, depts, use_dept_rules=opts["use_dept_rules"], rules_first=opts["rules_first"]),
+                self._loop,
+            )
+            labels, scores = fut.result()
+            if not self.store.add_chunk(job_id, idx, start, labels, scores):
+                logger.info("ジョブは取り消されました: id=%s, 処理済み=%d", job_id, start)
+                return
+            idx += 1
+            start += len(labels)
+
+        if opts.get("analyze") and self.finalize is not None:
+            # 集計中に停止した場合は、次回起動時に集計からやり直す（推論は済んでいるため再実行しない）
+            self.finalize(self.store.get(job_id))
+
+        self.store.set_status(job_id, DONE)
+        JOBS_FINISHED.labels(DONE).inc()
+        logger.info("ジョブ完了: id=%s, 行数=%d, sec=%.2f", job_id, start, time.perf_counter() - t0)
+
+
+def job_info(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job row: progress, throughput and ETA."""
+    total, done = job["total"], job["done"]
+    out: Dict[str, Any] = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "kind": job["kind"],
+        "total": total,
+        "done": done,
+        "progress": 1.0 if job["status"] == DONE else min(done / total, 1.0) if total else 0.0,
+        "options": job["options"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["started_at"] and done:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+        rate = done / elapsed if elapsed > 0 else 0.0
+        out["rows_per_sec"] = round(rate, 1)
+        if job["status"] == RUNNING and rate:
+            out["eta_seconds"] = round(max(total - done, 0) / rate, 1)
+    if job["error"]:
+        out["error"] = job["error"]
+    return out
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from app.core.sentiment import SentimentService
+
+logger = logging.getLogger(__name__)
+
+LOADING = "loading"
+WARMING_UP = "warming_up"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelLoader:
+    """
+    Loads the SentimentService on a background thread.
+
+    The API process starts serving (liveness) immediately; `status` moves
+    loading -> warming_up -> ready, or to failed with `error` set. The
+    factory should import torch/transformers itself so that importing the
+    API module stays cheap. It may also return a started ModelPool, whose
+    workers warm up on their own (leave warmup_lengths / autotune unset).
+    A service that breaks after loading is reported with `fail`.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], "SentimentService"],
+        warmup_lengths: Optional[List[int]] = None,
+        on_ready: Optional[Callable[["SentimentService"], None]] = None,
+        autotune: bool = False,
+    ):
+        self.factory = factory
+        self.warmup_lengths = warmup_lengths or []
+        self.on_ready = on_ready
+        self.autotune = autotune
+
+        self.status = LOADING
+        self.error: Optional[str] = None
+        self.svc: Optional["SentimentService"] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the model is ready or failed; return True if ready."""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def _load(self) -> None:
+        try:
+            t0 = time.perf_counter()
+            svc = self.factory()
+            self.load_seconds = time.perf_counter() - t0
+
+            if self.warmup_lengths:
+                self.status = WARMING_UP
+                self.warmup_seconds = svc.warmup(self.warmup_lengths)
+            if self.autotune:
+                self.status = WARMING_UP
+                svc.autotune()
+
+            self.svc = svc
+            if self.on_ready is not None:
+                self.on_ready(svc)
+            self.status = READY
+            logger.info("推論準備完了: load_sec=%.2f, warmup_sec=%s", self.load_seconds, self.warmup_seconds)
+        except Exception as e:
+            self.status = FAILED
+            self.error = f"{type(e).__name__}: {e}"
+            logger.exception("モデルの読み込みに失敗しました")
+        finally:
+            self._ready.set()
+
+    def fail(self, error: str) -> None:
+        """Mark a loaded service as failed for good (e.g. the worker pool stopped restarting)."""
+        self.status = FAILED
+        self.error = error
+        logger.error("推論サービスを failed にします: %s", error)
+
+    def info(self) -> Dict[str, object]:
+        out: Dict[str, object] = {"status": self.status}
+        if self.load_seconds is not None:
+            out["load_seconds"] = round(self.load_seconds, 3)
+        if self.warmup_seconds is not None:
+            out["warmup_seconds"] = round(self.warmup_seconds, 3)
+        if self.error is not None:
+            out["error"] = self.error
+        return out
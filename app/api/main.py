@@ -1,20 +1,138 @@
-from typing import List, Optional
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import pyarrow as pa
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.requests import ClientDisconnect
+
+from app.api.analysis import Analyzer, preview_page
+from app.api.batching import MicroBatcher
+from app.api.jobs import DONE, RUNNING, JobManager, JobStore, job_info
+from app.api.loader import ModelLoader
+from app.api.pool import ModelPool
+from app.core.analytics import PERIODS
+from app.core.config import (
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, INFERENCE_AUTOTUNE, MODEL_SNAPSHOT_DIR, WARMUP_LENGTHS,
+    INFERENCE_BACKEND, INFERENCE_REPLICAS, INFERENCE_REPLICA_CORES, INFERENCE_RESTART_BACKOFF_SEC, MODEL_ID,
+    INFERENCE_MAX_INIT_FAILURES,
+    JOBS_CHUNK_ROWS, JOBS_DIR, JOBS_RETENTION_HOURS, JOBS_WORKERS, ANALYZE_PAGE_MAX_ROWS, ANALYZE_TOP_WORDS,
+)
+from app.core.metrics import REGISTRY, REQUEST_SECONDS, REQUEST_TEXTS
+from app.core.profiling import new_trace_id, sampled
+from app.core.store import FeedbackStore
+from app.core.transport import (
+    ARROW_STREAM, COMPRESSIONS, RESPONSE_SCHEMA, ArrowStreamEncoder,
+    decode_request, encode_response, is_arrow, iter_request_batches, response_batch, wants_arrow,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _create_service():
+    # torch / transformers の読み込みはバックグラウンドスレッドで行う
+    from app.core.sentiment import SentimentService
+    return SentimentService.create(snapshot_dir=MODEL_SNAPSHOT_DIR or None)
+
+
+def _create_pool() -> ModelPool:
+    # 各ワーカーが自分のプロセス内でモデルを読み込み、ウォームアップする
+    pool = ModelPool(
+        INFERENCE_REPLICAS,
+        backend=INFERENCE_BACKEND,
+        model_id=MODEL_ID,
+        snapshot_dir=MODEL_SNAPSHOT_DIR or None,
+        warmup_lengths=WARMUP_LENGTHS,
+        autotune=INFERENCE_AUTOTUNE,
+        cores_per_replica=INFERENCE_REPLICA_CORES,
+        restart_backoff=INFERENCE_RESTART_BACKOFF_SEC,
+        max_init_failures=INFERENCE_MAX_INIT_FAILURES,
+        # すべてのワーカーの初期化が失敗し続けたら /ready を failed（503）にする
+        on_failed=lambda error: loader.fail(error),
+    )
+    pool.start()
+    return pool
+
+
+# 同時リクエストをまとめて推論するバッチャー（モデルは読み込み完了後に設定）
+batcher = MicroBatcher(None, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+
+# モデルはサーバー起動後にバックグラウンドで一度だけロード
+# （各リクエストごとにロードしない）。INFERENCE_REPLICAS > 0 の場合は
+# 推論ワーカープロセスのプールを起動し、バッチャーはプールに振り分ける
+loader = ModelLoader(
+    _create_pool if INFERENCE_REPLICAS else _create_service,
+    warmup_lengths=[] if INFERENCE_REPLICAS else WARMUP_LENGTHS,
+    autotune=INFERENCE_AUTOTUNE and not INFERENCE_REPLICAS,
+    on_ready=lambda svc: setattr(batcher, "svc", svc),
+)
+
+# 日付のあるデータを蓄積する分析ストア（/analyze で取り込み、/trend で集計）
+feedback_store = FeedbackStore.create()
+
+# /analyze のジョブは推論後にサーバー側で集計し、結果（数 KB）だけを返す
+job_store = JobStore(JOBS_DIR)
+analyzer = Analyzer(job_store, feedback_store, top_words=ANALYZE_TOP_WORDS)
+
+# 大きな入力はジョブとして登録し、ワーカーがチャンクごとに推論する
+# （推論はバッチャー経由のため /predict と同じ推論スレッドを共有する）
+jobs = JobManager(
+    job_store,
+    predict=batcher.submit,
+    wait_ready=loader.wait,
+    workers=JOBS_WORKERS,
+    chunk_rows=JOBS_CHUNK_ROWS,
+    retention_hours=JOBS_RETENTION_HOURS,
+    finalize=analyzer.run,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loader.start()
+    await batcher.start()
+    jobs.start(asyncio.get_running_loop())
+    yield
+    jobs.stop()
+    await batcher.stop()
+    if isinstance(loader.svc, ModelPool):
+        loader.svc.stop()
+
+
+def _require_ready() -> None:
+    if not loader.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"モデルの準備ができていません（status={loader.status}）。",
+            headers={"Retry-After": "5"},
+        )
 
-from app.core.sentiment import SentimentService
 
 # 感情分析（推論）専用のFastAPIアプリケーション
 app = FastAPI(
     title="フィードバック感情分析 推論API",
     version="0.1.0",
-    description="アンケートテキストに対して感情分析（ポジ／ネガ／ニュートラル）を行うAPI"
+    description="アンケートテキストに対して感情分析（ポジ／ネガ／ニュートラル）を行うAPI",
+    lifespan=lifespan,
 )
 
-# アプリ起動時にモデルを一度だけロード
-# （各リクエストごとにロードしない）
-svc = SentimentService.create()
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    # ラベルの種類が増えすぎないよう、ルーティング済みのパスのみ記録する
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    if route is not None:
+        REQUEST_SECONDS.labels(route.path).observe(time.perf_counter() - t0)
+    return response
 
 
 class PredictRequest(BaseModel):
@@ -24,6 +142,8 @@ class PredictRequest(BaseModel):
     texts: List[str]                         # 分析対象テキスト一覧
     depts: Optional[List[str]] = None        # 部署名（任意）
     use_dept_rules: bool = False             # 部署別ルールを使用するか
+    sort_by_length: bool = True              # 重複排除＋トークン長順バッチングを使用するか
+    rules_first: bool = False                # ルールで確定する行（空テキスト・ポジマーカー）は推論しない
 
 
 class PredictResponse(BaseModel):
@@ -31,24 +151,139 @@ class PredictResponse(BaseModel):
     感情分析レスポンス形式
     """
     labels: List[str]                        # 感情ラベル（pos / neg / neutral）
-    scores: List[float]                      # 感情スコア
+    scores: List[Optional[float]]            # 感情スコア（rules_first で推論を省略した行は null）
 
 
 @app.get("/health")
 def health():
     """
-    ヘルスチェック用エンドポイント
+    ヘルスチェック（liveness）用エンドポイント
+
+    モデルの読み込み状況に関係なく、プロセスが応答できれば ok を返す。
     """
     return {"status": "ok"}
 
 
-@app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
+@app.get("/ready")
+def ready():
+    """
+    レディネス確認用エンドポイント
+
+    status は loading / warming_up / ready / failed のいずれか。
+    ready 以外は 503 を返すため、そのままレディネスプローブに使用できる。
+    推論ワーカープール使用時は replicas に各ワーカーの状態（キューの深さ・再起動回数・再起動を停止したか）を含める。
+    すべてのワーカーの初期化が INFERENCE_MAX_INIT_FAILURES 回続けて失敗した場合も failed になる。
+    """
+    info = loader.info()
+    if isinstance(loader.svc, ModelPool):
+        info["replicas"] = loader.svc.info()
+    return JSONResponse(info, status_code=200 if loader.ready else 503)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    推論キャッシュのヒット／ミス件数を返すエンドポイント
+    """
+    _require_ready()
+    if isinstance(loader.svc, ModelPool):
+        # 推論ワーカープール使用時は全ワーカーの合計
+        stats = loader.svc.cache_stats()
+    else:
+        stats = loader.svc.cache.stats() if loader.svc.cache is not None else None
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus テキスト形式のメトリクスを返すエンドポイント
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+class JobRequest(BaseModel):
+    """
+    ジョブ登録（テキスト一覧）の入力形式
+    """
+    texts: List[str]                         # 分析対象テキスト一覧
+    depts: Optional[List[str]] = None        # 部署名（任意）
+    use_dept_rules: bool = False             # 部署別ルールを使用するか
+    rules_first: bool = False                # ルールで確定する行は推論しない
+    key: Optional[str] = None                # 同じ key の登録済みジョブがあればそれを返す（再読み込み対策）
+
+
+def _compression(value: str) -> str:
+    if value not in COMPRESSIONS:
+        raise HTTPException(status_code=400, detail=f"compression は {', '.join(COMPRESSIONS)} のいずれかを指定してください。")
+    return value
+
+
+@app.post(
+    "/predict",
+    response_model=PredictResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": PredictRequest.model_json_schema()},
+                ARROW_STREAM: {"schema": {"type": "string", "format": "binary"}},
+            },
+        },
+    },
+    responses={200: {"content": {ARROW_STREAM: {}}}},
+)
+async def predict(
+    request: Request,
+    use_dept_rules: bool = False,
+    sort_by_length: bool = True,
+    rules_first: bool = False,
+    compression: str = "none",
+    profile: bool = False,
+    x_profile: Optional[str] = Header(None),
+):
     """
     テキスト感情分析を実行する推論エンドポイント
+
+    Content-Type: application/json（PredictRequest）に加え、
+    Arrow IPC ストリーム（text / dept 列）を受け付ける。Arrow の場合、
+    use_dept_rules・sort_by_length・rules_first はクエリパラメータで指定する。
+    Accept に Arrow IPC を含む場合は label（辞書エンコード）/ score（float32）の
+    Arrow IPC ストリームで返す（compression: none / lz4 / zstd）。
+
+    profile=true（または X-Profile: 1 ヘッダー）を指定すると、このリクエストを含む
+    マイクロバッチの各段階を計測し、Chrome trace 形式の JSON を PROFILE_DIR に書き出す。
+    ファイル名はレスポンスの X-Profile-Trace ヘッダーで返す（PROFILE_SAMPLE_RATE で間引く）。
     """
-    texts = req.texts
-    depts = req.depts if req.depts is not None else [""] * len(texts)
+    _require_ready()
+    compression = _compression(compression)
+    body = await request.body()
+    trace_id = (
+        new_trace_id("predict")
+        if (profile or (x_profile or "").lower() in ("1", "true")) and sampled()
+        else None
+    )
+
+    if is_arrow(request.headers.get("content-type")):
+        try:
+            texts, depts = decode_request(body)
+        except (pa.ArrowException, KeyError) as e:
+            raise HTTPException(status_code=400, detail=f"Arrow IPC ボディが不正です: {e}")
+    else:
+        # JSON は pydantic で直接検証する（dict 経由の二重変換を避ける）
+        try:
+            req = PredictRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+            )
+        texts = req.texts
+        depts = req.depts if req.depts is not None else [""] * len(texts)
+        use_dept_rules = req.use_dept_rules
+        sort_by_length = req.sort_by_length
+        rules_first = req.rules_first
 
     # texts と depts の件数が一致しない場合はエラー
     if len(depts) != len(texts):
@@ -57,14 +292,508 @@ def predict(req: PredictRequest):
             detail="texts と depts の要素数が一致していません。"
         )
 
-    # 感情分析を実行
-    labels, scores = svc.predict_batch(
+    REQUEST_TEXTS.observe(len(texts))
+
+    # 感情分析を実行（同時リクエストとまとめてバッチ推論）
+    labels, scores = await batcher.submit(
         texts,
         depts,
-        use_dept_rules=req.use_dept_rules,
+        use_dept_rules=use_dept_rules,
+        sort_by_length=sort_by_length,
+        rules_first=rules_first,
+        profile=trace_id,
+    )
+    headers = {"X-Profile-Trace": f"{trace_id}.json"} if trace_id else None
+
+    if wants_arrow(request.headers.get("accept")):
+        return Response(encode_response(labels, scores, compression), media_type=ARROW_STREAM, headers=headers)
+
+    if headers:
+        return JSONResponse({"labels": labels, "scores": scores}, headers=headers)
+    return {
+        "labels": labels,
+        "scores": scores,
+    }
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator still reads the request body.
+
+    Starlette's StreamingResponse waits for http.disconnect with receive()
+    while streaming (ASGI < 2.4), which would swallow request body messages.
+    Here only the body iterator calls receive(); a client that goes away is
+    reported by request.stream() as ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+async def _iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    リクエストボディを受信した分から行に分割して返す
+    """
+    pending: List[bytes] = []
+    async for part in stream:
+        *lines, last = part.split(b"\n")
+        if lines:
+            lines[0] = b"".join(pending) + lines[0]
+            pending = []
+            for line in lines:
+                yield line
+        pending.append(last)
+    tail = b"".join(pending)
+    if tail:
+        yield tail
+
+
+def _parse_ndjson_line(line: bytes, lineno: int) -> Tuple[List[str], List[str]]:
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{lineno}行目のJSONが不正です: {e.msg}") from e
+
+    if isinstance(obj, str):
+        return [obj], [""]
+    if isinstance(obj, dict) and "texts" in obj:
+        ts = [str(t) for t in obj["texts"]]
+        ds = obj.get("depts") or [""] * len(ts)
+        if len(ds) != len(ts):
+            raise ValueError(f"{lineno}行目: texts と depts の要素数が一致していません。")
+        return ts, [str(d) for d in ds]
+    if isinstance(obj, dict):
+        return [str(obj.get("text") or "")], [str(obj.get("dept") or "")]
+    raise ValueError(f"{lineno}行目の形式が不正です。")
+
+
+async def _iter_ndjson_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int
+) -> AsyncIterator[Tuple[List[str], List[str]]]:
+    """
+    NDJSON を chunk_size 行ずつ (texts, depts) に分割して返す
+
+    各行は {"text": ..., "dept": ...}、JSON 文字列、
+    または {"texts": [...], "depts": [...]}（複数行をまとめたチャンク）を受け付ける。
+    ボディは受信した分から解析し、chunk_size 行たまるたびに返す。
+    """
+    texts: List[str] = []
+    depts: List[str] = []
+    lineno = 0
+    async for line in _iter_lines(stream):
+        lineno += 1
+        line = line.strip()
+        if not line:
+            continue
+        ts, ds = _parse_ndjson_line(line, lineno)
+        texts.extend(ts)
+        depts.extend(ds)
+
+        while len(texts) >= chunk_size:
+            yield texts[:chunk_size], depts[:chunk_size]
+            texts, depts = texts[chunk_size:], depts[chunk_size:]
+
+    if texts:
+        yield texts, depts
+
+
+class _BodyReader:
+    """
+    Blocking file-like view of the request body for pyarrow's IPC reader.
+
+    The reader runs in a worker thread; every read() pulls the next body
+    parts from the event loop, so the body is consumed only as fast as the
+    record batches are scored.
+    """
+
+    closed = False
+
+    def __init__(self, stream: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._stream = stream.__aiter__()
+        self._loop = loop
+        self._buf = bytearray()
+        self._eof = False
+
+    def _next_part(self) -> Optional[bytes]:
+        try:
+            return asyncio.run_coroutine_threadsafe(self._stream.__anext__(), self._loop).result()
+        except StopAsyncIteration:
+            return None
+
+    def read(self, n: int = -1) -> bytes:
+        while not self._eof and (n is None or n < 0 or len(self._buf) < n):
+            part = self._next_part()
+            if part is None:
+                self._eof = True
+            else:
+                self._buf += part
+        if n is None or n < 0:
+            n = len(self._buf)
+        out = bytes(self._buf[:n])
+        del self._buf[:n]
+        return out
+
+
+async def _iter_arrow_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int
+) -> AsyncIterator[Tuple[List[str], List[str]]]:
+    """
+    Arrow IPC ストリームを chunk_size 行ずつ (texts, depts) に分割して返す
+
+    レコードバッチは受信した分から（ワーカースレッドで）デコードする。
+    """
+    loop = asyncio.get_running_loop()
+    batches = iter_request_batches(_BodyReader(stream, loop))
+    texts: List[str] = []
+    depts: List[str] = []
+    try:
+        while True:
+            batch = await loop.run_in_executor(None, next, batches, None)
+            if batch is None:
+                break
+            texts.extend(batch[0])
+            depts.extend(batch[1])
+            while len(texts) >= chunk_size:
+                yield texts[:chunk_size], depts[:chunk_size]
+                texts, depts = texts[chunk_size:], depts[chunk_size:]
+    except (pa.ArrowException, KeyError) as e:
+        raise ValueError(f"Arrow IPC ボディが不正です: {e}") from e
+
+    if texts:
+        yield texts, depts
+
+
+@app.post("/predict/stream")
+async def predict_stream(
+    request: Request,
+    use_dept_rules: bool = False,
+    chunk_size: int = Query(256, ge=1, le=10000),
+    rules_first: bool = False,
+    compression: str = "none",
+):
+    """
+    NDJSON ストリーミング推論エンドポイント
+
+    リクエストボディの各行を受け取り、chunk_size 件ごとに推論した結果を
+    {"offset": ..., "labels": [...], "scores": [...]} の NDJSON 行として順次返す。
+    ボディは受信した分から解析・推論するため、最初の結果はアップロードの完了を待たずに返り、
+    メモリ使用量はチャンクサイズで抑えられる（推論が追いつかない間はボディを読み進めない）。
+
+    Content-Type が Arrow IPC の場合はボディを Arrow IPC ストリームとして読み、
+    Accept に Arrow IPC を含む場合はチャンクごとのレコードバッチで返す
+    （エラーは custom metadata に error を持つ空バッチで通知する）。
+    """
+    _require_ready()
+    compression = _compression(compression)
+
+    chunks = (
+        _iter_arrow_chunks(request.stream(), chunk_size)
+        if is_arrow(request.headers.get("content-type"))
+        else _iter_ndjson_chunks(request.stream(), chunk_size)
     )
 
+    if wants_arrow(request.headers.get("accept")):
+        async def arrow_results():
+            enc = ArrowStreamEncoder(RESPONSE_SCHEMA, compression)
+            try:
+                async for texts, depts in chunks:
+                    labels, scores = await batcher.submit(
+                        texts, depts, use_dept_rules=use_dept_rules, rules_first=rules_first
+                    )
+                    yield enc.write(response_batch(labels, scores))
+            except ValueError as e:
+                yield enc.write(response_batch([], []), custom_metadata={"error": str(e)})
+            except ClientDisconnect:
+                logger.info("ストリーミング推論の途中でクライアントが切断しました")
+                return
+            yield enc.close()
+
+        return _DuplexStreamingResponse(arrow_results(), media_type=ARROW_STREAM)
+
+    async def results():
+        offset = 0
+        try:
+            async for texts, depts in chunks:
+                labels, scores = await batcher.submit(
+                    texts, depts, use_dept_rules=use_dept_rules, rules_first=rules_first
+                )
+                yield json.dumps(
+                    {"offset": offset, "labels": labels, "scores": scores},
+                    ensure_ascii=False,
+                ) + "\n"
+                offset += len(texts)
+        except ValueError as e:
+            # ストリーム開始後はステータスコードを変更できないため、エラー行で通知する
+            yield json.dumps({"offset": offset, "error": str(e)}, ensure_ascii=False) + "\n"
+        except ClientDisconnect:
+            logger.info("ストリーミング推論の途中でクライアントが切断しました: offset=%d", offset)
+
+    return _DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def _get_job(job_id: str) -> dict:
+    job = jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"ジョブが見つかりません: {job_id}")
+    return job
+
+
+@app.post(
+    "/jobs",
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": JobRequest.model_json_schema()},
+                "text/csv": {"schema": {"type": "string", "format": "binary"}},
+                ARROW_STREAM: {"schema": {"type": "string", "format": "binary"}},
+            },
+        },
+    },
+)
+async def submit_job(
+    request: Request,
+    use_dept_rules: Optional[bool] = None,
+    rules_first: bool = False,
+    key: Optional[str] = None,
+):
+    """
+    非同期ジョブ登録エンドポイント
+
+    Content-Type: application/json（JobRequest）・Arrow IPC（text / dept 列）・
+    text/csv（feedback.csv 形式）を受け付け、ジョブ ID を返す。
+    CSV / Arrow の場合、オプションはクエリパラメータで指定する
+    （CSV で use_dept_rules を省略すると department 列の有無で決める）。
+    モデルの読み込み中でも登録でき、準備完了後に処理が始まる。
+    """
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip()
+
+    if content_type == "text/csv":
+        if key and (job := jobs.store.find_by_key(key)) is not None:
+            return JSONResponse(job_info(job), status_code=200)
+        with jobs.store.spool() as f:
+            async for part in request.stream():
+                f.write(part)
+        try:
+            job = jobs.submit_csv(Path(f.name), use_dept_rules=use_dept_rules, rules_first=rules_first, key=key)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return job_info(job)
+
+    body = await request.body()
+    if is_arrow(content_type):
+        try:
+            texts, depts = decode_request(body)
+        except (pa.ArrowException, KeyError) as e:
+            raise HTTPException(status_code=400, detail=f"Arrow IPC ボディが不正です: {e}")
+        use_dept_rules = bool(use_dept_rules)
+    else:
+        try:
+            req = JobRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+            )
+        texts = req.texts
+        depts = req.depts if req.depts is not None else [""] * len(texts)
+        use_dept_rules = req.use_dept_rules
+        rules_first = req.rules_first
+        key = req.key
+
+    if len(depts) != len(texts):
+        raise HTTPException(status_code=400, detail="texts と depts の要素数が一致していません。")
+
+    if key and (job := jobs.store.find_by_key(key)) is not None:
+        return JSONResponse(job_info(job), status_code=200)
+    job = jobs.submit_texts(texts, depts, use_dept_rules=use_dept_rules, rules_first=rules_first, key=key)
+    return job_info(job)
+
+
+@app.get("/jobs")
+def list_jobs(limit: int = Query(50, ge=1, le=1000)):
+    """
+    登録済みジョブの一覧（新しい順）
+    """
+    return {"jobs": [job_info(j) for j in jobs.store.list(limit)]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    ジョブの状態・進捗を返すエンドポイント
+
+    status は queued / running / done / failed / cancelled のいずれか。
+    progress（0〜1）、処理済み件数 done、rows_per_sec・eta_seconds を含む。
+    """
+    return job_info(_get_job(job_id))
+
+
+@app.get("/jobs/{job_id}/results", responses={200: {"content": {ARROW_STREAM: {}}}})
+def get_job_results(
+    request: Request,
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    compression: str = "none",
+):
+    """
+    ジョブの結果（部分結果を含む）を返すエンドポイント
+
+    offset 行目以降の処理済みの結果を返す。実行中のジョブでは、
+    返ってきた件数だけ offset を進めてポーリングすれば、届いた分から受け取れる。
+    Accept に Arrow IPC を含む場合は /predict と同じ形式で返す。
+    """
+    compression = _compression(compression)
+    job = _get_job(job_id)
+    labels, scores = jobs.store.results(job_id, offset, limit)
+    if wants_arrow(request.headers.get("accept")):
+        return Response(
+            encode_response(labels, scores, compression),
+            media_type=ARROW_STREAM,
+            headers={"X-Job-Status": job["status"], "X-Job-Done": str(job["done"])},
+        )
     return {
+        "job_id": job_id,
+        "status": job["status"],
+        "done": job["done"],
+        "total": job["total"],
+        "offset": offset,
         "labels": labels,
         "scores": scores,
     }
+
+
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """
+    ジョブを取り消し、入力と結果を削除するエンドポイント
+    """
+    _get_job(job_id)
+    jobs.cancel(job_id)
+    jobs.store.delete(job_id)
+    return {"job_id": job_id, "deleted": True}
+
+
+def _get_analysis_job(job_id: str) -> dict:
+    job = _get_job(job_id)
+    if not job["options"].get("analyze"):
+        raise HTTPException(status_code=404, detail=f"/analyze で登録したジョブではありません: {job_id}")
+    return job
+
+
+def _analysis_info(job: dict) -> dict:
+    info = job_info(job)
+    # 推論が終わって集計中のジョブは status=running のまま stage で区別する
+    if job["status"] == RUNNING:
+        info["stage"] = "aggregating" if job["done"] >= job["total"] else "scoring"
+    else:
+        info["stage"] = job["status"]
+    if job["status"] == DONE:
+        info["result"] = analyzer.result(job["id"])
+    return info
+
+
+@app.post(
+    "/analyze",
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"text/csv": {"schema": {"type": "string", "format": "binary"}}},
+        },
+    },
+)
+async def analyze(
+    request: Request,
+    use_dept_rules: Optional[bool] = None,
+    rules_first: bool = False,
+    key: Optional[str] = None,
+):
+    """
+    サーバー側分析エンドポイント
+
+    feedback.csv 形式の CSV を一度だけ受け取り、前処理・推論・集計
+    （部署別件数・スコア分布・部署×感情・感情別件数・ワードクラウド用の頻出語）を
+    ジョブとして実行する。進捗と集計結果は GET /analyze/{job_id}、
+    行のプレビューは GET /analyze/{job_id}/rows、結果 CSV は GET /analyze/{job_id}/csv で取得する。
+    date 列のあるデータは分析ストアにも取り込む（推移は GET /trend）。
+    """
+    if key and (job := jobs.store.find_by_key(key)) is not None and job["options"].get("analyze"):
+        return JSONResponse(_analysis_info(job), status_code=200)
+    with jobs.store.spool() as f:
+        async for part in request.stream():
+            f.write(part)
+    try:
+        job = jobs.submit_csv(
+            Path(f.name), use_dept_rules=use_dept_rules, rules_first=rules_first, key=key, analyze=True
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _analysis_info(job)
+
+
+@app.get("/analyze/{job_id}")
+def get_analysis(job_id: str):
+    """
+    分析ジョブの状態と集計結果を返すエンドポイント
+
+    stage は queued / scoring / aggregating / done / failed / cancelled のいずれか。
+    done になると result に集計結果（Series は index / data、表は index / columns / data）を含む。
+    """
+    return _analysis_info(_get_analysis_job(job_id))
+
+
+@app.get("/analyze/{job_id}/rows")
+def get_analysis_rows(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=ANALYZE_PAGE_MAX_ROWS),
+):
+    """
+    推論結果付きの行をページ単位で返すエンドポイント
+
+    要求された範囲の行だけを CSV から読み込む。実行中のジョブでは推論済みの行までを返す。
+    """
+    job = _get_analysis_job(job_id)
+    page = preview_page(analyzer.rows(job, offset, limit))
+    return {"job_id": job_id, "offset": offset, "total": job["total"], "done": job["done"], **page}
+
+
+@app.get("/analyze/{job_id}/csv", responses={200: {"content": {"text/csv": {}}}})
+def get_analysis_csv(job_id: str):
+    """
+    推論結果列を追加した CSV（UTF-8 BOM 付き）をストリーミングで返すエンドポイント
+    """
+    job = _get_analysis_job(job_id)
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"ジョブが完了していません（status={job['status']}）。")
+    return StreamingResponse(
+        analyzer.iter_csv_bytes(job),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="feedback_with_sentiment.csv"'},
+    )
+
+
+@app.get("/trend")
+def trend(
+    period: str = "month",
+    dept: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    """
+    分析ストアに蓄積したデータの感情の推移を返すエンドポイント
+
+    period（day / week / month）ごとに、感情ラベル別件数・n・mean_score を返す。
+    """
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period は {', '.join(PERIODS)} のいずれかを指定してください。")
+    df = feedback_store.sentiment_trend(period, dept=dept, start=start, end=end)
+    return {
+        "period": period,
+        "index": df.index.strftime("%Y-%m-%d").tolist(),
+        "columns": df.columns.tolist(),
+        "data": json.loads(df.to_json(orient="values")),
+        "stats": feedback_store.stats(),
+    }
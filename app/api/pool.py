@@ -0,0 +1,408 @@
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.api.batching import BatchRequest, Result, predict_group
+from app.core.metrics import POOL_INFLIGHT_TEXTS, POOL_QUEUE_DEPTH, POOL_REPLICA_FAILED, POOL_RESTARTS, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# 1 つのバッチを投入する回数の上限（ワーカーのクラッシュ後に 1 回だけ別プロセスで再実行）
+MAX_ATTEMPTS = 2
+MAX_RESTART_BACKOFF_SEC = 30.0
+
+
+def core_slices(replicas: int, cores_per_replica: int = 0, cores: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """
+    Contiguous CPU slices, one per replica.
+
+    cores defaults to the CPUs this process may run on; cores_per_replica = 0
+    splits them evenly. With more replicas than cores the slices wrap around
+    (replicas then share cores).
+    """
+    cores = sorted(cores if cores is not None else os.sched_getaffinity(0))
+    per = cores_per_replica or max(1, len(cores) // replicas)
+    return [
+        sorted({cores[(i * per + j) % len(cores)] for j in range(per)})
+        for i in range(replicas)
+    ]
+
+
+def _export_weights(source: str) -> str:
+    from app.core.backends import export_shared_weights
+    return str(export_shared_weights(source))
+
+
+def _worker_main(index: int, cores: List[int], options: Dict[str, Any], requests, conn) -> None:
+    """Inference worker process: pin to `cores`, load the model, then serve batches until None."""
+    # torch を import する前にスレッド数を決める（OpenMP はプロセス起動時の値を使う）
+    os.environ["OMP_NUM_THREADS"] = str(len(cores))
+    os.environ["MKL_NUM_THREADS"] = str(len(cores))
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    from app.core.logging_config import setup_logging
+    setup_logging()
+
+    import torch
+    torch.set_num_threads(len(cores))
+
+    from app.core.sentiment import SentimentService
+
+    def send(kind: str, **payload) -> None:
+        cache = svc.cache.stats() if svc is not None and svc.cache is not None else None
+        conn.send({"kind": kind, "metrics": REGISTRY.snapshot(), "cache": cache, **payload})
+
+    svc = None
+    try:
+        svc = SentimentService.create(
+            backend=options["backend"],
+            model_id=options["model_id"],
+            use_cache=options["use_cache"],
+            snapshot_dir=options["snapshot_dir"],
+            weights_path=options["weights_path"],
+        )
+        if options["warmup_lengths"]:
+            svc.warmup(options["warmup_lengths"])
+        if options["autotune"]:
+            svc.autotune()
+    except Exception as e:
+        logger.exception("推論ワーカーの初期化に失敗しました: replica=%d", index)
+        send("failed", error=f"{type(e).__name__}: {e}")
+        return
+
+    logger.info("推論ワーカー準備完了: replica=%d, pid=%d, cores=%s", index, os.getpid(), cores)
+    send("ready")
+    while True:
+        msg = requests.get()
+        if msg is None:
+            break
+        task_id, batch, batch_size, max_length = msg
+        try:
+            send("result", task=task_id, result=predict_group(svc, batch, batch_size, max_length))
+        except Exception as e:
+            logger.exception("推論ワーカーでの推論に失敗しました: replica=%d", index)
+            send("error", task=task_id, error=f"{type(e).__name__}: {e}")
+
+
+@dataclass
+class _Task:
+    id: int
+    requests: List[BatchRequest]
+    batch_size: Optional[int]
+    max_length: int
+    n_texts: int
+    future: Future
+    attempts: int = 0
+
+
+class _Replica:
+    def __init__(self, index: int, cores: List[int]):
+        self.index = index
+        self.label = str(index)
+        self.cores = cores
+        self.process = None
+        self.queue = None
+        self.up = False
+        self.error: Optional[str] = None
+        self.ready = threading.Event()
+        self.pending: Dict[int, _Task] = {}
+        self.texts = 0
+        self.crashes = 0      # 連続クラッシュ回数（起動完了でリセット、再起動の待ち時間に使用）
+        self.restarts = 0
+        self.init_failures = 0    # 起動完了前に終了した連続回数
+        self.failed = False       # 初期化の失敗が続いたため再起動をやめた
+        self.metrics_base = None
+        self.cache_stats: Optional[Dict[str, Any]] = None
+
+
+class ModelPool:
+    """
+    N inference worker processes, each pinned to its own slice of cores.
+
+    Every worker runs its own SentimentService with torch.set_num_threads
+    equal to its slice, so small batches run on several narrow intra-op
+    pools in parallel instead of one wide one. With the torch backend the
+    fp32 weights are exported once and memory-mapped by every worker (one
+    copy in the page cache).
+
+    `dispatch` sends a micro-batch to the replica with the fewest queued
+    texts and returns a concurrent Future; MicroBatcher uses it in place of
+    the in-process service. Queue depth per replica is exported as metrics
+    and the workers' own metrics are merged into the API registry. A worker
+    that dies is restarted (with backoff) and its unfinished batches are
+    re-dispatched once. A worker that exits before it is ready
+    max_init_failures times in a row is not restarted again: its batches go
+    to the other replicas and it is reported as failed in `info` and the
+    metrics. Only when every replica has failed does the pool set `error`
+    and call on_failed.
+    """
+
+    def __init__(
+        self,
+        replicas: int,
+        backend: str,
+        model_id: str,
+        snapshot_dir: Optional[str] = None,
+        use_cache: bool = True,
+        warmup_lengths: Optional[List[int]] = None,
+        autotune: bool = False,
+        cores_per_replica: int = 0,
+        restart_backoff: float = 1.0,
+        share_weights: bool = True,
+        max_init_failures: int = 5,
+        on_failed: Optional[Callable[[str], None]] = None,
+    ):
+        if replicas < 1:
+            raise ValueError(f"replicas must be >= 1: {replicas}")
+        self.options: Dict[str, Any] = {
+            "backend": backend,
+            "model_id": model_id,
+            "snapshot_dir": snapshot_dir,
+            "use_cache": use_cache,
+            "warmup_lengths": list(warmup_lengths or []),
+            "autotune": autotune,
+            "weights_path": None,
+        }
+        self.share_weights = share_weights
+        self.restart_backoff = restart_backoff
+        self.max_init_failures = max_init_failures
+        self.on_failed = on_failed
+        self.error: Optional[str] = None
+        self.replicas = [_Replica(i, c) for i, c in enumerate(core_slices(replicas, cores_per_replica))]
+
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._stopping = False
+
+    def start(self, timeout: Optional[float] = None) -> None:
+        """Start every worker and block until all of them have loaded the model."""
+        t0 = time.perf_counter()
+        if self.share_weights and self.options["backend"] != "onnx":
+            self.options["weights_path"] = self._export_weights()
+        for r in self.replicas:
+            r.queue = self._ctx.Queue()
+            self._spawn(r)
+        for r in self.replicas:
+            r.ready.wait(timeout)
+            if not r.up:
+                self.stop()
+                raise RuntimeError(f"推論ワーカー {r.index} を起動できませんでした: {r.error or 'timeout'}")
+        logger.info(
+            "推論ワーカープール起動完了: replicas=%d, cores=%s, sec=%.2f",
+            len(self.replicas), [r.cores for r in self.replicas], time.perf_counter() - t0,
+        )
+
+    def _export_weights(self) -> str:
+        # torch の読み込みで API プロセスのメモリを増やさないよう、書き出しは別プロセスで行う
+        source = self.options["snapshot_dir"] or self.options["model_id"]
+        with self._ctx.Pool(1) as p:
+            return p.apply(_export_weights, (source,))
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping = True
+        for r in self.replicas:
+            if r.process is not None and r.process.is_alive():
+                r.queue.put(None)
+        for r in self.replicas:
+            if r.process is None:
+                continue
+            r.process.join(timeout)
+            if r.process.is_alive():
+                r.process.terminate()
+                r.process.join()
+            r.queue.cancel_join_thread()
+            r.queue.close()
+
+    def _spawn(self, r: _Replica) -> None:
+        recv_conn, send_conn = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(r.index, r.cores, self.options, r.queue, send_conn),
+            name=f"inference-{r.index}",
+            daemon=True,
+        )
+        process.start()
+        # 子プロセス側の送信端を閉じておくと、ワーカーの終了時に recv が EOFError になる
+        send_conn.close()
+        with self._lock:
+            r.process = process
+            r.metrics_base = None
+        threading.Thread(
+            target=self._receive, args=(r, recv_conn, process), name=f"pool-receiver-{r.index}", daemon=True
+        ).start()
+
+    def _receive(self, r: _Replica, conn, process) -> None:
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                break
+            # ワーカーのメトリクスは前回のスナップショットとの差分を加算する
+            REGISTRY.merge(msg["metrics"], r.metrics_base)
+            r.metrics_base = msg["metrics"]
+            r.cache_stats = msg["cache"]
+
+            kind = msg["kind"]
+            if kind == "ready":
+                r.up, r.error, r.crashes = True, None, 0
+                r.ready.set()
+            elif kind == "failed":
+                r.error = msg["error"]
+            else:
+                with self._lock:
+                    task = r.pending.pop(msg["task"], None)
+                    if task is not None:
+                        r.texts -= task.n_texts
+                    self._observe(r)
+                if task is None:
+                    continue
+                if kind == "result":
+                    task.future.set_result(msg["result"])
+                else:
+                    task.future.set_exception(RuntimeError(msg["error"]))
+        conn.close()
+        process.join()
+        self._on_exit(r, process.exitcode)
+
+    def _on_exit(self, r: _Replica, exitcode: Optional[int]) -> None:
+        with self._lock:
+            r.init_failures = 0 if r.up else r.init_failures + 1
+            r.up = False
+            pending = list(r.pending.values())
+            r.pending.clear()
+            r.texts = 0
+            r.cache_stats = None
+            self._observe(r)
+            # 停止中、または初回起動に失敗した場合は再起動しない（start() がエラーを返す）
+            restart = not self._stopping and r.ready.is_set()
+            if restart and r.init_failures >= self.max_init_failures:
+                restart, r.failed = False, True
+            if restart:
+                # 読まれずに残ったバッチは pending から再投入するので、キューごと作り直す
+                old, r.queue = r.queue, self._ctx.Queue()
+
+        if not restart:
+            r.error = r.error or f"exitcode={exitcode}"
+            r.ready.set()
+            if r.failed:
+                self._give_up(r, pending)
+                return
+            for task in pending:
+                task.future.set_exception(RuntimeError("推論ワーカープールは停止しています。"))
+            return
+        old.cancel_join_thread()
+        old.close()
+
+        r.crashes += 1
+        r.restarts += 1
+        delay = min(self.restart_backoff * 2 ** (r.crashes - 1), MAX_RESTART_BACKOFF_SEC)
+        POOL_RESTARTS.labels(r.label).inc()
+        logger.error(
+            "推論ワーカーが終了しました。再起動します: replica=%d, exitcode=%s, 未完了バッチ=%d, delay_sec=%.1f",
+            r.index, exitcode, len(pending), delay,
+        )
+        time.sleep(delay)
+        if self._stopping:
+            for task in pending:
+                task.future.set_exception(RuntimeError("推論ワーカープールは停止しています。"))
+            return
+        self._spawn(r)
+        self._redispatch(pending)
+
+    def _redispatch(self, pending: List[_Task]) -> None:
+        for task in pending:
+            if task.attempts >= MAX_ATTEMPTS:
+                task.future.set_exception(RuntimeError(
+                    f"推論ワーカーが異常終了したため、バッチを処理できませんでした（{task.attempts} 回）。"
+                ))
+            else:
+                self._submit(task)
+
+    def _give_up(self, r: _Replica, pending: List[_Task]) -> None:
+        """Stop restarting `r` after repeated init failures; fail the pool once no replica is left."""
+        with self._lock:
+            self._observe(r)
+            all_failed = all(x.failed for x in self.replicas)
+        logger.error(
+            "推論ワーカーの初期化が続けて失敗したため、再起動を停止します: replica=%d, 回数=%d, error=%s",
+            r.index, r.init_failures, r.error,
+        )
+        if all_failed:
+            self.error = f"すべての推論ワーカーの初期化が失敗しました（最後のエラー: {r.error}）"
+        # 他のワーカーが動いていれば、未完了のバッチはそちらで処理する
+        self._redispatch(pending)
+        if all_failed and self.on_failed is not None:
+            self.on_failed(self.error)
+
+    def _observe(self, r: _Replica) -> None:
+        POOL_QUEUE_DEPTH.labels(r.label).set(len(r.pending))
+        POOL_INFLIGHT_TEXTS.labels(r.label).set(r.texts)
+        POOL_REPLICA_FAILED.labels(r.label).set(int(r.failed))
+
+    def _submit(self, task: _Task) -> None:
+        with self._lock:
+            live = [r for r in self.replicas if not r.failed]
+            if not live:
+                task.future.set_exception(RuntimeError(self.error or "推論ワーカープールは停止しています。"))
+                return
+            # 起動済みのレプリカを優先し、その中で未処理のテキスト数が最も少ないものに送る
+            r = min(live, key=lambda r: (not r.up, r.texts, len(r.pending)))
+            task.attempts += 1
+            r.pending[task.id] = task
+            r.texts += task.n_texts
+            self._observe(r)
+            r.queue.put((task.id, task.requests, task.batch_size, task.max_length))
+
+    def dispatch(self, requests: List[BatchRequest], batch_size: Optional[int] = None, max_length: int = 256) -> "Future[List[Result]]":
+        """Queue one micro-batch on the least-loaded replica; the Future resolves to predict_group's result."""
+        if self._stopping:
+            raise RuntimeError("推論ワーカープールは停止しています。")
+        task = _Task(
+            id=next(self._ids),
+            requests=requests,
+            batch_size=batch_size,
+            max_length=max_length,
+            n_texts=sum(len(r.texts) for r in requests),
+            future=Future(),
+        )
+        self._submit(task)
+        return task.future
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Inference cache counters summed over the replicas (None when the cache is disabled)."""
+        stats = [r.cache_stats for r in self.replicas if r.cache_stats is not None]
+        if not stats:
+            return None
+        out: Dict[str, Any] = {
+            k: sum(s[k] for s in stats) for k in ("memory_hits", "disk_hits", "misses", "evictions", "memory_entries")
+        }
+        # SQLite はワーカー間で共有しているため件数は合算しない
+        out["disk_entries"] = max(s["disk_entries"] for s in stats)
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_ratio"] = (out["memory_hits"] + out["disk_hits"]) / lookups if lookups else 0.0
+        return out
+
+    def info(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "replica": r.index,
+                    "pid": r.process.pid if r.process is not None else None,
+                    "up": r.up,
+                    "cores": r.cores,
+                    "queue_depth": len(r.pending),
+                    "inflight_texts": r.texts,
+                    "restarts": r.restarts,
+                    "failed": r.failed,
+                    "error": r.error if r.failed else None,
+                }
+                for r in self.replicas
+            ]
@@ -0,0 +1,236 @@
+"""
+Offline batch scoring: CSV -> Parquet, in-process (no HTTP).
+
+The input is streamed in chunks (io.iter_csv -> preprocess.iter_clean ->
+SentimentService.predict_batch) and every chunk is written as one Parquet
+part file under OUT_DIR. After each part, OUT_DIR/_checkpoint.json records
+how many chunks are done; rerunning the same command resumes after the last
+completed chunk. Progress (rows/s, ETA) is logged after every chunk.
+
+    python -m app.cli.batch_score archive.csv --out .cache/scored/archive
+    python -m app.cli.batch_score archive.csv --out .cache/scored/archive   # resume
+    python -c "import pandas as pd; print(pd.read_parquet('.cache/scored/archive'))"
+
+With --store, every chunk is also ingested into the analytical store
+(store.FeedbackStore, date rollups) under a per-chunk source id, so a
+resumed run never counts a chunk twice.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.logging_config import setup_logging
+from app.core.config import (
+    CSV_CHUNK_ROWS, INFERENCE_BACKEND, MODEL_ID, NEAR_DUP_THRESHOLD, SCORE_COL, PRED_SCORE_COL, STORE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "_checkpoint.json"
+
+
+def _fingerprint(path: Path) -> Dict[str, object]:
+    st = path.stat()
+    return {"path": str(path.resolve()), "size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def _read_checkpoint(out_dir: Path) -> Optional[Dict[str, object]]:
+    path = out_dir / CHECKPOINT
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_checkpoint(out_dir: Path, state: Dict[str, object]) -> None:
+    tmp = out_dir / (CHECKPOINT + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out_dir / CHECKPOINT)
+
+
+def _part_schema(table: pa.Table) -> pa.Schema:
+    # 後続チャンクと型を揃える：全欠損列は文字列、スコア列は常に float32、
+    # カテゴリ列は種類数によらない int32 インデックスの辞書
+    fields = []
+    for f in table.schema:
+        if pa.types.is_null(f.type):
+            f = f.with_type(pa.string())
+        if f.name in (SCORE_COL, PRED_SCORE_COL):
+            f = f.with_type(pa.float32())
+        if pa.types.is_dictionary(f.type):
+            f = f.with_type(pa.dictionary(pa.int32(), f.type.value_type))
+        fields.append(f)
+    return pa.schema(fields)
+
+
+def _write_part(chunk: pd.DataFrame, path: Path, schema: Optional[pa.Schema]) -> pa.Schema:
+    if schema is None:
+        schema = _part_schema(pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata())
+    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+    return schema
+
+
+def run(
+    input_path: str,
+    out_dir: str,
+    chunksize: int = CSV_CHUNK_ROWS,
+    backend: str = INFERENCE_BACKEND,
+    model_id: str = MODEL_ID,
+    use_dept_rules: bool = True,
+    batch_size: Optional[int] = None,
+    max_length: int = 256,
+    restart: bool = False,
+    rules_first: bool = False,
+    autotune: bool = False,
+    store_path: Optional[str] = None,
+    near_dup: float = 0.0,
+) -> Dict[str, object]:
+    # 重い import（torch / transformers）は実行時のみ
+    from app.core.io import count_rows, iter_csv
+    from app.core.pipeline import iter_scored
+    from app.core.preprocess import iter_clean
+    from app.core.sentiment import SentimentService
+    from app.core.store import FeedbackStore
+
+    src = Path(input_path)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    options = {
+        "input": _fingerprint(src),
+        "chunksize": chunksize,
+        "backend": backend,
+        "model_id": model_id,
+        "use_dept_rules": use_dept_rules,
+        "max_length": max_length,
+        "rules_first": rules_first,
+        "store": store_path,
+        "near_dup": near_dup,
+    }
+
+    state = None if restart else _read_checkpoint(out)
+    if state is not None and state["options"] != options:
+        raise ValueError(
+            f"{out / CHECKPOINT} は別の入力・設定で作成されています。"
+            "同じ設定で再実行するか、--restart で最初からやり直してください。"
+        )
+    if state is None:
+        for old in out.glob("part-*.parquet"):
+            old.unlink()
+        state = {"options": options, "chunks_done": 0, "rows_done": 0, "total_rows": count_rows(src)}
+        _write_checkpoint(out, state)
+    elif state.get("finished"):
+        logger.info("スコアリング済みです: out=%s, 行数=%d", out, state["rows_done"])
+        return state
+    else:
+        logger.info("チェックポイントから再開します: chunks_done=%d, rows_done=%d", state["chunks_done"], state["rows_done"])
+
+    skip = int(state["chunks_done"])
+    total = int(state["total_rows"])
+    schema = pq.read_schema(out / "part-00000.parquet") if skip else None
+
+    store = FeedbackStore(store_path) if store_path else None
+    svc = SentimentService.create(backend=backend, model_id=model_id)
+    svc.near_dup_threshold = near_dup
+    if autotune:
+        svc.autotune()
+    if batch_size and svc.budget.enabled:
+        logger.info("1 回のモデル実行の件数を --batch-size で制限します: max_rows=%d", min(batch_size, svc.budget.max_rows))
+
+    # 完了済みチャンクは読み飛ばす（パースのみで、前処理・推論は行わない）
+    chunks = (c for i, c in enumerate(iter_csv(str(src), chunksize=chunksize)) if i >= skip)
+    scored = iter_scored(
+        iter_clean(chunks), svc, use_dept_rules=use_dept_rules,
+        batch_size=batch_size, max_length=max_length, sort_by_length=True, rules_first=rules_first,
+    )
+
+    t0 = time.perf_counter()
+    rows_this_run = 0
+    for i, chunk in enumerate(scored, start=skip):
+        schema = _write_part(chunk, out / f"part-{i:05d}.parquet", schema)
+        if store is not None:
+            fp = options["input"]
+            store.ingest(chunk, source=f"{fp['path']}:{fp['size']}:{fp['mtime']}:{chunksize}:{i}")
+
+        rows_this_run += len(chunk)
+        state["chunks_done"] = i + 1
+        state["rows_done"] = int(state["rows_done"]) + len(chunk)
+        _write_checkpoint(out, state)
+
+        dt = time.perf_counter() - t0
+        rate = rows_this_run / dt if dt else 0.0
+        remaining = max(total - int(state["rows_done"]), 0)
+        logger.info(
+            "進捗: %d/%d 行 (%.1f%%), %.0f 行/秒, 残り約 %s",
+            state["rows_done"], total, 100.0 * state["rows_done"] / max(total, 1), rate,
+            time.strftime("%H:%M:%S", time.gmtime(remaining / rate)) if rate else "-",
+        )
+
+    state["finished"] = True
+    _write_checkpoint(out, state)
+    logger.info(
+        "バッチスコアリング完了: out=%s, 行数=%d（今回 %d 行, %.1f 秒）",
+        out, state["rows_done"], rows_this_run, time.perf_counter() - t0,
+    )
+    return state
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("input", help="input CSV (feedback.csv schema)")
+    p.add_argument("--out", required=True, help="output directory of Parquet part files")
+    p.add_argument("--chunksize", type=int, default=CSV_CHUNK_ROWS)
+    p.add_argument("--backend", default=INFERENCE_BACKEND)
+    p.add_argument("--model-id", default=MODEL_ID)
+    p.add_argument("--no-dept-rules", action="store_true", help="disable department rules")
+    p.add_argument(
+        "--batch-size", type=int, default=None,
+        help="max rows per forward pass on top of the token budget (fixed batch size when INFERENCE_MAX_TOKENS=0)",
+    )
+    p.add_argument("--max-length", type=int, default=256)
+    p.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    p.add_argument(
+        "--rules-first", action="store_true",
+        help="skip inference for rows fixed by rules (empty / positive markers); their score is NaN",
+    )
+    p.add_argument(
+        "--store", nargs="?", const=STORE_PATH, default=None, metavar="PATH",
+        help=f"also ingest scored rows into the analytical store (default path: {STORE_PATH})",
+    )
+    p.add_argument("--autotune", action="store_true", help="measure the token budget on this host before scoring")
+    p.add_argument(
+        "--near-dup", type=float, default=NEAR_DUP_THRESHOLD, metavar="JACCARD",
+        help="infer one representative per group of near-duplicate texts (estimated character-shingle "
+             "Jaccard >= JACCARD; 0 disables)",
+    )
+    args = p.parse_args()
+
+    setup_logging()
+    try:
+        run(
+            args.input, args.out,
+            chunksize=args.chunksize, backend=args.backend, model_id=args.model_id,
+            use_dept_rules=not args.no_dept_rules, batch_size=args.batch_size,
+            max_length=args.max_length, restart=args.restart, rules_first=args.rules_first,
+            autotune=args.autotune, store_path=args.store, near_dup=args.near_dup,
+        )
+    except ValueError as e:
+        logger.error("%s", e)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,43 @@
 import pandas as pd
 import numpy as np
 import logging
-from .config import DEPT_COL, SCORE_COL
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional, Union
+from . import config
+from .config import DATE_COL, DEPT_COL, SCORE_COL, TEXT_COL, PRED_LABEL_COL
+from .preprocess import LABELS
+
+if TYPE_CHECKING:
+    from .store import FeedbackStore
 
 logger = logging.getLogger(__name__)
 
-def dept_counts(df: pd.DataFrame) -> pd.Series:
+# 推移の集計単位（week は月曜始まり）
+PERIODS = ("day", "week", "month")
+
+# 日付のない行の bucket（部署別件数などには含め、推移には含めない）
+NO_DATE = ""
+
+# dept_counts / score_hist / pivot_dept_sentiment / sentiment_trend は DataFrame の代わりに
+# store.FeedbackStore を受け取ると、ストアのインデックス・ロールアップに対して集計する
+
+def dept_counts(df: Union[pd.DataFrame, "FeedbackStore"]) -> pd.Series:
+    if not isinstance(df, pd.DataFrame):
+        return df.dept_counts()
     if DEPT_COL not in df.columns:
         logger.warning("部署カラムが存在しません: '%s'", DEPT_COL)
         return pd.Series(dtype=int)
     return df[DEPT_COL].value_counts(dropna=False)
 
-def score_hist(df: pd.DataFrame, bins: int = 5):
-    """Return histogram arrays (counts, bin_edges). If score column missing/empty -> empty arrays."""
+def score_hist(df: Union[pd.DataFrame, "FeedbackStore"], bins: int = 5):
+    """
+    Return histogram arrays (counts, bin_edges). If score column missing/empty -> empty arrays.
+
+    A FeedbackStore always uses the fixed `score_edges` (like AggregateState); `bins` applies to frames only.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return df.score_hist()
     if SCORE_COL not in df.columns:
         logger.info("スコアカラムが存在しないため、ヒストグラムをスキップします: '%s'", SCORE_COL)
         return np.array([]), np.array([])
@@ -25,8 +50,14 @@ def score_hist(df: pd.DataFrame, bins: int = 5):
     counts, edges = np.histogram(s, bins=bins)
     return counts, edges
 
-def pivot_dept_sentiment(df: pd.DataFrame, label_col: str, text_col: str) -> pd.DataFrame:
+def pivot_dept_sentiment(
+    df: Union[pd.DataFrame, "FeedbackStore"],
+    label_col: str = PRED_LABEL_COL,
+    text_col: str = TEXT_COL,
+) -> pd.DataFrame:
     """Pivot table department x sentiment label counts."""
+    if not isinstance(df, pd.DataFrame):
+        return df.pivot_dept_sentiment()
     missing = [c for c in [DEPT_COL, label_col, text_col] if c not in df.columns]
     if missing:
         logger.warning("pivot作成に必要なカラムが不足しています: %s", missing)
@@ -38,6 +69,194 @@ def pivot_dept_sentiment(df: pd.DataFrame, label_col: str, text_col: str) -> pd.
             columns=label_col,
             values=text_col,
             aggfunc="count",
-            fill_value=0
+            fill_value=0,
+            observed=True,
         ).sort_index()
     )
+
+
+def order_label_columns(pivot: pd.DataFrame) -> pd.DataFrame:
+    """
+    Label columns in LABELS order (labels that did not occur are left out,
+    unexpected ones follow sorted), as the categorical pivot_table gives.
+    """
+    known = [label for label in LABELS if label in pivot.columns]
+    extra = sorted(c for c in pivot.columns if c not in LABELS)
+    return pivot.reindex(columns=known + extra)
+
+
+def period_buckets(dates: pd.Series, period: str) -> pd.Series:
+    """Bucket start date ("YYYY-MM-DD") per row; NaT -> NO_DATE."""
+    # 日付の種類は行数よりずっと少ないため、ユニーク値だけ文字列化して展開する
+    codes, uniq = pd.factorize(dates)
+    uniq = pd.DatetimeIndex(uniq)
+    if period == "day":
+        labels = uniq.strftime("%Y-%m-%d")
+    elif period == "week":
+        labels = (uniq - pd.to_timedelta(uniq.weekday, unit="D")).strftime("%Y-%m-%d")
+    elif period == "month":
+        labels = uniq.strftime("%Y-%m-01")
+    else:
+        raise ValueError(f"Unknown period: {period} (choose from {', '.join(PERIODS)})")
+    # factorize は欠損を -1 にするため、末尾に NO_DATE を置いて参照させる
+    values = np.append(np.asarray(labels, dtype=object), NO_DATE)
+    return pd.Series(values[codes], index=dates.index)
+
+
+def trend_frame(g: pd.DataFrame, label_col: str = PRED_LABEL_COL) -> pd.DataFrame:
+    """
+    (bucket, label, n, score_sum, score_n) rows -> one row per bucket.
+
+    Columns: one count per label, "n" (all rows) and "mean_score"
+    (mean satisfaction score, NaN where the bucket has no scores).
+    """
+    if g.empty:
+        return pd.DataFrame(columns=["n", "mean_score"], index=pd.DatetimeIndex([], name="bucket"))
+    out = g.pivot_table(index="bucket", columns=label_col, values="n", aggfunc="sum", fill_value=0).astype("int64")
+    out.columns.name = None
+    totals = g.groupby("bucket")[["n", "score_sum", "score_n"]].sum()
+    out["n"] = totals["n"].astype("int64")
+    out["mean_score"] = totals["score_sum"] / totals["score_n"].where(totals["score_n"] > 0)
+    out.index = pd.to_datetime(out.index)
+    out.index.name = "bucket"
+    return out.sort_index()
+
+
+def sentiment_trend(
+    df: Union[pd.DataFrame, "FeedbackStore"],
+    period: str = "month",
+    label_col: str = PRED_LABEL_COL,
+) -> pd.DataFrame:
+    """Sentiment counts and mean satisfaction score per day / week / month (rows without a date are skipped)."""
+    if not isinstance(df, pd.DataFrame):
+        return df.sentiment_trend(period=period)
+    missing = [c for c in [DATE_COL, label_col] if c not in df.columns]
+    if missing:
+        logger.info("推移の作成に必要なカラムが不足しています: %s", missing)
+        return trend_frame(pd.DataFrame(columns=["bucket", label_col, "n", "score_sum", "score_n"]))
+
+    dates = pd.to_datetime(df[DATE_COL], errors="coerce", format="mixed")
+    scores = (
+        pd.to_numeric(df[SCORE_COL], errors="coerce")
+        if SCORE_COL in df.columns else pd.Series(np.nan, index=df.index)
+    )
+    g = (
+        pd.DataFrame({"bucket": period_buckets(dates, period), label_col: df[label_col], "score": scores})
+        .query("bucket != @NO_DATE")
+        .groupby(["bucket", label_col], observed=True)["score"]
+        .agg(n="size", score_sum="sum", score_n="count")
+        .reset_index()
+    )
+    return trend_frame(g, label_col=label_col)
+
+
+def _nan_to_none(key):
+    # NaN は等値比較できないため、Counter のキーとしては None に寄せる
+    return None if isinstance(key, float) and np.isnan(key) else key
+
+
+def score_edges(low: Optional[int] = None, high: Optional[int] = None) -> np.ndarray:
+    """Fixed histogram edges: one bin of width 1 centred on each integer score in [low, high]."""
+    low = config.SCORE_MIN if low is None else low
+    high = config.SCORE_MAX if high is None else high
+    return np.arange(low - 0.5, high + 1.0, 1.0)
+
+
+@dataclass
+class AggregateState:
+    """
+    Mergeable dashboard aggregates, built chunk by chunk.
+
+    Holds department counts, satisfaction-score counts in fixed bins
+    (`score_edges`, one per integer score from SCORE_MIN to SCORE_MAX, so
+    memory does not grow with the number of distinct scores; scores outside
+    the range are only counted) and department x label counts. States from
+    different chunks or workers combine with `merge` / `+`.
+    """
+    label_col: str = PRED_LABEL_COL
+    text_col: str = TEXT_COL
+    n_rows: int = 0
+    dept: Counter = field(default_factory=Counter)
+    score_edges: np.ndarray = field(default_factory=score_edges)
+    scores: Optional[np.ndarray] = None
+    scores_out: int = 0
+    dept_label: Counter = field(default_factory=Counter)
+    columns: set = field(default_factory=set)
+
+    def __post_init__(self):
+        if self.scores is None:
+            self.scores = np.zeros(len(self.score_edges) - 1, dtype=np.int64)
+
+    def update(self, df: pd.DataFrame) -> "AggregateState":
+        self.n_rows += len(df)
+        self.columns.update(df.columns)
+
+        if DEPT_COL in df.columns:
+            for k, v in df[DEPT_COL].value_counts(dropna=False, sort=False).items():
+                self.dept[_nan_to_none(k)] += int(v)
+
+        if SCORE_COL in df.columns:
+            s = pd.to_numeric(df[SCORE_COL], errors="coerce").dropna()
+            counts, _ = np.histogram(s, bins=self.score_edges)
+            self.scores += counts
+            self.scores_out += len(s) - int(counts.sum())
+
+        if all(c in df.columns for c in (DEPT_COL, self.label_col, self.text_col)):
+            grouped = df.groupby([DEPT_COL, self.label_col], sort=False, observed=True)[self.text_col].count()
+            for k, v in grouped.items():
+                self.dept_label[k] += int(v)
+        return self
+
+    def merge(self, other: "AggregateState") -> "AggregateState":
+        if not np.array_equal(self.score_edges, other.score_edges):
+            raise ValueError("スコア分布のビンが異なる集計は結合できません。")
+        self.n_rows += other.n_rows
+        self.columns |= other.columns
+        self.dept.update(other.dept)
+        self.scores += other.scores
+        self.scores_out += other.scores_out
+        self.dept_label.update(other.dept_label)
+        return self
+
+    def __add__(self, other: "AggregateState") -> "AggregateState":
+        out = AggregateState(label_col=self.label_col, text_col=self.text_col, score_edges=self.score_edges)
+        return out.merge(self).merge(other)
+
+    def dept_counts(self) -> pd.Series:
+        if DEPT_COL not in self.columns:
+            logger.warning("部署カラムが存在しません: '%s'", DEPT_COL)
+            return pd.Series(dtype=int)
+        s = pd.Series(
+            list(self.dept.values()),
+            index=pd.Index([np.nan if k is None else k for k in self.dept], name=DEPT_COL),
+            name="count",
+            dtype="int64",
+        )
+        return s.sort_values(ascending=False, kind="stable")
+
+    def score_hist(self):
+        """Histogram arrays (counts, bin_edges) over the fixed `score_edges`."""
+        if SCORE_COL not in self.columns:
+            logger.info("スコアカラムが存在しないため、ヒストグラムをスキップします: '%s'", SCORE_COL)
+            return np.array([]), np.array([])
+        if not self.scores.any() and not self.scores_out:
+            logger.info("スコアが空のため、ヒストグラムをスキップします")
+            return np.array([]), np.array([])
+        if self.scores_out:
+            logger.warning(
+                "範囲外のスコアはヒストグラムに含めません: 件数=%d, 範囲=[%g, %g]",
+                self.scores_out, self.score_edges[0], self.score_edges[-1],
+            )
+        return self.scores.copy(), self.score_edges.copy()
+
+    def pivot_dept_sentiment(self) -> pd.DataFrame:
+        missing = [c for c in [DEPT_COL, self.label_col, self.text_col] if c not in self.columns]
+        if missing:
+            logger.warning("pivot作成に必要なカラムが不足しています: %s", missing)
+            return pd.DataFrame()
+        if not self.dept_label:
+            return pd.DataFrame()
+
+        s = pd.Series(self.dept_label, dtype="int64")
+        s.index = s.index.set_names([DEPT_COL, self.label_col])
+        return order_label_columns(s.unstack(self.label_col, fill_value=0).sort_index(axis=0))
@@ -0,0 +1,186 @@
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+from .config import ONNX_CACHE_DIR, SHARED_WEIGHTS_DIR
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def _cache_key(model_id: str) -> str:
+    # ローカルディレクトリの場合は重み更新で作り直されるよう mtime をキーに含める
+    key = re.sub(r"[^\w.-]+", "_", model_id)
+    if Path(model_id).is_dir():
+        key += "-" + str(int(max(p.stat().st_mtime for p in Path(model_id).iterdir())))
+    return key
+
+
+class TorchBackend:
+    """Eager fp32 PyTorch model."""
+    name = "torch"
+
+    def __init__(self, model: torch.nn.Module, device: torch.device):
+        self.model = model
+        self.device = device
+        self.config = model.config
+        self.id2label = dict(model.config.id2label)
+
+    def logits(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            return self.model(**inputs).logits
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch dynamic int8 quantization of the Linear layers (CPU only)."""
+    name = "torch-int8"
+
+    def __init__(self, model: torch.nn.Module):
+        q = torch.ao.quantization.quantize_dynamic(
+            model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        super().__init__(q, torch.device("cpu"))
+
+
+class OnnxBackend:
+    """ONNX export of the model run through onnxruntime (CPU)."""
+    name = "onnx"
+
+    def __init__(self, model: torch.nn.Module, model_id: str, cache_dir: str = ONNX_CACHE_DIR):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("onnx バックエンドには onnxruntime が必要です。") from e
+
+        self.config = model.config
+        self.id2label = dict(model.config.id2label)
+        self.device = torch.device("cpu")
+
+        path = Path(cache_dir) / _cache_key(model_id) / "model.onnx"
+        if not path.exists():
+            self._export(model, path)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    @staticmethod
+    def _export(model: torch.nn.Module, path: Path) -> None:
+        logger.info("ONNXエクスポート開始: path=%s", path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        example = {
+            "input_ids": torch.ones((2, 8), dtype=torch.long),
+            "attention_mask": torch.tensor([[1] * 8, [1] * 4 + [0] * 4], dtype=torch.long),
+            "token_type_ids": torch.zeros((2, 8), dtype=torch.long),
+        }
+        dynamic_axes = {k: {0: "batch", 1: "seq"} for k in names}
+        dynamic_axes["logits"] = {0: "batch"}
+
+        model = model.to("cpu").eval()
+        tmp = path.with_suffix(".onnx.tmp")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(example[k] for k in names),
+                str(tmp),
+                input_names=names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                dynamo=False,
+            )
+        tmp.replace(path)
+        logger.info("ONNXエクスポート完了: path=%s", path)
+
+    def logits(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        feed = {k: inputs[k].cpu().numpy() for k in self.input_names if k in inputs}
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feed:
+            feed["token_type_ids"] = torch.zeros_like(inputs["input_ids"]).numpy()
+        return torch.from_numpy(self.session.run(["logits"], feed)[0])
+
+
+def pretrained_kwargs(model_id: str) -> Dict[str, object]:
+    """
+    from_pretrained options for model_id.
+
+    A local snapshot directory is read without touching the network, and
+    when it ships safetensors weights those are used (memory-mapped, no
+    pickle) instead of falling back to pytorch_model.bin.
+    """
+    path = Path(model_id)
+    if not path.is_dir():
+        return {}
+    kwargs: Dict[str, object] = {"local_files_only": True}
+    if any(path.glob("*.safetensors")):
+        kwargs["use_safetensors"] = True
+    return kwargs
+
+
+def export_shared_weights(model_id: str, cache_dir: str = SHARED_WEIGHTS_DIR) -> Path:
+    """
+    Save the fp32 state dict of model_id once as a flat torch file.
+
+    Worker processes load it with torch.load(mmap=True), so the tensors are
+    backed by the same page-cache pages instead of one private copy per
+    process. Returns the path (reused when it already exists).
+    """
+    path = Path(cache_dir) / _cache_key(model_id) / "weights.pt"
+    if path.exists():
+        return path
+    logger.info("共有重みの書き出し開始: path=%s", path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_id, **pretrained_kwargs(model_id))
+    tmp = path.with_suffix(".pt.tmp")
+    torch.save(model.state_dict(), tmp)
+    tmp.replace(path)
+    logger.info("共有重みの書き出し完了: path=%s", path)
+    return path
+
+
+def _load_mmap(model_id: str, weights_path: str) -> torch.nn.Module:
+    """Build the model from its config and point the parameters at the memory-mapped weights."""
+    config = AutoConfig.from_pretrained(model_id, **pretrained_kwargs(model_id))
+    model = AutoModelForSequenceClassification.from_config(config)
+    state = torch.load(weights_path, mmap=True, weights_only=True, map_location="cpu")
+    # assign=True でコピーせず mmap のテンソルをそのままパラメータにする
+    model.load_state_dict(state, assign=True)
+    return model
+
+
+def load_backend(name: str, model_id: str, device: torch.device, weights_path: Optional[str] = None):
+    """
+    Load model_id and wrap it in the backend selected by name.
+
+    weights_path (see export_shared_weights) memory-maps the weights instead
+    of reading them into private memory; only the fp32 "torch" backend on
+    CPU keeps them shared, the others copy (quantize / export) anyway.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} (choose from {', '.join(BACKENDS)})")
+
+    if weights_path and name != "onnx":
+        model = _load_mmap(model_id, weights_path)
+    else:
+        # ONNX エクスポート時にトレース可能な eager attention を使用
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_id,
+            attn_implementation="eager" if name == "onnx" else None,
+            **pretrained_kwargs(model_id),
+        )
+    model.eval()
+
+    if name == "torch":
+        model.to(device)
+        return TorchBackend(model, device)
+    if name == "torch-int8":
+        return QuantizedTorchBackend(model)
+    return OnnxBackend(model, model_id)
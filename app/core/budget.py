@@ -0,0 +1,152 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# トークン予算が無効で batch_size の指定もない場合の 1 バッチの行数
+DEFAULT_BATCH_SIZE = 32
+
+
+def host_memory_bytes() -> int:
+    """Memory available to this process: cgroup limit if set, else physical RAM."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                raw = f.read().strip()
+        except OSError:
+            continue
+        # "max" や巨大値（= 無制限）は無視して物理メモリにフォールバック
+        if raw.isdigit() and int(raw) < (1 << 60):
+            return int(raw)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def is_oom(e: BaseException) -> bool:
+    """True for allocation failures raised by torch / onnxruntime."""
+    if isinstance(e, MemoryError):
+        return True
+    msg = str(e).lower()
+    return any(s in msg for s in ("out of memory", "can't allocate memory", "bad_alloc", "bad allocation", "failed to allocate"))
+
+
+@dataclass
+class TokenBudget:
+    """
+    Batch planning by padded tokens per forward pass instead of a fixed row count.
+
+    A batch of sorted texts costs rows * longest_length tokens; batches are
+    closed when that would exceed max_tokens, max_rows, or the activation
+    memory ceiling (memory_bytes, estimated from the model shape). An
+    explicit batch_size passed to plan() caps the rows per batch on top of
+    that. max_tokens=0 disables the budget (fixed batch_size, previous
+    behaviour).
+
+    After an allocation failure backoff() halves max_tokens; every
+    recover_after successful batches in a row double it again, up to the
+    value the budget started with (ceiling_tokens).
+    """
+    max_tokens: int = 8192
+    max_rows: int = 256
+    memory_bytes: int = 0            # 0 = no ceiling
+    min_tokens: int = 256            # backoff floor
+    recover_after: int = 50          # 0 = never recover after a backoff
+    hidden_size: int = 768
+    num_heads: int = 12
+    intermediate_size: int = 3072
+    ceiling_tokens: int = field(default=0, init=False)
+    _successes: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        self.ceiling_tokens = self.max_tokens
+
+    @classmethod
+    def from_model_config(cls, config, **kwargs) -> "TokenBudget":
+        return cls(
+            hidden_size=getattr(config, "hidden_size", 768),
+            num_heads=getattr(config, "num_attention_heads", 12),
+            intermediate_size=getattr(config, "intermediate_size", 3072),
+            **kwargs,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_tokens > 0
+
+    def activation_bytes(self, rows: int, seq_len: int) -> int:
+        """
+        Rough peak fp32 activation memory of one encoder layer (no grad):
+        hidden states, q/k/v, context, FFN intermediate and the attention
+        score/prob matrices, which grow with seq_len squared.
+        """
+        per_token = 6 * self.hidden_size + self.intermediate_size + 2 * self.num_heads * seq_len
+        return 4 * rows * seq_len * per_token
+
+    def rows_for(self, seq_len: int, row_cap: Optional[int] = None) -> int:
+        seq_len = max(seq_len, 1)
+        rows = min(row_cap or self.max_rows, self.max_rows, max(self.max_tokens // seq_len, 1))
+        if self.memory_bytes:
+            per_row = self.activation_bytes(1, seq_len)
+            rows = min(rows, max(self.memory_bytes // per_row, 1))
+        return rows
+
+    def plan(
+        self, lengths: Sequence[int], order: Sequence[int], batch_size: Optional[int] = None
+    ) -> Iterator[List[int]]:
+        """
+        Group `order` (indices into lengths) into consecutive batches.
+
+        Batches are produced lazily, so a backoff() while consuming them
+        already applies to the next batch. batch_size, when given, is a row
+        cap per batch. With the budget disabled this is plain batch_size
+        slicing (DEFAULT_BATCH_SIZE when None).
+        """
+        if not self.enabled:
+            batch_size = batch_size or DEFAULT_BATCH_SIZE
+            for i in range(0, len(order), batch_size):
+                yield list(order[i:i + batch_size])
+            return
+
+        cur: List[int] = []
+        longest = 0
+        for j in order:
+            longest_next = max(longest, lengths[j])
+            if cur and len(cur) + 1 > self.rows_for(longest_next, batch_size):
+                yield cur
+                cur, longest_next = [], lengths[j]
+            cur.append(j)
+            longest = longest_next
+        if cur:
+            yield cur
+
+    def backoff(self) -> bool:
+        """Halve max_tokens after an allocation failure; False once at the floor."""
+        if not self.enabled or self.max_tokens <= self.min_tokens:
+            return False
+        self.max_tokens = max(self.min_tokens, self.max_tokens // 2)
+        self._successes = 0
+        logger.warning("メモリ確保に失敗したためトークン予算を縮小します: max_tokens=%d", self.max_tokens)
+        return True
+
+    def record_success(self) -> bool:
+        """Count a batch that ran; True when this doubled max_tokens back toward ceiling_tokens."""
+        if not self.enabled or not self.recover_after or self.max_tokens >= self.ceiling_tokens:
+            return False
+        self._successes += 1
+        if self._successes < self.recover_after:
+            return False
+        self._successes = 0
+        self.max_tokens = min(self.ceiling_tokens, self.max_tokens * 2)
+        logger.info("トークン予算を回復します: max_tokens=%d", self.max_tokens)
+        return True
+
+
+def default_memory_ceiling(fraction: float, ceiling_mb: Optional[int] = None) -> int:
+    """Activation ceiling in bytes: explicit MB, else a fraction of host memory."""
+    if ceiling_mb:
+        return ceiling_mb * 1024 * 1024
+    return int(host_memory_bytes() * fraction)
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from . import config
+from .config import MODEL_ID
+
+logger = logging.getLogger(__name__)
+
+# (raw label, score) — モデル出力（ルール適用前）
+RawResult = Tuple[str, float]
+
+
+def rules_fingerprint() -> str:
+    """Short hash of the rule markers / thresholds in config.py."""
+    payload = json.dumps(
+        {
+            "TH_LOW": config.TH_LOW,
+            "TH_HIGH": config.TH_HIGH,
+            "DEV_DEPT": config.DEV_DEPT,
+            "EIGYOU_DEPT": config.EIGYOU_DEPT,
+            "NEU_MARKERS_GLOBAL": config.NEU_MARKERS_GLOBAL,
+            "POS_MARKERS_GLOBAL": config.POS_MARKERS_GLOBAL,
+            "NEU_MARKERS_DEV": config.NEU_MARKERS_DEV,
+            "NEU_MARKERS_EIGYOU": config.NEU_MARKERS_EIGYOU,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class InferenceCache:
+    """
+    Two-tier cache of raw model outputs: in-process LRU backed by SQLite.
+
+    Keys are content hashes of the normalized text, MODEL_ID, max_length and
+    the rule-marker fingerprint. Values are cached before rules are applied.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_entries: int = 50000,
+        disk_entries: int = 1000000,
+        model_id: str = MODEL_ID,
+    ):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._prefix = f"{model_id}\x00{rules_fingerprint()}\x00"
+        self._mem: "OrderedDict[str, RawResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        disk_count = 0
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            # 推論ワーカープロセスが同じファイルを共有するため、件数はプロセスごとに
+            # 持たず、トリガーで更新する件数行（entry_count）から読む
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, label TEXT NOT NULL,"
+                " score REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entry_count (id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO entry_count(id, n) SELECT 0, COUNT(*) FROM entries"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_count_insert AFTER INSERT ON entries "
+                "BEGIN UPDATE entry_count SET n = n + 1 WHERE id = 0; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_count_delete AFTER DELETE ON entries "
+                "BEGIN UPDATE entry_count SET n = n - 1 WHERE id = 0; END"
+            )
+            self._conn.commit()
+            disk_count = self._disk_count()
+
+        logger.info(
+            "推論キャッシュ初期化: path=%s, memory_entries=%d, disk_entries=%d, 既存件数=%d",
+            path, memory_entries, disk_entries, disk_count
+        )
+
+    @staticmethod
+    def create(model_id: str = MODEL_ID) -> Optional["InferenceCache"]:
+        """Build the cache from config, or None if disabled."""
+        if not config.CACHE_ENABLED:
+            return None
+        return InferenceCache(
+            path=config.CACHE_PATH,
+            memory_entries=config.CACHE_MEMORY_ENTRIES,
+            disk_entries=config.CACHE_DISK_ENTRIES,
+            model_id=model_id,
+        )
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return (text or "").strip()
+
+    def key(self, text: str, max_length: int) -> str:
+        raw = f"{self._prefix}{max_length}\x00{self.normalize(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _disk_count(self) -> int:
+        """Entries in the SQLite file, shared by every process using it."""
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT n FROM entry_count WHERE id = 0").fetchone()[0]
+
+    def _remember(self, key: str, value: RawResult) -> None:
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, RawResult]:
+        found: Dict[str, RawResult] = {}
+        missing = []
+        with self._lock:
+            for k in keys:
+                v = self._mem.get(k)
+                if v is not None:
+                    self._mem.move_to_end(k)
+                    found[k] = v
+                    self.memory_hits += 1
+                else:
+                    missing.append(k)
+
+            if self._conn is not None and missing:
+                now = time.time()
+                hit_keys = []
+                for i in range(0, len(missing), 500):
+                    part = missing[i:i+500]
+                    rows = self._conn.execute(
+                        f"SELECT key, label, score FROM entries WHERE key IN ({','.join('?' * len(part))})",
+                        part,
+                    ).fetchall()
+                    for k, label, score in rows:
+                        found[k] = (label, float(score))
+                        self._remember(k, found[k])
+                        hit_keys.append(k)
+                if hit_keys:
+                    self._conn.executemany(
+                        "UPDATE entries SET last_used=? WHERE key=?",
+                        [(now, k) for k in hit_keys],
+                    )
+                    self._conn.commit()
+                self.disk_hits += len(hit_keys)
+                self.misses += len(missing) - len(hit_keys)
+            else:
+                self.misses += len(missing)
+        return found
+
+    def put_many(self, items: Dict[str, RawResult]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for k, v in items.items():
+                self._remember(k, v)
+
+            if self._conn is None:
+                return
+            now = time.time()
+            # 挿入と件数確認・削除を 1 つの書き込みトランザクションで行い、
+            # 他のプロセスの挿入と交互にならないようにする
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entries(key, label, score, last_used) VALUES (?, ?, ?, ?)",
+                [(k, label, score, now) for k, (label, score) in items.items()],
+            )
+
+            overflow = self._disk_count() - self.disk_entries
+            if overflow > 0:
+                # 最終利用が古いものから削除（LRU）
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._mem),
+                "disk_entries": self._disk_count(),
+            }
@@ -1,4 +1,5 @@
 # app/core/config.py
+import os
 
 # =========================
 # CSV / Schema
@@ -7,6 +8,17 @@
 TEXT_COL = "answer_text"
 DEPT_COL = "department"
 SCORE_COL = "satisfaction_score"
+DATE_COL = "date"                # 任意（推移の集計に使用）
+
+# 推論結果カラム
+PRED_LABEL_COL = "sentiment_pred"
+PRED_SCORE_COL = "sentiment_score_pred"
+
+# チャンク読み込み時の1チャンクあたり行数
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "50000"))
+
+# 各段階（読み込み・前処理・推論後）の DataFrame のメモリ使用量をログに出すか
+MEMORY_REPORT = os.getenv("MEMORY_REPORT", "false").lower() == "true"
 
 
 # =========================
@@ -20,8 +32,20 @@ LABEL_NEU = "ニュートラル"
 # =========================
 # Model config
 # =========================
-# Japanese sentiment model (HuggingFace)
-MODEL_ID = "koheiduck/bert-japanese-finetuned-sentiment"
+# Japanese sentiment model (HuggingFace ID or local directory)
+MODEL_ID = os.getenv("MODEL_ID", "koheiduck/bert-japanese-finetuned-sentiment")
+
+# Inference backend: "torch" (fp32) / "torch-int8" (dynamic quantization) / "onnx"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", ".cache/onnx")
+# 推論ワーカープロセス間で mmap 共有する fp32 重みの保存先（INFERENCE_REPLICAS 使用時）
+SHARED_WEIGHTS_DIR = os.getenv("SHARED_WEIGHTS_DIR", ".cache/shared_weights")
+
+# ローカルに保存したモデルのスナップショット（指定時は MODEL_ID より優先し、ネットワークに接続しない）
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", "")
+
+# 起動時のウォームアップで推論するトークン長（カンマ区切り、空文字で無効）
+WARMUP_LENGTHS = [int(n) for n in os.getenv("MODEL_WARMUP_LENGTHS", "16,64,256").split(",") if n.strip()]
 
 # Confidence thresholds
 TH_LOW = 0.77
@@ -44,3 +68,107 @@ NEU_MARKERS_DEV = [
 NEU_MARKERS_EIGYOU = [
     "一部"
 ]
+
+
+# =========================
+# Inference cache
+# =========================
+# 推論結果（ルール適用前）のキャッシュ：プロセス内LRU + SQLite
+CACHE_ENABLED = os.getenv("INFERENCE_CACHE", "true").lower() == "true"
+CACHE_PATH = os.getenv("INFERENCE_CACHE_PATH", ".cache/inference_cache.sqlite3")
+CACHE_MEMORY_ENTRIES = int(os.getenv("INFERENCE_CACHE_MEMORY_ENTRIES", "50000"))
+CACHE_DISK_ENTRIES = int(os.getenv("INFERENCE_CACHE_DISK_ENTRIES", "1000000"))
+
+
+# =========================
+# Analytical store
+# =========================
+# スコアリング済みの行と日次・週次・月次ロールアップを保持する SQLite
+STORE_PATH = os.getenv("FEEDBACK_STORE_PATH", ".cache/feedback_store.sqlite3")
+
+
+# =========================
+# Token-budget batching
+# =========================
+# 1 回のモデル実行あたりのトークン数（パディング込み）の上限。0 で固定 batch_size に戻す
+INFERENCE_MAX_TOKENS = int(os.getenv("INFERENCE_MAX_TOKENS", "8192"))
+INFERENCE_MAX_ROWS = int(os.getenv("INFERENCE_MAX_ROWS", "256"))
+# メモリ不足で縮小したトークン予算は、この回数だけ続けて成功したバッチの後に 2 倍ずつ戻す（0 で戻さない）
+INFERENCE_BUDGET_RECOVER_AFTER = int(os.getenv("INFERENCE_BUDGET_RECOVER_AFTER", "50"))
+# 推論時のアクティベーションメモリ上限（MB）。0 の場合はホスト（cgroup）メモリの 25%
+INFERENCE_MEMORY_CEILING_MB = int(os.getenv("INFERENCE_MEMORY_CEILING_MB", "0"))
+INFERENCE_MEMORY_FRACTION = 0.25
+# 起動時にトークン予算を実測で調整するか
+INFERENCE_AUTOTUNE = os.getenv("INFERENCE_AUTOTUNE", "false").lower() == "true"
+
+
+# =========================
+# Near-duplicate collapsing
+# =========================
+# 文字 n-gram の Jaccard 類似度（MinHash LSH で推定）がこの値以上のテキストは、
+# 代表の 1 件だけを推論して結果を共有する。0 で無効（既定）
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0"))
+NEAR_DUP_SHINGLE = 3            # 文字 n-gram の長さ
+NEAR_DUP_PERMUTATIONS = 128     # MinHash の署名長
+
+
+# =========================
+# API micro-batching
+# =========================
+# 同時リクエストのテキストをまとめて1回の推論にする
+BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+
+
+# =========================
+# Inference replicas
+# =========================
+# 推論ワーカープロセスの数。0 の場合は API プロセス内の 1 インスタンスで推論する（既定）
+INFERENCE_REPLICAS = int(os.getenv("INFERENCE_REPLICAS", "0"))
+# 各レプリカに割り当てるコア数。0 の場合は利用可能なコアをレプリカ数で等分する
+INFERENCE_REPLICA_CORES = int(os.getenv("INFERENCE_REPLICA_CORES", "0"))
+# クラッシュしたワーカーを再起動するまでの待ち時間（連続クラッシュ時は倍々に延ばす、上限 30 秒）
+INFERENCE_RESTART_BACKOFF_SEC = float(os.getenv("INFERENCE_RESTART_BACKOFF_SEC", "1"))
+# 再起動したワーカーの初期化（モデル読み込み）がこの回数続けて失敗したら、再起動をやめてプールを failed にする
+INFERENCE_MAX_INIT_FAILURES = int(os.getenv("INFERENCE_MAX_INIT_FAILURES", "5"))
+
+
+# =========================
+# Profiling
+# =========================
+# /predict の profile=true（または X-Profile: 1 ヘッダー）と、バッチ経路（predict_batch）の
+# PROFILE_BATCH=true で推論の各段階を計測し、Chrome trace 形式の JSON を書き出す
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_BATCH = os.getenv("PROFILE_BATCH", "false").lower() == "true"
+# 指定されたリクエスト（バッチ経路では predict_batch の呼び出し）のうち実際に計測する割合
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+# torch.profiler で演算子単位まで記録するか（false の場合は段階ごとの時間のみ）
+PROFILE_TORCH = os.getenv("PROFILE_TORCH", "true").lower() == "true"
+# 保持するトレースの上限（件数・経過時間。超えた古いものから削除）
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_MAX_AGE_HOURS = float(os.getenv("PROFILE_MAX_AGE_HOURS", "24"))
+
+
+# =========================
+# Background jobs (/jobs)
+# =========================
+# ジョブのメタデータ・入力・結果の保存先（API 再起動後も保持される）
+JOBS_DIR = os.getenv("JOBS_DIR", ".cache/jobs")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+# 1 チャンクの行数（進捗・部分結果の更新単位）
+JOBS_CHUNK_ROWS = int(os.getenv("JOBS_CHUNK_ROWS", "1000"))
+# 完了したジョブを保持する時間（起動時に古いものを削除）
+JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", "168"))
+
+
+# =========================
+# Server-side analysis (/analyze)
+# =========================
+# ワードクラウド用に返す頻出語の件数（WordCloud の max_words 既定値と同じ）
+ANALYZE_TOP_WORDS = int(os.getenv("ANALYZE_TOP_WORDS", "200"))
+# プレビュー 1 ページあたりの最大行数
+ANALYZE_PAGE_MAX_ROWS = 1000
+# 満足度スコアの範囲。スコア分布はこの範囲の整数を中心とする幅 1 の固定ビンで集計する
+# （範囲外の行はビンに入れず件数だけ数える）
+SCORE_MIN = int(os.getenv("SCORE_MIN", "1"))
+SCORE_MAX = int(os.getenv("SCORE_MAX", "5"))
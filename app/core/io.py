@@ -1,13 +1,17 @@
 import pandas as pd
 import logging
-from .config import TEXT_COL, DEPT_COL, SCORE_COL
+from typing import Iterator
+from .config import TEXT_COL, DEPT_COL, SCORE_COL, CSV_CHUNK_ROWS
+from .memory import log_memory
 
 logger = logging.getLogger(__name__)
 
-def load_csv(file_like) -> pd.DataFrame:
-    df = pd.read_csv(file_like)
-    cols = set(df.columns)
+# テキスト列は object を経由せず Arrow 文字列として直接読み込む
+# （部署などのカテゴリ化は件数が確定した前処理で行う）
+READ_DTYPES = {TEXT_COL: pd.StringDtype("pyarrow"), DEPT_COL: pd.StringDtype("pyarrow")}
 
+
+def _check_schema(cols: set) -> None:
     # 必須カラムチェック
     if TEXT_COL not in cols:
         logger.error(
@@ -20,20 +24,21 @@ def load_csv(file_like) -> pd.DataFrame:
             f"CSVには少なくとも「{TEXT_COL}」カラムを含めてください。"
         )
 
-    # オプションカラムの有無
-    has_dept = DEPT_COL in cols
-    has_score = SCORE_COL in cols
 
+def _apply_fallbacks(df: pd.DataFrame, has_dept: bool, has_score: bool) -> pd.DataFrame:
     if not has_dept:
         df[DEPT_COL] = "Unknown"
 
     if not has_score:
         df[SCORE_COL] = pd.NA
+    return df
+
 
+def _log_loaded(n_rows: int, cols: set, has_dept: bool, has_score: bool) -> None:
     # 集約ログ（正常系）
     logger.info(
         "CSV読み込み完了: 行数=%d, カラム数=%d, カラム状態={%s}",
-        len(df),
+        n_rows,
         len(cols),
         ", ".join([
             f"{TEXT_COL}:OK",
@@ -51,4 +56,73 @@ def load_csv(file_like) -> pd.DataFrame:
             "存在" if has_score else "未存在",
         )
 
+
+def load_csv(file_like) -> pd.DataFrame:
+    df = pd.read_csv(file_like, dtype=READ_DTYPES)
+    cols = set(df.columns)
+
+    _check_schema(cols)
+
+    # オプションカラムの有無
+    has_dept = DEPT_COL in cols
+    has_score = SCORE_COL in cols
+
+    _apply_fallbacks(df, has_dept, has_score)
+    _log_loaded(len(df), cols, has_dept, has_score)
+    log_memory("load", df)
+
     return df
+
+
+def read_columns(file_like) -> set:
+    """Read only the header and run the same schema check as load_csv."""
+    cols = set(pd.read_csv(file_like, nrows=0).columns)
+    _check_schema(cols)
+    return cols
+
+
+def read_rows(path, offset: int, limit: int) -> pd.DataFrame:
+    """
+    Read data rows [offset, offset + limit) only, with the load_csv checks
+    and fallbacks (for paging through a large file).
+    """
+    cols = read_columns(path)
+    df = pd.read_csv(path, skiprows=range(1, offset + 1), nrows=limit, dtype=READ_DTYPES)
+    return _apply_fallbacks(df, DEPT_COL in cols, SCORE_COL in cols)
+
+
+def count_rows(path, block: int = 1 << 24) -> int:
+    """Approximate data rows (newlines minus header); used for progress / ETA only."""
+    n = 0
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(block)
+            if not buf:
+                break
+            n += buf.count(b"\n")
+    return max(n - 1, 0)
+
+
+def iter_csv(file_like, chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV as validated chunks of at most `chunksize` rows.
+
+    Same schema check and Unknown / pd.NA fallbacks as load_csv; the summary
+    is logged once after the last chunk. Peak memory is bounded by the chunk.
+    """
+    n_rows = 0
+    cols: set = set()
+    has_dept = has_score = False
+
+    with pd.read_csv(file_like, chunksize=chunksize, dtype=READ_DTYPES) as reader:
+        for i, chunk in enumerate(reader):
+            if i == 0:
+                cols = set(chunk.columns)
+                _check_schema(cols)
+                has_dept = DEPT_COL in cols
+                has_score = SCORE_COL in cols
+
+            n_rows += len(chunk)
+            yield _apply_fallbacks(chunk, has_dept, has_score)
+
+    _log_loaded(n_rows, cols, has_dept, has_score)
@@ -0,0 +1,34 @@
+import logging
+from typing import Dict
+
+import pandas as pd
+
+from .config import MEMORY_REPORT
+
+logger = logging.getLogger(__name__)
+
+
+def frame_memory(df: pd.DataFrame) -> Dict[str, int]:
+    """Deep memory usage in bytes per column (plus "index" and "total")."""
+    usage = df.memory_usage(deep=True)
+    out = {str(k): int(v) for k, v in usage.items()}
+    out["total"] = int(usage.sum())
+    return out
+
+
+def log_memory(stage: str, df: pd.DataFrame) -> None:
+    """
+    Log the frame footprint after a pipeline stage (load / clean / scored).
+
+    Measuring object columns deeply walks every value, so this is off
+    unless MEMORY_REPORT is enabled.
+    """
+    if not MEMORY_REPORT:
+        return
+    mem = frame_memory(df)
+    total = mem.pop("total")
+    logger.info(
+        "メモリ使用量: stage=%s, 行数=%d, 合計=%.1f MB, 列={%s}",
+        stage, len(df), total / 2**20,
+        ", ".join(f"{k}:{v / 2**20:.1f}MB({df[k].dtype})" for k, v in mem.items() if k in df.columns),
+    )
@@ -0,0 +1,275 @@
+import math
+from bisect import bisect_left
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus テキスト形式（version 0.0.4）で出力する軽量メトリクス。
+# 1 回の観測はロック取得と数回の加算のみで、本番で常時有効にできるコストに抑える。
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+# metric name -> label values -> child state（Registry.snapshot / merge）
+Snapshot = Dict[str, Dict[Tuple[str, ...], object]]
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def render(self, name, labelnames, key) -> List[str]:
+        return [f"{name}{_labels(labelnames, key)} {_fmt(self.value)}"]
+
+    def state(self) -> float:
+        return self.value
+
+    def absorb(self, state: float, base: Optional[float], absolute: bool) -> None:
+        if absolute:
+            self.set(state)
+        else:
+            self.inc(state - (base or 0.0))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def state(self) -> Tuple[Tuple[int, ...], float, int]:
+        with self._lock:
+            return tuple(self.counts), self.sum, self.count
+
+    def absorb(self, state, base, absolute: bool) -> None:
+        counts, total, count = state
+        if base is not None:
+            counts = [c - b for c, b in zip(counts, base[0])]
+            total, count = total - base[1], count - base[2]
+        with self._lock:
+            self.counts = [a + c for a, c in zip(self.counts, counts)]
+            self.sum += total
+            self.count += count
+
+    def render(self, name, labelnames, key) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for b, c in zip(self.buckets, counts):
+            cumulative += c
+            le = 'le="%s"' % _fmt(b)
+            lines.append(f"{name}_bucket{_labels(labelnames, key, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, key)} {_fmt(total)}")
+        lines.append(f"{name}_count{_labels(labelnames, key)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bucket_bounds = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.bucket_bounds)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Snapshot:
+        """Current state of every child (picklable; sent by inference worker processes)."""
+        return {m.name: {k: c.state() for k, c in list(m._children.items())} for m in self._metrics}
+
+    def merge(self, snap: Snapshot, base: Optional[Snapshot] = None) -> None:
+        """
+        Add another process's snapshot into this registry.
+
+        Counters and histograms add the increase since `base` (the previous
+        snapshot of the same process, or nothing after a restart); gauges
+        take the reported value.
+        """
+        base = base or {}
+        for m in self._metrics:
+            for key, state in snap.get(m.name, {}).items():
+                m.labels(*key).absorb(state, base.get(m.name, {}).get(key), m.kind == "gauge")
+
+
+REGISTRY = Registry()
+
+# =========================
+# Application metrics
+# =========================
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "feedback_http_request_seconds", "HTTP request latency", ("path",)
+))
+REQUEST_TEXTS = REGISTRY.register(Histogram(
+    "feedback_predict_request_texts", "Texts per /predict request", buckets=SIZE_BUCKETS
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "feedback_inference_batch_size", "Rows per model forward pass", buckets=SIZE_BUCKETS
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "feedback_inference_stage_seconds", "Latency of inference stages", ("stage",)
+))
+PADDING_RATIO = REGISTRY.register(Histogram(
+    "feedback_inference_padding_ratio", "Share of padding tokens per forward pass", buckets=RATIO_BUCKETS
+))
+OOM_SPLITS = REGISTRY.register(Counter(
+    "feedback_inference_oom_splits_total", "Batches split in half after an allocation failure"
+))
+TOKENS = REGISTRY.register(Counter(
+    "feedback_inference_tokens_total", "Tokens fed to the model", ("kind",)
+))
+TEXTS = REGISTRY.register(Counter(
+    "feedback_texts_total", "Texts labelled (kind=all|empty)", ("kind",)
+))
+EMPTY_RATIO = REGISTRY.register(Histogram(
+    "feedback_empty_text_ratio", "Share of empty texts per call", buckets=RATIO_BUCKETS
+))
+RULE_DECIDED = REGISTRY.register(Counter(
+    "feedback_rule_decided_texts_total", "Texts labelled by rules alone (rules_first mode, no inference)"
+))
+NEAR_DUP = REGISTRY.register(Counter(
+    "feedback_near_duplicate_texts_total", "Texts that reused the model output of a near-duplicate representative"
+))
+LABELS = REGISTRY.register(Counter(
+    "feedback_predicted_labels_total", "Final labels after rules", ("label",)
+))
+JOBS_QUEUED = REGISTRY.register(Gauge(
+    "feedback_jobs_queued", "Background jobs waiting for a worker"
+))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "feedback_jobs_finished_total", "Background jobs finished (status=done|failed|cancelled)", ("status",)
+))
+POOL_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "feedback_pool_queue_depth", "Batches queued or running on each inference replica", ("replica",)
+))
+POOL_INFLIGHT_TEXTS = REGISTRY.register(Gauge(
+    "feedback_pool_inflight_texts", "Texts queued or running on each inference replica", ("replica",)
+))
+POOL_RESTARTS = REGISTRY.register(Counter(
+    "feedback_pool_restarts_total", "Inference replica processes restarted after a crash", ("replica",)
+))
+POOL_REPLICA_FAILED = REGISTRY.register(Gauge(
+    "feedback_pool_replica_failed", "1 when an inference replica is no longer restarted after repeated init failures", ("replica",)
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    "feedback_model_load_seconds", "Model load time in SentimentService.create", ("backend",)
+))
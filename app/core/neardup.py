@@ -0,0 +1,152 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_SHIFT32 = np.uint64(32)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows per band) whose S-curve midpoint (1 / bands) ** (1 / rows)
+    is closest to `threshold`; bands * rows <= num_perm.
+    """
+    best = (num_perm, 1)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+def _shingle_hashes(texts: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    64-bit hashes of every character k-gram, for all texts at once.
+
+    Returns (hashes, owner) where owner[j] is the text index of hashes[j].
+    Texts shorter than k characters have no shingles.
+    """
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    n_shingles = np.maximum(lengths - k + 1, 0)
+    if not n_shingles.sum():
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+    owner = np.repeat(np.arange(len(texts)), n_shingles)
+    # 各テキスト内での k-gram の開始位置（テキストをまたぐ k-gram は作らない）
+    first = np.repeat(starts, n_shingles)
+    pos = first + (np.arange(len(owner)) - np.repeat(np.cumsum(n_shingles) - n_shingles, n_shingles))
+
+    h = np.full(len(owner), 0xCBF29CE484222325, dtype=np.uint64)
+    prime = np.uint64(0x100000001B3)
+    with np.errstate(over="ignore"):
+        for i in range(k):
+            h = (h ^ codes[pos + i]) * prime
+    return h, owner
+
+
+def minhash_signatures(texts: Sequence[str], k: int = 3, num_perm: int = 128, seed: int = 1) -> np.ndarray:
+    """
+    MinHash signatures (len(texts) x num_perm, uint32) over character
+    k-gram sets. Rows of texts without shingles are all 0xFFFFFFFF.
+    """
+    sig = np.full((len(texts), num_perm), 0xFFFFFFFF, dtype=np.uint32)
+    hashes, owner = _shingle_hashes(texts, k)
+    if not len(hashes):
+        return sig
+
+    # テキストごとの区間に並べ、区間ごとの最小値を reduceat で求める
+    present, seg_starts = np.unique(owner, return_index=True)
+    x = (hashes ^ (hashes >> _SHIFT32)) & _MASK32
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for p in range(num_perm):
+            hp = (a[p] * x + b[p]) >> _SHIFT32
+            sig[present, p] = np.minimum.reduceat(hp, seg_starts).astype(np.uint32)
+    return sig
+
+
+@dataclass
+class Clusters:
+    """Near-duplicate clustering of a list of texts."""
+    rep_of: List[int]              # representative row of every row (a representative points to itself)
+    representatives: List[int]     # rows that are inferred, in first-seen order
+    candidates: int = 0            # candidate pairs compared on their signatures
+
+    @property
+    def compression(self) -> float:
+        """Rows per representative (1.0 = nothing collapsed)."""
+        return len(self.rep_of) / len(self.representatives) if self.representatives else 1.0
+
+
+def cluster_near_duplicates(
+    texts: Sequence[str],
+    threshold: float,
+    k: int = 3,
+    num_perm: int = 128,
+) -> Clusters:
+    """
+    Group near-duplicate texts with MinHash LSH.
+
+    Rows are visited in order; a row joins the most similar existing
+    representative that shares an LSH bucket with it and whose estimated
+    Jaccard similarity (share of equal signature slots) is at least
+    `threshold`, otherwise it becomes a representative itself. Every member
+    is therefore within the threshold of its own representative (no
+    transitive chains). Identical texts always collapse; texts without
+    shingles (shorter than k characters) only collapse when identical.
+    """
+    t0 = time.perf_counter()
+    n = len(texts)
+    bands, rows = lsh_params(threshold, num_perm)
+    sig = minhash_signatures(texts, k=k, num_perm=bands * rows)
+
+    # バンドごとの行をまとめて 64 bit のキーにする
+    coef = np.random.default_rng(2).integers(1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+    with np.errstate(over="ignore"):
+        keys = (sig.reshape(n, bands, rows).astype(np.uint64) * coef).sum(axis=2, dtype=np.uint64)
+    keys = keys.tolist()
+
+    buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+    exact: Dict[str, int] = {}
+    rep_of: List[int] = []
+    representatives: List[int] = []
+    candidates = 0
+    min_equal = threshold * sig.shape[1]
+
+    for i, t in enumerate(texts):
+        rep = exact.get(t)
+        if rep is None and len(t) >= k:
+            seen = {r for band, key in zip(buckets, keys[i]) for r in band.get(key, ())}
+            if seen:
+                cand = np.fromiter(seen, dtype=np.int64, count=len(seen))
+                equal = (sig[cand] == sig[i]).sum(axis=1)
+                candidates += len(cand)
+                best = int(equal.argmax())
+                if equal[best] >= min_equal:
+                    rep = int(cand[best])
+        if rep is None:
+            rep = i
+            representatives.append(i)
+            exact[t] = i
+            if len(t) >= k:
+                for band, key in zip(buckets, keys[i]):
+                    band.setdefault(key, []).append(i)
+        rep_of.append(rep)
+
+    clusters = Clusters(rep_of=rep_of, representatives=representatives, candidates=candidates)
+    logger.info(
+        "近似重複の集約: 行数=%d, 代表=%d, 圧縮率=%.2fx, threshold=%.2f, bands=%d, rows=%d, 候補比較=%d, sec=%.2f",
+        n, len(representatives), clusters.compression, threshold, bands, rows, candidates, time.perf_counter() - t0,
+    )
+    return clusters
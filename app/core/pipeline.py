@@ -0,0 +1,54 @@
+import logging
+import time
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+from .config import TEXT_COL, DEPT_COL
+from .io import iter_csv
+from .preprocess import iter_clean, set_predictions
+from .sentiment import SentimentService
+
+logger = logging.getLogger(__name__)
+
+
+def iter_scored(
+    chunks: Iterable[pd.DataFrame],
+    svc: SentimentService,
+    use_dept_rules: bool,
+    **predict_kwargs,
+) -> Iterator[pd.DataFrame]:
+    """Add prediction columns to each cleaned chunk as it streams through."""
+    n_rows = 0
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        if len(chunk):
+            labels, scores = svc.predict_batch(
+                chunk[TEXT_COL].tolist(),
+                chunk[DEPT_COL].tolist(),
+                use_dept_rules=use_dept_rules,
+                **predict_kwargs,
+            )
+        else:
+            labels, scores = [], []
+        set_predictions(chunk, labels, scores)
+        n_rows += len(chunk)
+        yield chunk
+
+    logger.info("スコアリング完了: 行数=%d, sec=%.2f", n_rows, time.perf_counter() - t0)
+
+
+def score_csv(
+    file_like,
+    svc: SentimentService,
+    chunksize: int,
+    use_dept_rules: bool = True,
+    **predict_kwargs,
+) -> Iterator[pd.DataFrame]:
+    """End-to-end streaming pipeline: read -> validate -> clean -> score."""
+    return iter_scored(
+        iter_clean(iter_csv(file_like, chunksize=chunksize)),
+        svc,
+        use_dept_rules=use_dept_rules,
+        **predict_kwargs,
+    )
@@ -1,29 +1,112 @@
 import pandas as pd
+import numpy as np
 import logging
-from .config import TEXT_COL, DEPT_COL, SCORE_COL
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .config import (
+    TEXT_COL, DEPT_COL, DATE_COL, SCORE_COL, PRED_LABEL_COL, PRED_SCORE_COL,
+    LABEL_POS, LABEL_NEG, LABEL_NEU,
+)
+from .memory import log_memory
 
 logger = logging.getLogger(__name__)
 
-def clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
+# 省メモリな列の型
+# テキストは Arrow 文字列、部署・日付・感情ラベルは種類が少ないためカテゴリ、
+# スコアは整数なら nullable Int8、それ以外は float32
+TEXT_DTYPE = pd.StringDtype("pyarrow")
+LABELS = [LABEL_POS, LABEL_NEG, LABEL_NEU]
+
+# 重複の多いテキスト列（定型回答など）は、ユニーク率がこれ未満ならカテゴリで保持する
+TEXT_CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def _strings(s: pd.Series, fill: str) -> pd.Series:
+    # 欠損は文字列化する前に埋める（astype(str) が先だと NaN が "nan" になる）
+    return s.astype(TEXT_DTYPE).fillna(fill).str.strip()
+
 
+def compact_text(s: pd.Series, max_unique_ratio: float = TEXT_CATEGORY_MAX_UNIQUE_RATIO) -> pd.Series:
+    """Dictionary-encode a string column when most values repeat; otherwise keep Arrow strings."""
+    if len(s) and s.nunique(dropna=False) < max_unique_ratio * len(s):
+        return s.astype("category")
+    return s
+
+
+def compact_score(s: pd.Series) -> pd.Series:
+    """Numeric score column as nullable Int8 when every value is a small integer, else float32."""
+    s = pd.to_numeric(s, errors="coerce")
+    values = s.dropna().to_numpy(dtype=np.float64, na_value=np.nan)
+    if len(values) and np.all(values == np.round(values)) and values.min() >= -128 and values.max() <= 127:
+        return s.astype("Int8")
+    return s.astype("float32")
+
+
+def _clean_inplace(out: pd.DataFrame) -> Tuple[int, int]:
+    """Clean columns of `out` in place; return (empty texts, NaN scores)."""
     # --- answer_text ---
-    out[TEXT_COL] = out[TEXT_COL].astype(str).fillna("").str.strip()
-    empty_text_count = (out[TEXT_COL] == "").sum()
+    out[TEXT_COL] = _strings(out[TEXT_COL], "")
+    empty_text_count = int((out[TEXT_COL] == "").sum())
+    out[TEXT_COL] = compact_text(out[TEXT_COL])
 
     # --- department ---
-    out[DEPT_COL] = out[DEPT_COL].astype(str).fillna("Unknown").str.strip()
+    out[DEPT_COL] = _strings(out[DEPT_COL], "Unknown").astype("category")
+
+    # --- date（任意。値の種類が少ないためカテゴリで保持し、解釈は集計時に行う）---
+    if DATE_COL in out.columns:
+        out[DATE_COL] = out[DATE_COL].astype(TEXT_DTYPE).astype("category")
 
     # --- satisfaction_score ---
-    out[SCORE_COL] = pd.to_numeric(out[SCORE_COL], errors="coerce")
-    score_nan_count = out[SCORE_COL].isna().sum()
+    out[SCORE_COL] = compact_score(out[SCORE_COL])
+    score_nan_count = int(out[SCORE_COL].isna().sum())
 
+    return empty_text_count, score_nan_count
+
+
+def set_predictions(df: pd.DataFrame, labels: List[str], scores: List[Optional[float]]) -> pd.DataFrame:
+    """
+    Add the prediction columns in place: labels as a categorical over
+    LABELS (unexpected labels are appended as extra categories) and scores
+    as float32 (None -> NaN).
+    """
+    cat = pd.Categorical(labels)
+    extra = [c for c in cat.categories if c not in LABELS]
+    df[PRED_LABEL_COL] = cat.set_categories(LABELS + extra)
+    df[PRED_SCORE_COL] = np.asarray(scores, dtype=np.float32)
+    return df
+
+
+def _log_cleaned(n_rows: int, empty_text_count: int, score_nan_count: int) -> None:
     # --- aggregate log ---
     logger.info(
         "前処理完了: 行数=%d, 空テキスト件数=%d, satisfaction_score NaN件数=%d",
-        len(out),
+        n_rows,
         empty_text_count,
         score_nan_count,
     )
 
+
+def clean_df(df: pd.DataFrame) -> pd.DataFrame:
+    # 列は丸ごと置き換えるだけなので浅いコピーで十分（元の df は変更されない）
+    out = df.copy(deep=False)
+    empty_text_count, score_nan_count = _clean_inplace(out)
+    _log_cleaned(len(out), empty_text_count, score_nan_count)
+    log_memory("clean", out)
     return out
+
+
+def iter_clean(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """
+    Clean a stream of chunks (e.g. from io.iter_csv) without copying them.
+
+    Empty-text and NaN-score counts are aggregated across chunks and logged
+    once at the end, like clean_df does for a whole frame.
+    """
+    n_rows = empty_text_count = score_nan_count = 0
+    for chunk in chunks:
+        empty, nan = _clean_inplace(chunk)
+        n_rows += len(chunk)
+        empty_text_count += empty
+        score_nan_count += nan
+        yield chunk
+
+    _log_cleaned(n_rows, empty_text_count, score_nan_count)
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Sequence
+
+from .config import PROFILE_DIR, PROFILE_MAX_AGE_HOURS, PROFILE_MAX_FILES, PROFILE_SAMPLE_RATE, PROFILE_TORCH
+
+logger = logging.getLogger(__name__)
+
+# プロファイル中でないときに span() が返す共有の no-op
+_NULL = nullcontext()
+_local = threading.local()
+
+
+def span(name: str, **args: Any) -> ContextManager:
+    """
+    Mark a pipeline stage in the current trace.
+
+    Outside a profile() block this is one thread-local lookup and returns a
+    shared no-op context manager, so stages can stay instrumented.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        return _NULL
+    return session.span(name, args)
+
+
+def sampled(rate: float = PROFILE_SAMPLE_RATE) -> bool:
+    """True for a `rate` share of calls (1.0 = always)."""
+    return rate >= 1.0 or random.random() < rate
+
+
+def new_trace_id(prefix: str) -> str:
+    """File stem of a new trace, e.g. predict-20240101-120000-1a2b3c4d."""
+    return f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+class _Session:
+    """Spans of one profiled call (torch.profiler annotations, or plain Python timings)."""
+
+    def __init__(self, use_torch: bool):
+        self.use_torch = use_torch
+        self.events: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter_ns()
+
+    def span(self, name: str, args: Dict[str, Any]) -> ContextManager:
+        if self.use_torch:
+            import torch
+            return torch.profiler.record_function(name)
+        return self._span(name, args)
+
+    @contextmanager
+    def _span(self, name: str, args: Dict[str, Any]) -> Iterator[None]:
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter_ns()
+            self.events.append({
+                "name": name, "cat": "stage", "ph": "X",
+                "ts": (t0 - self._t0) / 1000, "dur": (t1 - t0) / 1000,
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": args,
+            })
+
+
+def _torch_profiler():
+    try:
+        import torch
+    except ImportError:
+        return None
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(activities=activities, record_shapes=True)
+
+
+@contextmanager
+def profile(
+    names: Sequence[str],
+    meta: Optional[Dict[str, Any]] = None,
+    directory: str = PROFILE_DIR,
+    use_torch: bool = PROFILE_TORCH,
+) -> Iterator[Optional[_Session]]:
+    """
+    Profile the block and write a Chrome trace JSON (<directory>/<name>.json)
+    for every name (one micro-batch may carry several profiled requests).
+
+    With use_torch the block runs under torch.profiler and the stages show up
+    as its user annotations next to the operators; otherwise only the
+    span() timings are written. `meta` (mutable until the block exits) is
+    stored as the trace's otherData. Nested calls profile into the outer
+    trace. Failing to write a trace is logged, never raised.
+    """
+    if getattr(_local, "session", None) is not None or not names:
+        yield None
+        return
+
+    prof = _torch_profiler() if use_torch else None
+    session = _Session(use_torch=prof is not None)
+    _local.session = session
+    t0 = time.perf_counter()
+    if prof is not None:
+        prof.__enter__()
+    try:
+        yield session
+    finally:
+        if prof is not None:
+            prof.__exit__(None, None, None)
+        _local.session = None
+        seconds = time.perf_counter() - t0
+        try:
+            _write(names, prof, session, {**(meta or {}), "seconds": round(seconds, 4)}, Path(directory))
+        except (OSError, ValueError) as e:
+            logger.warning("プロファイルの書き出しに失敗しました: names=%s, error=%s", list(names), e)
+
+
+def maybe_profile(prefix: str, enabled: bool, meta: Optional[Dict[str, Any]] = None) -> ContextManager:
+    """profile() under a new trace id when enabled and sampled, otherwise the no-op."""
+    if not enabled or not sampled():
+        return _NULL
+    return profile([new_trace_id(prefix)], meta)
+
+
+def _write(names: Sequence[str], prof, session: _Session, meta: Dict[str, Any], directory: Path) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    first = directory / f"{names[0]}.json"
+    tmp = first.with_suffix(".part")
+    if prof is not None:
+        prof.export_chrome_trace(str(tmp))
+        trace = json.loads(tmp.read_text(encoding="utf-8"))
+    else:
+        trace = {"traceEvents": session.events, "displayTimeUnit": "ms"}
+    trace["otherData"] = {**trace.get("otherData", {}), **meta}
+    tmp.write_text(json.dumps(trace, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, first)
+    for name in names[1:]:
+        shutil.copyfile(first, directory / f"{name}.json")
+    logger.info("プロファイルを書き出しました: path=%s, sec=%.3f", first, meta["seconds"])
+    prune(directory)
+
+
+def prune(
+    directory: str = PROFILE_DIR,
+    max_files: int = PROFILE_MAX_FILES,
+    max_age_hours: float = PROFILE_MAX_AGE_HOURS,
+) -> int:
+    """Delete traces older than max_age_hours, then the oldest beyond max_files. Returns the count."""
+    paths = []
+    for p in Path(directory).glob("*.json"):
+        try:
+            paths.append((p.stat().st_mtime, p))
+        except FileNotFoundError:
+            continue
+    paths.sort(reverse=True)
+
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for i, (mtime, p) in enumerate(paths):
+        if i >= max_files or mtime < cutoff:
+            p.unlink(missing_ok=True)
+            removed += 1
+    return removed
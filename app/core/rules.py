@@ -1,3 +1,11 @@
+import re
+from functools import reduce
+from operator import or_
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
 from .config import (
     LABEL_NEU, LABEL_POS,
     TH_LOW, TH_HIGH,
@@ -47,3 +55,161 @@ def override_to_positive(text: str, pred_label: str) -> str:
     if any(m in t for m in POS_MARKERS_GLOBAL):
         return LABEL_POS
     return pred_label
+
+def apply_rule_chain(text: str, pred_label: str, department: str, score: float, use_dept_rules: bool) -> str:
+    """Per-row rule chain applied to a raw model prediction."""
+    if len((text or "").strip()) == 0:
+        return LABEL_NEU
+
+    # 1) low confidence => neutral
+    if score < TH_LOW:
+        adj = LABEL_NEU
+    else:
+        # 2) global neutral markers
+        adj = override_to_neutral_global(text, pred_label)
+
+    # 3) dept-specific downgrades
+    if use_dept_rules:
+        adj = override_dev_only(text, adj, department, score)
+        adj = override_eigyou_only(text, adj, department, score)
+
+    # 4) global positive override last
+    return override_to_positive(text, adj)
+
+
+# =========================
+# Vectorized rules engine
+# =========================
+GROUP_NEU_GLOBAL = 1
+GROUP_POS_GLOBAL = 2
+GROUP_NEU_DEV = 4
+GROUP_NEU_EIGYOU = 8
+
+
+class MarkerMatcher:
+    """
+    Single-pass multi-pattern matcher over all marker lists.
+
+    One combined regex (longest alternative first) scans each text once.
+    Each marker's bitmask also carries the groups of every marker contained
+    in it, so the result equals running `any(m in t ...)` per group. If some
+    markers can overlap each other (a suffix of one is a prefix of another),
+    the pattern switches to an overlapping lookahead scan to stay exact.
+    """
+
+    def __init__(self, groups: Dict[int, List[str]]):
+        bits: Dict[str, int] = {}
+        for bit, markers in groups.items():
+            for m in markers:
+                if m:
+                    bits[m] = bits.get(m, 0) | bit
+
+        self.bits = {
+            m: reduce(or_, (b for p, b in bits.items() if p in m), 0)
+            for m in bits
+        }
+        overlapping = any(
+            a != b and any(a.endswith(b[:k]) for k in range(1, min(len(a), len(b))))
+            for a in bits for b in bits
+        )
+        alternation = "|".join(re.escape(m) for m in sorted(self.bits, key=len, reverse=True))
+        if not alternation:
+            self._pattern = None
+        elif overlapping:
+            self._pattern = re.compile(f"(?=({alternation}))")
+        else:
+            self._pattern = re.compile(alternation)
+
+    def scan(self, text: str) -> int:
+        if self._pattern is None or not text:
+            return 0
+        found = 0
+        for m in self._pattern.findall(text):
+            found |= self.bits[m]
+        return found
+
+    def scan_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Bitmask per text. Unique texts are joined and scanned in one pass."""
+        n = len(texts)
+        # アンケート回答は同一文の繰り返しが多いため、ユニークな文のみ走査する
+        rows, uniques = pd.factorize(pd.Series(texts, dtype=object), sort=False)
+        if self._pattern is None or len(uniques) == 0:
+            return np.zeros(n, dtype=np.uint8)
+
+        # マーカーは "\x00" を含まないため、区切りを跨ぐ一致は起こらない
+        unique = [str(u) for u in uniques]
+        lengths = np.fromiter(map(len, unique), dtype=np.int64, count=len(unique)) + 1
+        starts = np.cumsum(lengths) - lengths
+        joined = "\x00".join(unique)
+
+        group = 1 if self._pattern.groups else 0
+        hits = [(m.start(), m.group(group)) for m in self._pattern.finditer(joined)]
+
+        found = np.zeros(len(unique), dtype=np.uint8)
+        if hits:
+            pos = np.fromiter((h[0] for h in hits), dtype=np.int64, count=len(hits))
+            val = np.fromiter((self.bits[h[1]] for h in hits), dtype=np.uint8, count=len(hits))
+            np.bitwise_or.at(found, np.searchsorted(starts, pos, side="right") - 1, val)
+        return found[rows]
+
+
+MARKERS = MarkerMatcher({
+    GROUP_NEU_GLOBAL: NEU_MARKERS_GLOBAL,
+    GROUP_POS_GLOBAL: POS_MARKERS_GLOBAL,
+    GROUP_NEU_DEV: NEU_MARKERS_DEV,
+    GROUP_NEU_EIGYOU: NEU_MARKERS_EIGYOU,
+})
+
+
+def apply_rules_batch(
+    texts: Sequence[str],
+    pred_labels: Sequence[str],
+    departments: Sequence[str],
+    scores: Sequence[float],
+    use_dept_rules: bool,
+) -> List[str]:
+    """Column-wise equivalent of apply_rule_chain over whole arrays."""
+    n = len(texts)
+    if n == 0:
+        return []
+
+    stripped = [(t or "").strip() for t in texts]
+    found = MARKERS.scan_many(stripped)
+    empty = np.fromiter((not t for t in stripped), dtype=bool, count=n)
+    sc = np.asarray(scores, dtype=np.float64)
+    adj = np.array(pred_labels, dtype=object)
+
+    # 1) low confidence / 2) global neutral markers
+    adj[(sc < TH_LOW) | ((found & GROUP_NEU_GLOBAL) != 0)] = LABEL_NEU
+
+    # 3) dept-specific downgrades
+    if use_dept_rules:
+        dept = np.array([str(d) for d in departments], dtype=object)
+        band = (sc >= TH_LOW) & (sc < TH_HIGH)
+        adj[(dept == DEV_DEPT) & band & (adj == LABEL_POS) & ((found & GROUP_NEU_DEV) != 0)] = LABEL_NEU
+        adj[(dept == EIGYOU_DEPT) & band & (adj == LABEL_POS) & ((found & GROUP_NEU_EIGYOU) != 0)] = LABEL_NEU
+
+    # 4) global positive override last
+    adj[(found & GROUP_POS_GLOBAL) != 0] = LABEL_POS
+    adj[empty] = LABEL_NEU
+    return adj.tolist()
+
+
+def rule_decided_labels(texts: Sequence[str]) -> List[Optional[str]]:
+    """
+    Labels that the rule chain fixes regardless of the model output.
+
+    Empty texts always end up LABEL_NEU and texts containing a global
+    positive marker always end up LABEL_POS (override_to_positive runs
+    last). Every other row is None and needs inference.
+    """
+    n = len(texts)
+    if n == 0:
+        return []
+
+    stripped = [(t or "").strip() for t in texts]
+    found = MARKERS.scan_many(stripped)
+    out = np.full(n, None, dtype=object)
+    out[(found & GROUP_POS_GLOBAL) != 0] = LABEL_POS
+    out[np.fromiter((not t for t in stripped), dtype=bool, count=n)] = LABEL_NEU
+    return out.tolist()
@@ -1,138 +1,548 @@
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from transformers import AutoTokenizer
 
 import logging
 import time
 from collections import Counter
 
-from .config import MODEL_ID, TH_LOW, LABEL_NEU, LABEL_POS, LABEL_NEG
-from .rules import (
-    override_to_neutral_global,
-    override_dev_only,
-    override_eigyou_only,
-    override_to_positive
+from .backends import TorchBackend, load_backend, pretrained_kwargs
+from .budget import TokenBudget, default_memory_ceiling, is_oom
+from .cache import InferenceCache
+from .config import (
+    MODEL_ID, INFERENCE_BACKEND, LABEL_NEU, LABEL_POS, LABEL_NEG,
+    INFERENCE_MAX_TOKENS, INFERENCE_MAX_ROWS, INFERENCE_BUDGET_RECOVER_AFTER, INFERENCE_MEMORY_CEILING_MB, INFERENCE_MEMORY_FRACTION,
+    NEAR_DUP_PERMUTATIONS, NEAR_DUP_SHINGLE, NEAR_DUP_THRESHOLD, PROFILE_BATCH,
 )
+from .metrics import (
+    BATCH_SIZE, EMPTY_RATIO, LABELS, MODEL_LOAD_SECONDS, NEAR_DUP, OOM_SPLITS, PADDING_RATIO, RULE_DECIDED,
+    STAGE_SECONDS, TEXTS, TOKENS,
+)
+from .neardup import cluster_near_duplicates
+from .profiling import maybe_profile, span
+from .rules import apply_rules_batch, rule_decided_labels
 
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class BatchStats:
+    """Statistics of the last predict_batch call."""
+    n_rows: int = 0
+    n_inferred: int = 0        # rows actually sent to the model
+    cache_hits: int = 0        # rows served from the inference cache
+    real_tokens: int = 0       # non-padding tokens fed to the model
+    padded_tokens: int = 0     # total tokens incl. padding
+    rule_decided: int = 0      # rows labelled by rules alone (rules_first), never inferred
+    near_dup: int = 0          # rows that reused a near-duplicate representative's model output
+    n_batches: int = 0         # forward passes
+    oom_splits: int = 0        # batches split in half after an allocation failure
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of rows that did not need their own forward pass."""
+        if not self.n_rows:
+            return 0.0
+        return 1.0 - self.n_inferred / self.n_rows
+
+    @property
+    def rule_decided_ratio(self) -> float:
+        """Share of rows whose label was fixed by rules before inference."""
+        if not self.n_rows:
+            return 0.0
+        return self.rule_decided / self.n_rows
+
+    @property
+    def near_dup_ratio(self) -> float:
+        """Share of rows whose model output came from a different (near-duplicate) text."""
+        if not self.n_rows:
+            return 0.0
+        return self.near_dup / self.n_rows
+
+    @property
+    def padding_ratio(self) -> float:
+        """Share of padding tokens in the tensors fed to the model."""
+        if not self.padded_tokens:
+            return 0.0
+        return 1.0 - self.real_tokens / self.padded_tokens
+
+
+def record_labels(texts: List[str], labels: List[str]) -> None:
+    """Record text / empty-text / final-label metrics for one call."""
+    n = len(texts)
+    empty_count = sum(1 for t in texts if not (t or "").strip())
+    TEXTS.labels("all").inc(n)
+    TEXTS.labels("empty").inc(empty_count)
+    if n:
+        EMPTY_RATIO.observe(empty_count / n)
+    for label, count in Counter(labels).items():
+        LABELS.labels(label).inc(count)
+
+
+def log_completion(texts: List[str], labels: List[str], stats: BatchStats, seconds: float) -> None:
+    """Completion log line and high-empty-ratio warning for one predict_batch call or API micro-batch."""
+    n = len(texts)
+    empty_count = sum(1 for t in texts if len((t or "").strip()) == 0)
+    empty_ratio = empty_count / n if n else 0.0
+
+    logger.info(
+        "推論完了: sec=%.2f, ラベル分布=%s, 空テキスト=%d(%.1f%%), パディング率=%.1f%%, 重複排除率=%.1f%%, "
+        "キャッシュヒット=%d, ルール確定=%d(%.1f%%), 近似重複=%d(%.1f%%), バッチ数=%d, OOM分割=%d",
+        seconds, dict(Counter(labels)), empty_count, empty_ratio * 100,
+        stats.padding_ratio * 100, stats.dedup_ratio * 100, stats.cache_hits,
+        stats.rule_decided, stats.rule_decided_ratio * 100, stats.near_dup, stats.near_dup_ratio * 100,
+        stats.n_batches, stats.oom_splits
+    )
+
+    if empty_ratio >= 0.3:
+        logger.warning(
+            "空テキストの割合が高いです: %d/%d (%.1f%%)。結果がニュートラルに偏る可能性があります。",
+            empty_count, n, empty_ratio * 100
+        )
+
+
 @dataclass
 class SentimentService:
     tokenizer: AutoTokenizer
-    model: AutoModelForSequenceClassification
+    backend: TorchBackend                 # TorchBackend / QuantizedTorchBackend / OnnxBackend
     device: torch.device
+    cache: Optional[InferenceCache] = None
+    budget: TokenBudget = field(default_factory=TokenBudget)
+    near_dup_threshold: float = NEAR_DUP_THRESHOLD    # 0 = near-duplicate collapsing disabled
+    last_stats: BatchStats = field(default_factory=BatchStats)
 
     @staticmethod
-    def create() -> "SentimentService":
+    def create(
+        backend: str = INFERENCE_BACKEND,
+        model_id: str = MODEL_ID,
+        use_cache: bool = True,
+        snapshot_dir: Optional[str] = None,
+        weights_path: Optional[str] = None,
+    ) -> "SentimentService":
+        """
+        Load the tokenizer and model.
+
+        snapshot_dir, when given, is a local copy of model_id (e.g. from
+        huggingface_hub.snapshot_download) that is loaded instead of the hub
+        ID. The inference cache stays keyed on model_id. weights_path is a
+        file from backends.export_shared_weights to memory-map the weights
+        from (inference worker processes).
+        """
         t0 = time.perf_counter()
 
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        logger.info("モデル初期化開始: model_id=%s, device=%s", MODEL_ID, device)
+        if backend == "torch":
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        else:
+            device = torch.device("cpu")
+        source = snapshot_dir or model_id
+        logger.info("モデル初期化開始: model_id=%s, source=%s, backend=%s, device=%s", model_id, source, backend, device)
+
+        tokenizer = AutoTokenizer.from_pretrained(source, **pretrained_kwargs(source))
+        be = load_backend(backend, source, device, weights_path=weights_path)
 
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
-        model = AutoModelForSequenceClassification.from_pretrained(MODEL_ID)
-        model.to(device)
-        model.eval()
+        budget = TokenBudget.from_model_config(
+            be.config,
+            max_tokens=INFERENCE_MAX_TOKENS,
+            max_rows=INFERENCE_MAX_ROWS,
+            recover_after=INFERENCE_BUDGET_RECOVER_AFTER,
+            memory_bytes=default_memory_ceiling(INFERENCE_MEMORY_FRACTION, INFERENCE_MEMORY_CEILING_MB),
+        )
 
         dt = time.perf_counter() - t0
-        logger.info("モデル初期化完了: sec=%.2f, device=%s", dt, device)
+        MODEL_LOAD_SECONDS.labels(backend).set(dt)
+        logger.info(
+            "モデル初期化完了: sec=%.2f, backend=%s, device=%s, max_tokens=%d, memory_ceiling_mb=%d",
+            dt, backend, device, budget.max_tokens, budget.memory_bytes // (1024 * 1024)
+        )
 
-        return SentimentService(tokenizer=tokenizer, model=model, device=device)
+        return SentimentService(
+            tokenizer=tokenizer,
+            backend=be,
+            device=device,
+            cache=InferenceCache.create(model_id=f"{model_id}:{backend}") if use_cache else None,
+            budget=budget,
+        )
+
+    def warmup(self, lengths: List[int], batch_size: int = 32) -> float:
+        """
+        Run one forward pass per token length so that lazy initialisation
+        (allocator, kernels, onnxruntime graph) is paid before real traffic.
+        Metrics and the inference cache are not touched. Returns seconds.
+        """
+        t0 = time.perf_counter()
+        for length in lengths:
+            inputs = self.tokenizer(
+                ["あ"] * batch_size,
+                return_tensors="pt",
+                truncation=True,
+                padding="max_length",
+                max_length=length,
+            )
+            self.backend.logits(inputs)
+        dt = time.perf_counter() - t0
+        logger.info("ウォームアップ完了: sec=%.2f, lengths=%s, batch_size=%d", dt, lengths, batch_size)
+        return dt
+
+    def autotune(
+        self,
+        seq_len: int = 128,
+        candidates: Tuple[int, ...] = (1024, 2048, 4096, 8192, 16384, 32768),
+        tolerance: float = 0.05,
+    ) -> int:
+        """
+        Measure tokens/s per candidate budget on this host and keep the
+        smallest one within `tolerance` of the best (less memory for the
+        same throughput). Candidates above the memory ceiling, or that fail
+        to allocate, are skipped. Sets and returns budget.max_tokens.
+        """
+        rates: Dict[int, float] = {}
+        for tokens in candidates:
+            rows = max(tokens // seq_len, 1)
+            if self.budget.memory_bytes and self.budget.activation_bytes(rows, seq_len) > self.budget.memory_bytes:
+                break
+            inputs = self.tokenizer(
+                ["あ"] * rows, return_tensors="pt", truncation=True, padding="max_length", max_length=seq_len
+            )
+            try:
+                self.backend.logits(inputs)
+                t0 = time.perf_counter()
+                self.backend.logits(inputs)
+                rates[tokens] = rows * seq_len / (time.perf_counter() - t0)
+            except Exception as e:
+                if not is_oom(e):
+                    raise
+                break
+
+        if rates:
+            best = max(rates.values())
+            self.budget.max_tokens = min(t for t, r in rates.items() if r >= best * (1 - tolerance))
+            self.budget.ceiling_tokens = self.budget.max_tokens
+        logger.info(
+            "トークン予算の自動調整: max_tokens=%d, threads=%d, memory_ceiling_mb=%d, tokens/sec=%s",
+            self.budget.max_tokens, torch.get_num_threads(), self.budget.memory_bytes // (1024 * 1024),
+            {t: round(r) for t, r in rates.items()},
+        )
+        return self.budget.max_tokens
 
     def _id_to_jp(self, label_id: int) -> str:
-        lbl = str(self.model.config.id2label[int(label_id)]).upper()
+        lbl = str(self.backend.id2label[int(label_id)]).upper()
         if lbl == "POSITIVE":
             return LABEL_POS
         if lbl == "NEGATIVE":
             return LABEL_NEG
         return LABEL_NEU
 
-    def predict_batch(self, texts: List[str], depts: List[str], use_dept_rules: bool = True, batch_size: int = 32, max_length: int = 256) -> Tuple[List[str], List[float]]:
-        t0 = time.perf_counter()
+    def _forward(self, inputs: Dict[str, torch.Tensor], stats: BatchStats) -> Tuple[List[int], List[float]]:
+        mask = inputs["attention_mask"]
+        with STAGE_SECONDS.labels("forward").time(), span("forward", rows=mask.shape[0], seq=mask.shape[1]):
+            logits = self.backend.logits(inputs)
 
-        n = len(texts)
-        if n == 0:
-            logger.warning("推論対象が0件です。処理をスキップします。")
-            return [], []
-        
-        if len(depts) != n:
-            logger.error("入力長不一致: texts=%d, depts=%d", n, len(depts))
-            raise ValueError(f"Length mismatch: texts={n}, depts={len(depts)}")
+        real, padded = int(mask.sum()), mask.numel()
+        stats.real_tokens += real
+        stats.padded_tokens += padded
+        stats.n_batches += 1
+        BATCH_SIZE.observe(mask.shape[0])
+        PADDING_RATIO.observe(1.0 - real / padded if padded else 0.0)
+        TOKENS.labels("real").inc(real)
+        TOKENS.labels("padded").inc(padded)
 
-        logger.info(
-            "推論開始: n=%d, batch_size=%d, max_length=%d, device=%s, dept_rules=%s",
-            n, batch_size, max_length, self.device, "有効" if use_dept_rules else "無効"
-        )
+        with STAGE_SECONDS.labels("softmax").time(), span("softmax"):
+            probs = torch.softmax(logits, dim=-1)
+            pred_ids = torch.argmax(probs, dim=-1).tolist()
+            pred_sc = probs.max(dim=-1).values.tolist()
+        return pred_ids, [float(sc) for sc in pred_sc]
 
-        labels: List[str] = []
-        scores: List[float] = []
+    def predict_raw(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        max_length: int = 256,
+        sort_by_length: bool = False,
+        stats: Optional[BatchStats] = None,
+    ) -> Tuple[List[str], List[float]]:
+        """
+        Run the model only (no rules). Empty texts get (LABEL_NEU, 0.0).
 
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            batch_depts = depts[i:i+batch_size]
+        With sort_by_length=True, identical texts are inferred once and the
+        unique texts are bucketed by token length to minimise padding.
+        Rows found in the inference cache skip the model entirely.
+        """
+        stats = stats if stats is not None else BatchStats()
+        stats.n_rows += len(texts)
 
-            empty_mask = [len((t or "").strip()) == 0 for t in batch_texts]
-            safe_texts = [t if (t or "").strip() else " " for t in batch_texts]
+        if self.cache is None:
+            return self._infer(texts, batch_size, max_length, sort_by_length, stats)
 
-            inputs = self.tokenizer(
-                safe_texts,
-                return_tensors="pt",
-                truncation=True,
-                padding=True,
-                max_length=max_length
+        with span("cache_lookup", rows=len(texts)):
+            keys = [
+                self.cache.key(t, max_length) if (t or "").strip() else None
+                for t in texts
+            ]
+            found = self.cache.get_many({k for k in keys if k is not None})
+
+        miss_rows = [i for i, k in enumerate(keys) if k is not None and k not in found]
+        if miss_rows:
+            miss_labels, miss_scores = self._infer(
+                [texts[i] for i in miss_rows], batch_size, max_length, sort_by_length, stats
             )
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            computed = {
+                keys[i]: (label, sc)
+                for i, label, sc in zip(miss_rows, miss_labels, miss_scores)
+            }
+            with span("cache_store", rows=len(computed)):
+                self.cache.put_many(computed)
+            found.update(computed)
+        stats.cache_hits += sum(1 for k in keys if k is not None) - len(miss_rows)
 
-            with torch.no_grad():
-                logits = self.model(**inputs).logits
+        raw_labels = [found[k][0] if k is not None else LABEL_NEU for k in keys]
+        scores = [found[k][1] if k is not None else 0.0 for k in keys]
+        return raw_labels, scores
 
-            probs = torch.softmax(logits, dim=-1)
-            pred_ids = torch.argmax(probs, dim=-1).tolist()
-            pred_sc = probs.max(dim=-1).values.tolist()
+    def predict_raw_collapsed(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        max_length: int = 256,
+        sort_by_length: bool = False,
+        stats: Optional[BatchStats] = None,
+    ) -> Tuple[List[str], List[float]]:
+        """
+        predict_raw with near-duplicate collapsing (when near_dup_threshold > 0).
+
+        Texts are grouped with MinHash LSH on character shingles; only one
+        representative per group goes through predict_raw and its raw label
+        and score are copied to the other members. Rules are not applied
+        here, so callers still evaluate them per row on each member's own
+        text (a member may contain a marker its representative lacks).
+        """
+        if not self.near_dup_threshold:
+            return self.predict_raw(texts, batch_size, max_length, sort_by_length, stats)
+
+        stats = stats if stats is not None else BatchStats()
+        with STAGE_SECONDS.labels("near_dup").time(), span("near_dup", rows=len(texts)):
+            clusters = cluster_near_duplicates(
+                texts, self.near_dup_threshold, k=NEAR_DUP_SHINGLE, num_perm=NEAR_DUP_PERMUTATIONS
+            )
+        reps = clusters.representatives
+        rep_labels, rep_scores = self.predict_raw(
+            [texts[r] for r in reps], batch_size, max_length, sort_by_length, stats
+        )
+        # 代表以外の行も行数には含める（重複排除率・近似重複率の分母）
+        stats.n_rows += len(texts) - len(reps)
+
+        slot = {r: j for j, r in enumerate(reps)}
+        raw_labels = [rep_labels[slot[r]] for r in clusters.rep_of]
+        scores = [rep_scores[slot[r]] for r in clusters.rep_of]
+        near = sum(1 for t, r in zip(texts, clusters.rep_of) if t != texts[r])
+        stats.near_dup += near
+        NEAR_DUP.inc(near)
+        return raw_labels, scores
+
+    def _infer(
+        self,
+        texts: List[str],
+        batch_size: Optional[int],
+        max_length: int,
+        sort_by_length: bool,
+        stats: BatchStats,
+    ) -> Tuple[List[str], List[float]]:
+        """
+        Tokenize once, then run the model batch by batch.
 
-            for j, (is_empty, pid, sc) in enumerate(zip(empty_mask, pred_ids, pred_sc)):
-                sc = float(sc)
-                if is_empty:
-                    labels.append(LABEL_NEU)
-                    scores.append(0.0)
+        Batches follow the token budget (self.budget), with batch_size as
+        an extra row cap when given (the fixed batch size when the budget is
+        disabled). With sort_by_length, identical texts are inferred once
+        and batches are formed in token-length order; otherwise rows keep
+        arrival order.
+        """
+        if sort_by_length:
+            # 重複排除（空テキストはモデルに送らない）
+            slot_of: Dict[str, int] = {}
+            row_slots: List[int] = []
+            for t in texts:
+                if not (t or "").strip():
+                    row_slots.append(-1)
                     continue
+                row_slots.append(slot_of.setdefault(t, len(slot_of)))
+            to_model = list(slot_of)
+        else:
+            to_model = [t if (t or "").strip() else " " for t in texts]
 
-                raw = self._id_to_jp(pid)
+        model_labels: List[str] = [LABEL_NEU] * len(to_model)
+        model_scores: List[float] = [0.0] * len(to_model)
 
-                # 1) low confidence => neutral
-                if sc < TH_LOW:
-                    adj = LABEL_NEU
-                else:
-                    # 2) global neutral markers
-                    adj = override_to_neutral_global(batch_texts[j], raw)
+        if to_model:
+            with STAGE_SECONDS.labels("tokenize").time(), span("tokenize", rows=len(to_model)):
+                enc = self.tokenizer(to_model, truncation=True, max_length=max_length)
+            features = [
+                {k: enc[k][i] for k in enc.keys()} for i in range(len(to_model))
+            ]
+            lengths = [len(f["input_ids"]) for f in features]
+            order = (
+                sorted(range(len(to_model)), key=lengths.__getitem__)
+                if sort_by_length else range(len(to_model))
+            )
+            for idx in self.budget.plan(lengths, order, batch_size):
+                self._run_batch(features, idx, model_labels, model_scores, stats)
+            stats.n_inferred += len(to_model)
 
-                # 3) dept-specific downgrades
-                if use_dept_rules:
-                    adj = override_dev_only(batch_texts[j], adj, batch_depts[j], sc)
-                    adj = override_eigyou_only(batch_texts[j], adj, batch_depts[j], sc)
+        if sort_by_length:
+            raw_labels = [model_labels[s] if s >= 0 else LABEL_NEU for s in row_slots]
+            scores = [model_scores[s] if s >= 0 else 0.0 for s in row_slots]
+            return raw_labels, scores
 
-                # 4) global positive override last
-                adj = override_to_positive(batch_texts[j], adj)
+        empty = [not (t or "").strip() for t in texts]
+        raw_labels = [LABEL_NEU if e else label for e, label in zip(empty, model_labels)]
+        scores = [0.0 if e else sc for e, sc in zip(empty, model_scores)]
+        return raw_labels, scores
 
-                labels.append(adj)
-                scores.append(sc)
+    def _run_batch(
+        self,
+        features: List[Dict[str, List[int]]],
+        idx: List[int],
+        labels: List[str],
+        scores: List[float],
+        stats: BatchStats,
+    ) -> None:
+        """Pad and infer one batch; on allocation failure shrink the budget and split it."""
+        try:
+            with STAGE_SECONDS.labels("pad").time(), span("pad", rows=len(idx)):
+                inputs = self.tokenizer.pad([features[j] for j in idx], return_tensors="pt")
+            pred_ids, pred_sc = self._forward(inputs, stats)
+        except Exception as e:
+            if not is_oom(e) or len(idx) == 1:
+                raise
+            self.budget.backoff()
+            stats.oom_splits += 1
+            OOM_SPLITS.inc()
+            logger.warning("メモリ確保に失敗したためバッチを分割します: rows=%d, error=%s", len(idx), e)
+            mid = len(idx) // 2
+            self._run_batch(features, idx[:mid], labels, scores, stats)
+            self._run_batch(features, idx[mid:], labels, scores, stats)
+            return
 
-        dt = time.perf_counter() - t0
-        label_counts = Counter(labels)
+        self.budget.record_success()
+        for j, pid, sc in zip(idx, pred_ids, pred_sc):
+            labels[j] = self._id_to_jp(pid)
+            scores[j] = sc
+
+    def apply_rules(
+        self,
+        texts: List[str],
+        raw_labels: List[str],
+        depts: List[str],
+        scores: List[float],
+        use_dept_rules: bool,
+        record: bool = True,
+    ) -> List[str]:
+        """Apply the override rules to raw model output and record label metrics."""
+        with STAGE_SECONDS.labels("rules").time(), span("rules", rows=len(texts)):
+            labels = apply_rules_batch(texts, raw_labels, depts, scores, use_dept_rules)
+        if record:
+            record_labels(texts, labels)
+        return labels
+
+    def split_rule_decided(self, texts: List[str]) -> Tuple[List[Optional[str]], List[int]]:
+        """
+        rules_first mode: labels fixed by rules alone, and the row indices
+        that still need the model.
+        """
+        with STAGE_SECONDS.labels("rules").time(), span("rules_first", rows=len(texts)):
+            decided = rule_decided_labels(texts)
+        todo = [i for i, label in enumerate(decided) if label is None]
+        RULE_DECIDED.inc(len(texts) - len(todo))
+        return decided, todo
+
+    def apply_rules_first(
+        self,
+        texts: List[str],
+        depts: List[str],
+        decided: List[Optional[str]],
+        todo: List[int],
+        raw_labels: List[str],
+        scores: List[float],
+        use_dept_rules: bool,
+    ) -> Tuple[List[str], List[Optional[float]]]:
+        """
+        Merge rule-decided rows with the model output of the `todo` rows.
+
+        Rows that skipped the model get score None (not computed).
+        """
+        todo_labels = self.apply_rules(
+            [texts[i] for i in todo], raw_labels, [depts[i] for i in todo], scores,
+            use_dept_rules, record=False,
+        )
+        labels: List[str] = list(decided)
+        out_scores: List[Optional[float]] = [None] * len(texts)
+        for i, label, sc in zip(todo, todo_labels, scores):
+            labels[i] = label
+            out_scores[i] = sc
+        record_labels(texts, labels)
+        return labels, out_scores
+
+    def predict_batch(
+        self,
+        texts: List[str],
+        depts: List[str],
+        use_dept_rules: bool = True,
+        batch_size: Optional[int] = None,
+        max_length: int = 256,
+        sort_by_length: bool = False,
+        rules_first: bool = False,
+    ) -> Tuple[List[str], List[Optional[float]]]:
+        """
+        Predict final labels (model + rules) and scores.
+
+        sort_by_length=True (used by /predict and the CLI) infers duplicates
+        once in token-length ordered batches; labels are the same either way.
+        With rules_first=True, rows whose label the rules fix regardless of
+        the model (empty texts, global positive markers) are not inferred;
+        their score is None. Labels are identical to the default mode.
+        """
+        t0 = time.perf_counter()
 
-        empty_count = sum(1 for t in texts if len((t or "").strip()) == 0)
-        empty_ratio = empty_count / n if n else 0.0
+        n = len(texts)
+        if n == 0:
+            logger.warning("推論対象が0件です。処理をスキップします。")
+            return [], []
+
+        if len(depts) != n:
+            logger.error("入力長不一致: texts=%d, depts=%d", n, len(depts))
+            raise ValueError(f"Length mismatch: texts={n}, depts={len(depts)}")
 
         logger.info(
-            "推論完了: sec=%.2f, ラベル分布=%s, 空テキスト=%d(%.1f%%)",
-            dt, dict(label_counts), empty_count, empty_ratio * 100
+            "推論開始: n=%d, batch_size=%s, max_tokens=%d, max_length=%d, device=%s, dept_rules=%s, sort_by_length=%s, rules_first=%s",
+            n, batch_size, self.budget.max_tokens, max_length, self.device,
+            "有効" if use_dept_rules else "無効", sort_by_length, rules_first
         )
 
-        if empty_ratio >= 0.3:
-            logger.warning(
-                "空テキストの割合が高いです: %d/%d (%.1f%%)。結果がニュートラルに偏る可能性があります。",
-                empty_count, n, empty_ratio * 100
-            )
+        # PROFILE_BATCH=true の場合、サンプリングされた呼び出しのトレースを書き出す
+        meta = {"rows": n, "batch_size": batch_size, "max_length": max_length, "rules_first": rules_first}
+        with maybe_profile("batch", PROFILE_BATCH, meta):
+            stats = BatchStats()
+            if rules_first:
+                # ルールだけでラベルが確定する行はモデルに送らない
+                decided, todo = self.split_rule_decided(texts)
+                stats.rule_decided = n - len(todo)
+                stats.n_rows += stats.rule_decided
+                raw_labels, raw_scores = self.predict_raw_collapsed(
+                    [texts[i] for i in todo], batch_size=batch_size, max_length=max_length,
+                    sort_by_length=sort_by_length, stats=stats,
+                )
+                labels, scores = self.apply_rules_first(
+                    texts, depts, decided, todo, raw_labels, raw_scores, use_dept_rules
+                )
+            else:
+                raw_labels, scores = self.predict_raw_collapsed(
+                    texts, batch_size=batch_size, max_length=max_length,
+                    sort_by_length=sort_by_length, stats=stats,
+                )
+                # ルールは重複排除・近似重複の集約後も行ごとに（列単位でまとめて）適用する
+                labels = self.apply_rules(texts, raw_labels, depts, scores, use_dept_rules)
+            meta.update(inferred=stats.n_inferred, forward_passes=stats.n_batches, padding_ratio=stats.padding_ratio)
+        self.last_stats = stats
+
+        log_completion(texts, labels, stats, time.perf_counter() - t0)
         return labels, scores
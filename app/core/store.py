@@ -0,0 +1,334 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .analytics import NO_DATE, PERIODS, order_label_columns, period_buckets, score_edges, trend_frame
+from .config import DATE_COL, DEPT_COL, PRED_LABEL_COL, PRED_SCORE_COL, SCORE_COL, TEXT_COL
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackStore:
+    """
+    Embedded SQLite store of scored feedback rows with date rollups.
+
+    `feedback` holds one row per answer (indexed on department, date and
+    sentiment). `rollups` holds sentiment counts and satisfaction-score sums
+    per period bucket x department x label for day / week / month, and
+    `score_counts` holds the number of rows per department x satisfaction
+    score; both are updated in the same transaction as every ingest, so
+    trend and histogram queries never scan the raw rows. Ingests can carry a source id (e.g. an upload hash or
+    file + chunk) and are skipped when that source was already stored.
+
+    dept_counts / score_hist / pivot_dept_sentiment return the same shapes as
+    the frame-based functions in analytics.py, which delegate here when
+    given a store instead of a DataFrame.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        has_score_counts = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'score_counts'"
+        ).fetchone() is not None
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY,
+                source TEXT,
+                department TEXT,
+                date TEXT,
+                answer_text TEXT,
+                satisfaction_score REAL,
+                sentiment TEXT,
+                sentiment_score REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_feedback_department ON feedback(department, satisfaction_score);
+            CREATE INDEX IF NOT EXISTS idx_feedback_date ON feedback(date);
+            CREATE INDEX IF NOT EXISTS idx_feedback_sentiment ON feedback(sentiment);
+
+            CREATE TABLE IF NOT EXISTS rollups (
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                department TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                score_sum REAL NOT NULL,
+                score_n INTEGER NOT NULL,
+                PRIMARY KEY (period, bucket, department, sentiment)
+            );
+            CREATE INDEX IF NOT EXISTS idx_rollups_department ON rollups(period, department, bucket);
+
+            CREATE TABLE IF NOT EXISTS score_counts (
+                department TEXT NOT NULL,
+                score REAL NOT NULL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (department, score)
+            );
+
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                n_rows INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            """
+        )
+        if not has_score_counts:
+            # score_counts がなかった既存のストアは、取り込み済みの行から作る
+            self._conn.execute(
+                "INSERT INTO score_counts (department, score, n)"
+                " SELECT department, satisfaction_score, COUNT(*) FROM feedback"
+                " WHERE satisfaction_score IS NOT NULL GROUP BY department, satisfaction_score"
+            )
+        self._conn.commit()
+
+    @staticmethod
+    def create() -> "FeedbackStore":
+        return FeedbackStore(config.STORE_PATH)
+
+    # -------------------------
+    # Ingest
+    # -------------------------
+    def has_source(self, source: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sources WHERE source = ?", (source,)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+        """Scored frame -> store columns (dates parsed, missing optional columns as NULL)."""
+        n = len(df)
+        dates = (
+            pd.to_datetime(df[DATE_COL], errors="coerce", format="mixed")
+            if DATE_COL in df.columns else pd.Series(pd.NaT, index=df.index)
+        )
+        return pd.DataFrame({
+            "department": df[DEPT_COL].astype(str) if DEPT_COL in df.columns else "Unknown",
+            "date": dates,
+            "answer_text": df[TEXT_COL].astype(str) if TEXT_COL in df.columns else None,
+            "satisfaction_score": (
+                pd.to_numeric(df[SCORE_COL], errors="coerce") if SCORE_COL in df.columns else np.full(n, np.nan)
+            ),
+            "sentiment": df[PRED_LABEL_COL].astype(str),
+            "sentiment_score": (
+                pd.to_numeric(df[PRED_SCORE_COL], errors="coerce") if PRED_SCORE_COL in df.columns else np.full(n, np.nan)
+            ),
+        })
+
+    @staticmethod
+    def _rollup(rows: pd.DataFrame, period: str) -> List[Tuple]:
+        g = rows.assign(bucket=period_buckets(rows["date"], period)).groupby(
+            ["bucket", "department", "sentiment"], sort=False
+        )["satisfaction_score"].agg(["size", "sum", "count"])
+        keys = g.index.to_frame(index=False)
+        return list(zip(
+            [period] * len(g), keys["bucket"].tolist(), keys["department"].tolist(), keys["sentiment"].tolist(),
+            g["size"].tolist(), g["sum"].astype(float).tolist(), g["count"].tolist(),
+        ))
+
+    @staticmethod
+    def _score_counts(rows: pd.DataFrame) -> List[Tuple]:
+        g = rows.dropna(subset=["satisfaction_score"]).groupby(
+            ["department", "satisfaction_score"], sort=False
+        ).size()
+        keys = g.index.to_frame(index=False)
+        return list(zip(
+            keys["department"].tolist(), keys["satisfaction_score"].astype(float).tolist(), g.tolist(),
+        ))
+
+    def ingest(self, df: pd.DataFrame, source: Optional[str] = None) -> int:
+        """
+        Store scored rows and update the rollups atomically.
+
+        Returns the number of rows stored (0 if `source` was already ingested).
+        The source is claimed with INSERT OR IGNORE in the same transaction
+        as the rows, so concurrent ingests of one source store it once.
+        """
+        # 取り込み済みなら前処理もせずに返す（確定の判定は下のトランザクション内で行う）
+        if source is not None and self.has_source(source):
+            logger.info("取り込み済みのためスキップします: source=%s", source)
+            return 0
+        if PRED_LABEL_COL not in df.columns:
+            raise ValueError(f"推論結果カラム「{PRED_LABEL_COL}」がありません。スコアリング後のデータを渡してください。")
+
+        t0 = time.perf_counter()
+        rows = self._normalize(df)
+        date_str = period_buckets(rows["date"], "day")
+        records = zip(
+            [source] * len(rows),
+            rows["department"].tolist(),
+            date_str.where(date_str != NO_DATE, None).tolist(),
+            rows["answer_text"].tolist() if rows["answer_text"].notna().any() else [None] * len(rows),
+            rows["satisfaction_score"].astype(object).where(rows["satisfaction_score"].notna(), None).tolist(),
+            rows["sentiment"].tolist(),
+            rows["sentiment_score"].astype(object).where(rows["sentiment_score"].notna(), None).tolist(),
+        )
+        rollups = [r for period in PERIODS for r in self._rollup(rows, period)]
+        score_counts = self._score_counts(rows)
+
+        with self._lock:
+            try:
+                # 他の接続（CLI・別プロセス）と同じ source を同時に取り込んでも一度だけになるよう、
+                # 書き込みロックを取ってから source を登録し、登録できた場合だけ行を追加する
+                self._conn.execute("BEGIN IMMEDIATE")
+                if source is not None:
+                    claimed = self._conn.execute(
+                        "INSERT OR IGNORE INTO sources (source, n_rows, ingested_at) VALUES (?, ?, ?)",
+                        (source, len(rows), time.time()),
+                    ).rowcount
+                    if not claimed:
+                        self._conn.rollback()
+                        logger.info("取り込み済みのためスキップします: source=%s", source)
+                        return 0
+                self._conn.executemany(
+                    "INSERT INTO feedback (source, department, date, answer_text, satisfaction_score,"
+                    " sentiment, sentiment_score) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    records,
+                )
+                self._conn.executemany(
+                    "INSERT INTO rollups (period, bucket, department, sentiment, n, score_sum, score_n)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (period, bucket, department, sentiment) DO UPDATE SET"
+                    " n = n + excluded.n, score_sum = score_sum + excluded.score_sum,"
+                    " score_n = score_n + excluded.score_n",
+                    rollups,
+                )
+                self._conn.executemany(
+                    "INSERT INTO score_counts (department, score, n) VALUES (?, ?, ?)"
+                    " ON CONFLICT (department, score) DO UPDATE SET n = n + excluded.n",
+                    score_counts,
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+        logger.info(
+            "分析ストアに取り込みました: 行数=%d, 日付なし=%d, ロールアップ行=%d, sec=%.2f",
+            len(rows), int(rows["date"].isna().sum()), len(rollups), time.perf_counter() - t0,
+        )
+        return len(rows)
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    @staticmethod
+    def _where(
+        period: str,
+        dept: Optional[str],
+        start: Optional[str],
+        end: Optional[str],
+        dated_only: bool = False,
+    ) -> Tuple[str, List[object]]:
+        clauses, params = ["period = ?"], [period]
+        if dept is not None:
+            clauses.append("department = ?")
+            params.append(dept)
+        if dated_only or start is not None or end is not None:
+            clauses.append("bucket <> ?")
+            params.append(NO_DATE)
+        if start is not None:
+            clauses.append("bucket >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("bucket <= ?")
+            params.append(end)
+        return " AND ".join(clauses), params
+
+    def _query(self, sql: str, params: Sequence[object]) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def n_rows(self) -> int:
+        return self._query("SELECT COALESCE(SUM(n), 0) FROM rollups WHERE period = 'month'", ())[0][0]
+
+    def dept_counts(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.Series:
+        # 期間指定がなければ月次（件数が最も少ない）ロールアップから集計する
+        where, params = self._where("day" if start or end else "month", None, start, end)
+        rows = self._query(
+            f"SELECT department, SUM(n) FROM rollups WHERE {where} GROUP BY department ORDER BY 2 DESC, 1", params
+        )
+        return pd.Series(
+            [n for _, n in rows],
+            index=pd.Index([d for d, _ in rows], name=DEPT_COL),
+            name="count",
+            dtype="int64",
+        )
+
+    def pivot_dept_sentiment(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        where, params = self._where("day" if start or end else "month", None, start, end)
+        rows = self._query(
+            f"SELECT department, sentiment, SUM(n) FROM rollups WHERE {where} GROUP BY department, sentiment", params
+        )
+        if not rows:
+            return pd.DataFrame()
+        return order_label_columns(
+            pd.DataFrame(rows, columns=[DEPT_COL, PRED_LABEL_COL, "n"])
+            .pivot(index=DEPT_COL, columns=PRED_LABEL_COL, values="n")
+            .fillna(0)
+            .astype("int64")
+            .sort_index(axis=0)
+        )
+
+    def score_hist(self, dept: Optional[str] = None):
+        """Histogram arrays (counts, bin_edges) over the fixed analytics.score_edges, read from score_counts."""
+        sql = "SELECT score, SUM(n) FROM score_counts"
+        params: List[object] = []
+        if dept is not None:
+            sql += " WHERE department = ?"
+            params.append(dept)
+        rows = self._query(sql + " GROUP BY score", params)
+        if not rows:
+            logger.info("スコアが空のため、ヒストグラムをスキップします")
+            return np.array([]), np.array([])
+        edges = score_edges()
+        values = np.array([v for v, _ in rows], dtype=np.float64)
+        weights = np.array([n for _, n in rows], dtype=np.int64)
+        counts, _ = np.histogram(values, bins=edges, weights=weights)
+        counts = counts.astype(np.int64)
+        out = int(weights.sum() - counts.sum())
+        if out:
+            logger.warning(
+                "範囲外のスコアはヒストグラムに含めません: 件数=%d, 範囲=[%g, %g]", out, edges[0], edges[-1],
+            )
+        return counts, edges
+
+    def sentiment_trend(
+        self,
+        period: str = "month",
+        dept: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Sentiment counts and mean satisfaction score per period bucket.
+
+        Index: bucket start date; columns: one per label, "n" (all rows) and
+        "mean_score" (NaN where no scores). Read from the rollups only.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period: {period} (choose from {', '.join(PERIODS)})")
+        where, params = self._where(period, dept, start, end, dated_only=True)
+        rows = self._query(
+            f"SELECT bucket, sentiment, SUM(n), SUM(score_sum), SUM(score_n) FROM rollups"
+            f" WHERE {where} GROUP BY bucket, sentiment",
+            params,
+        )
+        return trend_frame(pd.DataFrame(rows, columns=["bucket", PRED_LABEL_COL, "n", "score_sum", "score_n"]))
+
+    def stats(self) -> Dict[str, object]:
+        rows = self._query("SELECT MIN(date), MAX(date), COUNT(*) FROM feedback", ())
+        first, last, n = rows[0]
+        return {"path": self.path, "rows": n, "first_date": first, "last_date": last}
+
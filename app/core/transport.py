@@ -0,0 +1,177 @@
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+# /predict・/predict/stream のバイナリ形式（Arrow IPC ストリーム）
+# リクエスト: text / dept（文字列）
+# レスポンス: label（int8 インデックスの辞書エンコード）/ score（float32、未計算は null）
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+COMPRESSIONS = ("none", "lz4", "zstd")
+
+REQUEST_SCHEMA = pa.schema([("text", pa.string()), ("dept", pa.string())])
+RESPONSE_SCHEMA = pa.schema([
+    ("label", pa.dictionary(pa.int8(), pa.string())),
+    ("score", pa.float32()),
+])
+
+
+def wants_arrow(accept: Optional[str]) -> bool:
+    return bool(accept) and ARROW_STREAM in accept
+
+
+def is_arrow(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip() == ARROW_STREAM
+
+
+class ArrowStreamEncoder:
+    """
+    Incremental Arrow IPC stream writer.
+
+    Each write() returns the bytes produced for that batch (the schema is
+    prepended to the first one), so batches can be sent as soon as they are
+    ready; close() returns the end-of-stream marker.
+
+    Errors raised after the response has started are sent as an empty batch
+    whose custom metadata carries {"error": message}.
+    """
+
+    def __init__(self, schema: pa.Schema, compression: str = "none"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression} (choose from {', '.join(COMPRESSIONS)})")
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(
+            self._sink,
+            schema,
+            options=pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression),
+        )
+
+    def _take(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def write(self, batch: pa.RecordBatch, custom_metadata: Optional[Dict[str, str]] = None) -> bytes:
+        self._writer.write_batch(batch, custom_metadata=custom_metadata)
+        return self._take()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._take()
+
+
+def request_batch(texts: List[str], depts: List[str]) -> pa.RecordBatch:
+    return pa.record_batch(
+        [pa.array(texts, pa.string()), pa.array(depts, pa.string())], schema=REQUEST_SCHEMA
+    )
+
+
+def response_batch(labels: List[str], scores: List[Optional[float]]) -> pa.RecordBatch:
+    return pa.record_batch(
+        [
+            pa.array(labels, pa.string()).dictionary_encode().cast(RESPONSE_SCHEMA.field("label").type),
+            pa.array(scores, pa.float32()),
+        ],
+        schema=RESPONSE_SCHEMA,
+    )
+
+
+def encode_request(texts: List[str], depts: List[str], compression: str = "none") -> bytes:
+    enc = ArrowStreamEncoder(REQUEST_SCHEMA, compression)
+    return enc.write(request_batch(texts, depts)) + enc.close()
+
+
+def encode_response(labels: List[str], scores: List[float], compression: str = "none") -> bytes:
+    enc = ArrowStreamEncoder(RESPONSE_SCHEMA, compression)
+    return enc.write(response_batch(labels, scores)) + enc.close()
+
+
+def _strings(col: pa.Array) -> List[str]:
+    # to_pylist() より高速（NumPy の object 配列経由）。null は "" にする
+    if col.null_count:
+        col = col.fill_null("")
+    return col.to_numpy(zero_copy_only=False).tolist()
+
+
+def _labels(col: pa.DictionaryArray) -> List[str]:
+    # 辞書（数種類のラベル）をインデックスで展開する
+    values = np.asarray(col.dictionary.to_pylist(), dtype=object)
+    return values[col.indices.to_numpy(zero_copy_only=False)].tolist()
+
+
+def iter_request_batches(source) -> Iterator[Tuple[List[str], List[str]]]:
+    """
+    Read (texts, depts) per record batch from bytes or a binary file object.
+
+    The dept column is optional; missing and null values become "".
+    """
+    reader = pa.ipc.open_stream(pa.BufferReader(source) if isinstance(source, (bytes, bytearray)) else source)
+    has_dept = "dept" in reader.schema.names
+    for batch in reader:
+        texts = _strings(batch.column("text"))
+        if has_dept:
+            depts = _strings(batch.column("dept"))
+        else:
+            depts = [""] * len(texts)
+        yield texts, depts
+
+
+def decode_request(data: bytes) -> Tuple[List[str], List[str]]:
+    texts: List[str] = []
+    depts: List[str] = []
+    for ts, ds in iter_request_batches(data):
+        texts.extend(ts)
+        depts.extend(ds)
+    return texts, depts
+
+
+def iter_response_batches(source) -> Iterator[Tuple[List[str], List[float]]]:
+    """
+    Read (labels, scores) per record batch from bytes or a binary file object.
+
+    Raises ValueError when the server reported an error mid-stream.
+    """
+    reader = pa.ipc.open_stream(pa.BufferReader(source) if isinstance(source, (bytes, bytearray)) else source)
+    while True:
+        try:
+            batch, meta = reader.read_next_batch_with_custom_metadata()
+        except StopIteration:
+            return
+        if meta is not None and b"error" in meta:
+            raise ValueError(meta[b"error"].decode("utf-8"))
+        score = batch.column("score")
+        # rules_first で推論を省略した行は null（None）のまま返す
+        scores = score.to_pylist() if score.null_count else score.to_numpy().tolist()
+        yield _labels(batch.column("label")), scores
+
+
+def decode_response(data: bytes) -> Tuple[List[str], List[float]]:
+    labels: List[str] = []
+    scores: List[float] = []
+    for ls, ss in iter_response_batches(data):
+        labels.extend(ls)
+        scores.extend(ss)
+    return labels, scores
+
+
+def iter_request_stream(
+    texts: Iterable[str],
+    depts: Iterable[str],
+    rows_per_batch: int = 2048,
+    compression: str = "none",
+) -> Iterator[bytes]:
+    """Encode rows as an Arrow IPC stream, yielded per record batch (chunked upload)."""
+    enc = ArrowStreamEncoder(REQUEST_SCHEMA, compression)
+    ts: List[str] = []
+    ds: List[str] = []
+    for t, d in zip(texts, depts):
+        ts.append(t)
+        ds.append(d)
+        if len(ts) >= rows_per_batch:
+            yield enc.write(request_batch(ts, ds))
+            ts, ds = [], []
+    if ts:
+        yield enc.write(request_batch(ts, ds))
+    yield enc.close()
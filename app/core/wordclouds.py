@@ -1,9 +1,13 @@
 import logging
+import multiprocessing as mp
 import os
 import re
-from typing import List, Optional
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List, Mapping, Optional, Tuple, Union
 
-from wordcloud import WordCloud
+from wordcloud import STOPWORDS, WordCloud
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +21,9 @@ except Exception as e:
     _FUGASHI_OK = False
     logger.warning("fugashiの初期化に失敗しました。ワードクラウドの分かち書きが無効になります: %s", e)
 
+# WordCloud.generate と同じく、大文字小文字を区別せずに除外する
+_STOPWORDS = frozenset(w.lower() for w in STOPWORDS)
+
 # Font candidates (Docker-friendly)
 FONT_CANDIDATES = [
     "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
@@ -33,8 +40,7 @@ def resolve_font_path(custom_font_path: Optional[str] = None) -> Optional[str]:
     logger.warning("日本語フォントが見つかりません。文字化けする可能性があります。")
     return None
 
-def tokenize_ja(text: str) -> List[str]:
-    """Tokenize Japanese text using fugashi. If unavailable, fallback to simple split."""
+def _tokenize_with(tagger, text: str) -> List[str]:
     t = (text or "").strip()
     t = re.sub(r"\s+", " ", t)
 
@@ -42,9 +48,9 @@ def tokenize_ja(text: str) -> List[str]:
         return []
 
     # If fugashi is available
-    if _FUGASHI_OK and _tagger is not None:
+    if tagger is not None:
         words = []
-        for w in _tagger(t):
+        for w in tagger(t):
             pos = getattr(w.feature, "pos1", None) or w.feature.pos1
             if pos in ("名詞", "形容詞", "動詞"):
                 surface = w.surface
@@ -56,6 +62,91 @@ def tokenize_ja(text: str) -> List[str]:
     # Note: Japanese text often has no spaces, so this is mostly for safety.
     return [x for x in t.split(" ") if len(x) >= 2]
 
+def tokenize_ja(text: str) -> List[str]:
+    """Tokenize Japanese text using fugashi. If unavailable, fallback to simple split."""
+    return _tokenize_with(_tagger if _FUGASHI_OK else None, text)
+
+@lru_cache(maxsize=100_000)
+def _tokenize_cached(text: str) -> Tuple[str, ...]:
+    return tuple(tokenize_ja(text))
+
+# Per-worker tagger for the process pool
+_worker_tagger = None
+
+def _init_worker() -> None:
+    global _worker_tagger
+    if _FUGASHI_OK:
+        _worker_tagger = Tagger()
+
+def _tokenize_in_worker(texts: List[str]) -> List[List[str]]:
+    return [_tokenize_with(_worker_tagger, t) for t in texts]
+
+def token_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Process pool for count_tokens, with one fugashi tagger per worker.
+
+    Workers are spawned rather than forked, so the pool is safe to start
+    from a multithreaded process such as the API, which also holds the model.
+    Processes start on first use. Create one pool per run and pass it to
+    every count_tokens call.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+def _count_parallel(pool: Executor, unique: List[str], counts: Counter, chunk: int) -> Counter:
+    freq: Counter = Counter()
+    parts = [unique[i:i+chunk] for i in range(0, len(unique), chunk)]
+    for part, tokens_list in zip(parts, pool.map(_tokenize_in_worker, parts)):
+        for text, tokens in zip(part, tokens_list):
+            n = counts[text]
+            for tok in tokens:
+                freq[tok] += n
+    return freq
+
+def count_tokens(
+    texts: Iterable[str],
+    workers: Optional[int] = None,
+    min_parallel: int = 2000,
+    chunk: int = 500,
+    pool: Optional[Executor] = None,
+) -> Counter:
+    """
+    Token frequencies over `texts` (a Series or any iterable of str).
+
+    Repeated texts are tokenized once and weighted by their count. When there
+    are at least `min_parallel` unique texts, fugashi runs on `pool` (see
+    token_pool), or on a pool of `workers` processes created for this call.
+    Counters from different chunks can be merged with `+=`.
+    """
+    if hasattr(texts, "fillna"):
+        texts = texts.fillna("").astype(str)
+    counts = Counter(texts)
+    unique = list(counts)
+
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    parallel = len(unique) >= min_parallel and (pool is not None or workers > 1)
+
+    if parallel and pool is not None:
+        freq = _count_parallel(pool, unique, counts, chunk)
+    elif parallel:
+        with token_pool(workers) as own:
+            freq = _count_parallel(own, unique, counts, chunk)
+    else:
+        freq = Counter()
+        for text in unique:
+            n = counts[text]
+            for tok in _tokenize_cached(text):
+                freq[tok] += n
+
+    logger.info(
+        "トークン集計完了: 行数=%d, ユニーク文=%d, 語彙数=%d, 並列=%s",
+        sum(counts.values()), len(unique), len(freq), "あり" if parallel else "なし",
+    )
+    return freq
+
 def make_wc_text(series) -> str:
     tokens: List[str] = []
     for t in series.fillna("").astype(str).tolist():
@@ -63,15 +154,25 @@ def make_wc_text(series) -> str:
     return " ".join(tokens)
 
 def build_wordcloud(
-    wc_text: str,
+    freqs: Union[Mapping[str, int], str],
     font_path: Optional[str] = None,
     width: int = 1000,
     height: int = 600,
     background_color: str = "white"
 ) -> Optional[WordCloud]:
-    """Build WordCloud. Return None if text is empty."""
-    wc_text = (wc_text or "").strip()
-    if not wc_text:
+    """
+    Build WordCloud from token frequencies (or space-joined text). Return None if empty.
+
+    Numeric tokens and WordCloud's STOPWORDS are dropped first, as
+    WordCloud.generate does for text (generate_from_frequencies does not).
+    """
+    if isinstance(freqs, str):
+        freqs = Counter(freqs.split())
+    freqs = {
+        w: c for w, c in freqs.items()
+        if w and c > 0 and not w.isdigit() and w.lower() not in _STOPWORDS
+    }
+    if not freqs:
         logger.info("ワードクラウド生成をスキップします（トークンが空です）")
         return None
 
@@ -82,7 +183,7 @@ def build_wordcloud(
         height=height,
         background_color=background_color,
         collocations=False
-    ).generate(wc_text)
+    ).generate_from_frequencies(freqs)
 
-    logger.info("ワードクラウド生成完了: chars=%d, font=%s", len(wc_text), fp or "None")
+    logger.info("ワードクラウド生成完了: 語彙数=%d, font=%s", len(freqs), fp or "None")
     return wc
@@ -0,0 +1,293 @@
+import json
+import logging
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+from app.core.transport import ARROW_STREAM, decode_response, iter_request_stream, iter_response_batches
+
+logger = logging.getLogger(__name__)
+
+
+def _ndjson_body(texts: Iterable[str], depts: Iterable[str], flush_bytes: int = 64 * 1024) -> Iterator[bytes]:
+    """Encode rows as NDJSON, yielded in ~flush_bytes pieces (chunked upload)."""
+    buf: List[bytes] = []
+    size = 0
+    for t, d in zip(texts, depts):
+        line = (json.dumps({"text": t, "dept": d}, ensure_ascii=False) + "\n").encode("utf-8")
+        buf.append(line)
+        size += len(line)
+        if size >= flush_bytes:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def iter_predict_stream(
+    api_url: str,
+    texts: Iterable[str],
+    depts: Iterable[str],
+    use_dept_rules: bool,
+    chunk_size: int = 256,
+    timeout: Tuple[float, float] = (10, 300),
+    fmt: str = "arrow",
+    compression: str = "none",
+    rules_first: bool = False,
+) -> Iterator[Tuple[int, List[str], List[Optional[float]]]]:
+    """
+    Call POST /predict/stream and yield (offset, labels, scores) per chunk.
+
+    The body is sent with chunked transfer encoding and the response is read
+    line by line, so neither side holds the whole corpus as one JSON document.
+    The read timeout applies between chunks, not to the whole call.
+
+    fmt="arrow" (default) exchanges Arrow IPC record batches instead of
+    NDJSON; fmt="ndjson" keeps the JSON wire format. With rules_first=True,
+    rows labelled by rules alone come back with score None.
+    """
+    if fmt == "arrow":
+        yield from _iter_predict_stream_arrow(
+            api_url, texts, depts, use_dept_rules, chunk_size, timeout, compression, rules_first
+        )
+        return
+
+    with requests.post(
+        f"{api_url}/predict/stream",
+        params={
+            "use_dept_rules": str(use_dept_rules).lower(),
+            "chunk_size": chunk_size,
+            "rules_first": str(rules_first).lower(),
+        },
+        data=_ndjson_body(texts, depts),
+        headers={"Content-Type": "application/x-ndjson"},
+        stream=True,
+        timeout=timeout,
+    ) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            obj = json.loads(line)
+            if "error" in obj:
+                logger.error("ストリーミング推論エラー: offset=%d, detail=%s", obj["offset"], obj["error"])
+                raise requests.RequestException(obj["error"])
+            yield obj["offset"], obj["labels"], obj["scores"]
+
+
+def _iter_predict_stream_arrow(
+    api_url: str,
+    texts: Iterable[str],
+    depts: Iterable[str],
+    use_dept_rules: bool,
+    chunk_size: int,
+    timeout: Tuple[float, float],
+    compression: str,
+    rules_first: bool,
+) -> Iterator[Tuple[int, List[str], List[Optional[float]]]]:
+    with requests.post(
+        f"{api_url}/predict/stream",
+        params={
+            "use_dept_rules": str(use_dept_rules).lower(),
+            "chunk_size": chunk_size,
+            "compression": compression,
+            "rules_first": str(rules_first).lower(),
+        },
+        data=iter_request_stream(texts, depts, compression=compression),
+        headers={"Content-Type": ARROW_STREAM, "Accept": ARROW_STREAM},
+        stream=True,
+        timeout=timeout,
+    ) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        offset = 0
+        try:
+            for labels, scores in iter_response_batches(resp.raw):
+                yield offset, labels, scores
+                offset += len(labels)
+        except ValueError as e:
+            logger.error("ストリーミング推論エラー: offset=%d, detail=%s", offset, e)
+            raise requests.RequestException(str(e)) from e
+
+
+def submit_job(
+    api_url: str,
+    texts: List[str],
+    depts: List[str],
+    use_dept_rules: bool,
+    key: Optional[str] = None,
+    rules_first: bool = False,
+    timeout: Tuple[float, float] = (10, 300),
+) -> Dict[str, object]:
+    """
+    Register a background job (POST /jobs) and return its status.
+
+    The texts are uploaded as Arrow IPC. With `key`, an earlier job that was
+    submitted with the same key (and has not failed) is returned instead of
+    starting over, so a page reload resumes polling the same job.
+    """
+    params = {"use_dept_rules": str(use_dept_rules).lower(), "rules_first": str(rules_first).lower()}
+    if key:
+        params["key"] = key
+    resp = requests.post(
+        f"{api_url}/jobs",
+        params=params,
+        data=iter_request_stream(texts, depts),
+        headers={"Content-Type": ARROW_STREAM},
+        timeout=timeout,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def iter_job_results(
+    api_url: str,
+    job_id: str,
+    poll_interval: float = 0.5,
+    timeout: Tuple[float, float] = (10, 60),
+) -> Iterator[Tuple[Dict[str, object], List[str], List[Optional[float]]]]:
+    """
+    Poll GET /jobs/{id} and yield (job, new labels, new scores) until it finishes.
+
+    Every call fetches only rows after those already received, so partial
+    results arrive while the job runs. Raises requests.RequestException if
+    the job fails or is cancelled.
+    """
+    offset = 0
+    while True:
+        resp = requests.get(f"{api_url}/jobs/{job_id}", timeout=timeout)
+        resp.raise_for_status()
+        job = resp.json()
+
+        labels: List[str] = []
+        scores: List[Optional[float]] = []
+        if job["done"] > offset:
+            resp = requests.get(
+                f"{api_url}/jobs/{job_id}/results",
+                params={"offset": offset},
+                headers={"Accept": ARROW_STREAM},
+                timeout=timeout,
+            )
+            resp.raise_for_status()
+            labels, scores = decode_response(resp.content)
+            offset += len(labels)
+        yield job, labels, scores
+
+        if job["status"] == "done" and offset >= job["done"]:
+            return
+        if job["status"] in ("failed", "cancelled"):
+            logger.error("ジョブが終了しました: id=%s, status=%s, detail=%s", job_id, job["status"], job.get("error"))
+            raise requests.RequestException(f"ジョブ {job_id} は {job['status']} です: {job.get('error', '')}")
+        if not labels:
+            time.sleep(poll_interval)
+
+
+def _raise_for_status(resp: requests.Response) -> None:
+    # 入力の誤り（CSV のカラム不足など）は ValueError として利用者に見せる
+    if resp.status_code == 400:
+        raise ValueError(resp.json().get("detail", resp.text))
+    resp.raise_for_status()
+
+
+def submit_analysis(
+    api_url: str,
+    data: bytes,
+    key: Optional[str] = None,
+    rules_first: bool = False,
+    timeout: Tuple[float, float] = (10, 300),
+) -> Dict[str, object]:
+    """
+    Upload a feedback CSV once to POST /analyze and return the analysis job.
+
+    Cleaning, inference and the dashboard aggregates all run in the API;
+    department rules are enabled when the CSV has a department column.
+    With `key`, an earlier analysis of the same key is returned instead.
+    Raises ValueError when the API rejects the CSV.
+    """
+    params = {"rules_first": str(rules_first).lower()}
+    if key:
+        params["key"] = key
+    resp = requests.post(
+        f"{api_url}/analyze",
+        params=params,
+        data=data,
+        headers={"Content-Type": "text/csv"},
+        timeout=timeout,
+    )
+    _raise_for_status(resp)
+    return resp.json()
+
+
+def iter_analysis(
+    api_url: str,
+    job_id: str,
+    poll_interval: float = 0.5,
+    timeout: Tuple[float, float] = (10, 60),
+) -> Iterator[Dict[str, object]]:
+    """
+    Poll GET /analyze/{id} and yield its status until it is done.
+
+    The last item carries "result" (the aggregates). Raises
+    requests.RequestException if the job fails or is cancelled.
+    """
+    while True:
+        resp = requests.get(f"{api_url}/analyze/{job_id}", timeout=timeout)
+        resp.raise_for_status()
+        job = resp.json()
+        yield job
+        if job["status"] == "done":
+            return
+        if job["status"] in ("failed", "cancelled"):
+            logger.error("分析ジョブが終了しました: id=%s, status=%s, detail=%s", job_id, job["status"], job.get("error"))
+            raise requests.RequestException(f"分析ジョブ {job_id} は {job['status']} です: {job.get('error', '')}")
+        time.sleep(poll_interval)
+
+
+def analysis_frames(result: Dict[str, object]) -> Dict[str, object]:
+    """Aggregates of a finished analysis as pandas objects (same shapes as app.core.analytics)."""
+    return {
+        "dept_counts": pd.Series(**result["dept_counts"], dtype="int64"),
+        "sentiment_counts": pd.Series(**result["sentiment_counts"], dtype="int64"),
+        "pivot_dept_sentiment": pd.DataFrame(**result["pivot_dept_sentiment"]),
+        "score_hist": (result["score_hist"]["counts"], result["score_hist"]["edges"]),
+        "words": dict(result["words"]),
+    }
+
+
+def fetch_rows(
+    api_url: str,
+    job_id: str,
+    offset: int = 0,
+    limit: int = 50,
+    timeout: Tuple[float, float] = (10, 60),
+) -> pd.DataFrame:
+    """One preview page of scored rows (GET /analyze/{id}/rows)."""
+    resp = requests.get(
+        f"{api_url}/analyze/{job_id}/rows", params={"offset": offset, "limit": limit}, timeout=timeout
+    )
+    resp.raise_for_status()
+    page = resp.json()
+    return pd.DataFrame(page["data"], columns=page["columns"], index=range(offset, offset + len(page["data"])))
+
+
+def fetch_csv(api_url: str, job_id: str, timeout: Tuple[float, float] = (10, 300)) -> bytes:
+    """The scored CSV of a finished analysis (GET /analyze/{id}/csv)."""
+    resp = requests.get(f"{api_url}/analyze/{job_id}/csv", timeout=timeout)
+    resp.raise_for_status()
+    return resp.content
+
+
+def fetch_trend(
+    api_url: str,
+    period: str = "month",
+    timeout: Tuple[float, float] = (10, 60),
+) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """Sentiment trend of the API's feedback store (GET /trend) and the store stats."""
+    resp = requests.get(f"{api_url}/trend", params={"period": period}, timeout=timeout)
+    resp.raise_for_status()
+    body = resp.json()
+    df = pd.DataFrame(body["data"], columns=body["columns"], index=pd.to_datetime(body["index"]))
+    df.index.name = "bucket"
+    return df, body["stats"]
@@ -1,5 +1,8 @@
+import hashlib
+import io
 import os
-import pandas as pd
+import threading
+from collections import OrderedDict
 import streamlit as st
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
@@ -9,14 +12,15 @@ import requests
 from app.core.logging_config import setup_logging
 setup_logging()
 
-from app.core.io import load_csv
-from app.core.preprocess import clean_df
-from app.core.config import DEPT_COL, TEXT_COL, SCORE_COL
-from app.core.analytics import dept_counts, pivot_dept_sentiment, score_hist
-from app.core.wordclouds import make_wc_text, build_wordcloud
+from app.core.config import SCORE_COL
+from app.core.wordclouds import build_wordcloud
+from app.ui.api_client import analysis_frames, fetch_csv, fetch_rows, fetch_trend, iter_analysis, submit_analysis
 
 API_URL = os.environ.get("API_URL", "http://localhost:8000")
 
+# 再実行（rerun）をまたいで保持する結果の上限件数
+UI_CACHE_ENTRIES = int(os.environ.get("UI_CACHE_ENTRIES", "32"))
+
 FONT_CANDIDATES = [
     "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
     "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
@@ -35,134 +39,228 @@ logging.info(f"[DEBUG] FONT_PATH={FONT_PATH}")
 logging.info(f"[DEBUG] matplotlib font.family={plt.rcParams.get('font.family')}")
 logging.info(f"[DEBUG] matplotlib font.sans-serif={plt.rcParams.get('font.sans-serif')}")
 
+
+# =========================
+# Rerun-proof result cache
+# =========================
+# API の集計結果・プレビューのページ・グラフ画像を「アップロード内容のハッシュ／ジョブ ID」をキーに LRU で保持する。
+# st.cache_data と異なり取り出し時にコピー（pickle）しないため、再実行はミリ秒で済む。
+# 値は読み取り専用として扱うこと。
+@st.cache_resource
+def _result_cache():
+    return OrderedDict(), threading.Lock()
+
+
+def cached(key: tuple, compute):
+    store, lock = _result_cache()
+    with lock:
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+    value = compute()
+    with lock:
+        store[key] = value
+        while len(store) > UI_CACHE_ENTRIES:
+            store.popitem(last=False)
+    return value
+
+
+def fig_png(fig) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
 st.set_page_config(page_title="AIフィードバック分析", layout="wide")
 st.title("AIフィードバック分析Webアプリ")
 
 uploaded = st.file_uploader("📄 CSVファイルをアップロードしてください（feedback.csv）", type=["csv"])
 use_sample = st.checkbox("サンプルデータを使用（data/feedback.csv）", value=False)
 
-df = None
-original_cols = set()
-
 if uploaded is not None:
-    header_df = pd.read_csv(uploaded, nrows=0)
-    original_cols = set(header_df.columns)
-    uploaded.seek(0)
-    df = load_csv(uploaded)
+    data = uploaded.getvalue()
 
 elif use_sample:
     if os.path.exists("data/feedback.csv"):
-        header_df = pd.read_csv("data/feedback.csv", nrows=0)
-        original_cols = set(header_df.columns)
-        df = load_csv("data/feedback.csv")
+        with open("data/feedback.csv", "rb") as f:
+            data = f.read()
     else:
         st.warning("data/feedback.csv が見つかりません。")
+        st.stop()
 
 else:
     st.info("左上のアップローダーからCSVをアップロードするか、サンプルデータを選択してください。")
     st.stop()
 
-use_dept_rules = (DEPT_COL in original_cols)
+digest = hashlib.sha256(data).hexdigest()
 
-df = clean_df(df)
+# 前処理・推論・集計はすべて API 側（/analyze）で行い、UI は集計結果とプレビューの 1 ページだけを受け取る
+PREVIEW_ROWS = 50
 
-# FastAPIで推論
-texts = df[TEXT_COL].fillna("").astype(str).tolist()
-depts = df[DEPT_COL].fillna("").astype(str).tolist()
+st.subheader("プレビュー")
+preview = st.empty()
+
+
+def analyze() -> dict:
+    progress = st.progress(0.0, text="分析ジョブを登録中…")
+    shown = False
+
+    # 同じ内容のアップロードは API 側で同じジョブを返すため、ページを再読み込みしても最初からやり直さない
+    job = submit_analysis(API_URL, data, key=f"analyze:{digest}")
+    for job in iter_analysis(API_URL, job["job_id"]):
+        done, total = job["done"], max(job["total"], 1)
+        if job["stage"] == "queued":
+            text = "分析ジョブの開始を待っています…"
+        elif job["stage"] == "aggregating":
+            text = "集計中…"
+        else:
+            eta = job.get("eta_seconds")
+            text = f"感情分析を実行中…（{done}/{job['total']} 件" + (f"、残り約 {eta:.0f} 秒）" if eta else "）")
+        progress.progress(min(done / total, 1.0), text=text)
+        if not shown and done:
+            preview.dataframe(fetch_rows(API_URL, job["job_id"], 0, PREVIEW_ROWS))
+            shown = True
+    progress.empty()
+    return {"job_id": job["job_id"], "rows": job["result"]["rows"], **analysis_frames(job["result"])}
 
-payload = {
-    "texts": texts,
-    "depts": depts,
-    "use_dept_rules": use_dept_rules,
-}
 
 try:
-    with st.spinner("感情分析を実行中…（API推論）"):
-        resp = requests.post(f"{API_URL}/predict", json=payload, timeout=300)
-        resp.raise_for_status()
-        out = resp.json()
+    result = cached(("analysis", digest), analyze)
+except ValueError as e:
+    st.error(f"CSVを読み込めませんでした。\n\n詳細: {e}")
+    st.stop()
 except requests.RequestException as e:
     st.error(f"推論APIへの接続に失敗しました。API_URL={API_URL}\n\n詳細: {e}")
     st.stop()
 
-labels = out.get("labels", [])
-scores = out.get("scores", [])
+job_id = result["job_id"]
+n_pages = max((result["rows"] + PREVIEW_ROWS - 1) // PREVIEW_ROWS, 1)
+page = st.number_input(f"ページ（全 {n_pages} ページ・{result['rows']:,} 行）", min_value=1, max_value=n_pages, value=1)
+preview.dataframe(cached(("rows", job_id, page), lambda: fetch_rows(API_URL, job_id, (page - 1) * PREVIEW_ROWS, PREVIEW_ROWS)))
+key = (job_id,)
 
-df["sentiment_pred"] = labels
-df["sentiment_score_pred"] = scores
 
-st.subheader("プレビュー")
-st.dataframe(df.head(50))
+def dept_counts_png() -> bytes:
+    counts = result["dept_counts"]
+    fig, ax = plt.subplots()
+    counts.plot(kind="bar", ax=ax)
+    ax.set_xlabel("department")
+    ax.set_ylabel("count")
+    return fig_png(fig)
+
+
+def score_hist_png():
+    counts_h, edges = result["score_hist"]
+    if len(counts_h) == 0:
+        return None
+    fig, ax = plt.subplots()
+    ax.bar(edges[:-1], counts_h, width=(edges[1] - edges[0]), align="edge")
+    ax.set_xlabel(SCORE_COL)
+    ax.set_ylabel("count")
+    return fig_png(fig)
+
+
+def sentiment_pngs():
+    # 出現しなかったラベル（0 件）は除く
+    sent_counts = result["sentiment_counts"].loc[lambda s: s > 0]
+
+    fig, ax = plt.subplots()
+    sent_counts.plot(kind="bar", ax=ax)
+    ax.set_xlabel("sentiment")
+    ax.set_ylabel("count")
+    bar = fig_png(fig)
+
+    fig, ax = plt.subplots()
+    sent_counts.plot(kind="pie", autopct="%1.1f%%", ax=ax)
+    ax.set_ylabel("")
+    return bar, fig_png(fig)
+
+
+def pivot_png():
+    pv = result["pivot_dept_sentiment"]
+    if pv.empty:
+        return None
+    fig, ax = plt.subplots()
+    pv.plot(kind="bar", stacked=True, ax=ax)
+    ax.set_xlabel("department")
+    ax.set_ylabel("count")
+    return fig_png(fig)
+
+
+def wordcloud_png():
+    wc = build_wordcloud(result["words"], font_path=FONT_PATH)
+    if wc is None:
+        return None
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.imshow(wc)
+    ax.axis("off")
+    return fig_png(fig)
+
 
 # Charts
 col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("部署別件数")
-    counts = dept_counts(df)
-    fig, ax = plt.subplots()
-    counts.plot(kind="bar", ax=ax)
-    ax.set_xlabel("department")
-    ax.set_ylabel("count")
-    st.pyplot(fig)
+    st.image(cached(("dept_counts",) + key, dept_counts_png))
 
 with col2:
     st.subheader("スコア分布")
-    counts_h, edges = score_hist(df, bins=5)
-    if len(counts_h) == 0:
+    png = cached(("score_hist",) + key, score_hist_png)
+    if png is None:
         st.info("satisfaction_score がないため、スコア分布は表示しません。")
     else:
-        fig, ax = plt.subplots()
-        ax.bar(edges[:-1], counts_h, width=(edges[1] - edges[0]), align="edge")
-        ax.set_xlabel(SCORE_COL)
-        ax.set_ylabel("count")
-        st.pyplot(fig)
+        st.image(png)
 
 st.subheader("感情分類（全体）")
-sent_counts = df["sentiment_pred"].value_counts()
+bar_png, pie_png = cached(("sentiment",) + key, sentiment_pngs)
 
 c3, c4 = st.columns(2)
 with c3:
-    fig, ax = plt.subplots()
-    sent_counts.plot(kind="bar", ax=ax)
-    ax.set_xlabel("sentiment")
-    ax.set_ylabel("count")
-    st.pyplot(fig)
+    st.image(bar_png)
 
 with c4:
-    fig, ax = plt.subplots()
-    sent_counts.plot(kind="pie", autopct="%1.1f%%", ax=ax)
-    ax.set_ylabel("")
-    st.pyplot(fig)
+    st.image(pie_png)
 
 st.subheader("感情分類（部署別：積み上げ）")
-pv = pivot_dept_sentiment(df, label_col="sentiment_pred", text_col=TEXT_COL)
-if pv.empty:
+png = cached(("pivot",) + key, pivot_png)
+if png is None:
     st.info("部署別集計を作成できません（必要なカラムが不足しています）。")
 else:
-    fig, ax = plt.subplots()
-    pv.plot(kind="bar", stacked=True, ax=ax)
-    ax.set_xlabel("department")
-    ax.set_ylabel("count")
-    st.pyplot(fig)
+    st.image(png)
+
+st.subheader("感情の推移（蓄積データ）")
+period = st.radio("集計単位", ["month", "week", "day"], horizontal=True,
+                  format_func={"day": "日次", "week": "週次", "month": "月次"}.get)
+# API 側の分析ストアのロールアップから集計するため、蓄積件数によらず高速
+trend, stats = fetch_trend(API_URL, period)
+if stats["rows"] == 0:
+    st.info("日付（date）のあるデータがまだ蓄積されていないため、推移は表示しません。")
+else:
+    labels_cols = [c for c in trend.columns if c not in ("n", "mean_score")]
+    t1, t2 = st.columns(2)
+    with t1:
+        st.caption("感情ラベル別件数")
+        st.line_chart(trend[labels_cols])
+    with t2:
+        st.caption(f"{SCORE_COL} の平均")
+        st.line_chart(trend["mean_score"])
+    st.caption(f"蓄積件数: {stats['rows']:,} 件（{stats['first_date']} 〜 {stats['last_date']}）")
 
 st.subheader("ワードクラウド（全体）")
-wc_text = make_wc_text(df[TEXT_COL])
-wc = build_wordcloud(wc_text, font_path=FONT_PATH)
-if wc is None:
+png = cached(("wordcloud",) + key, wordcloud_png)
+if png is None:
     st.info("ワードクラウドを生成できませんでした（有効な単語がありません）。")
 else:
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.imshow(wc)
-    ax.axis("off")
-    st.pyplot(fig)
+    st.image(png)
 
 # Download result CSV
 st.subheader("ダウンロード")
-csv_bytes = df.to_csv(index=False).encode("utf-8-sig")
+# 結果 CSV はボタンが押されたときに API から取得する（UI のキャッシュには保持しない）
 st.download_button(
     "分析結果CSVをダウンロード",
-    data=csv_bytes,
+    data=lambda: fetch_csv(API_URL, job_id),
     file_name="feedback_with_sentiment.csv",
     mime="text/csv",
 )
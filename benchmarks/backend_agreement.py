@@ -0,0 +1,82 @@
+"""
+Compare inference backends against the fp32 torch baseline.
+
+Reports raw/final label agreement, score deltas and throughput for each
+backend on a CSV (default: data/feedback.csv):
+
+    python -m benchmarks.backend_agreement --model-id .cache/tiny-bert
+    python -m benchmarks.backend_agreement --backends torch torch-int8 onnx --repeat 3
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.core.backends import BACKENDS
+from app.core.config import MODEL_ID, TEXT_COL, DEPT_COL
+from app.core.io import load_csv
+from app.core.preprocess import clean_df
+from app.core.rules import apply_rules_batch
+from app.core.sentiment import SentimentService
+
+
+def _run(svc: SentimentService, texts, depts, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        raw, scores = svc.predict_raw(texts, sort_by_length=True)
+        labels = apply_rules_batch(texts, raw, depts, scores, True)
+        best = min(best, time.perf_counter() - t0)
+    return raw, labels, np.asarray(scores, dtype=np.float64), best
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--csv", default="data/feedback.csv")
+    p.add_argument("--model-id", default=MODEL_ID)
+    p.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--out", default=None, help="write results as JSON")
+    args = p.parse_args()
+
+    df = clean_df(load_csv(args.csv))
+    texts = df[TEXT_COL].tolist()
+    depts = df[DEPT_COL].tolist()
+
+    base = SentimentService.create(backend="torch", model_id=args.model_id, use_cache=False)
+    b_raw, b_labels, b_scores, b_sec = _run(base, texts, depts, args.repeat)
+
+    results = []
+    for name in args.backends:
+        if name == "torch":
+            raw, labels, scores, sec = b_raw, b_labels, b_scores, b_sec
+        else:
+            svc = SentimentService.create(backend=name, model_id=args.model_id, use_cache=False)
+            raw, labels, scores, sec = _run(svc, texts, depts, args.repeat)
+        delta = np.abs(scores - b_scores)
+        results.append({
+            "backend": name,
+            "rows": len(texts),
+            "raw_label_agreement": float(np.mean([a == b for a, b in zip(raw, b_raw)])),
+            "label_agreement": float(np.mean([a == b for a, b in zip(labels, b_labels)])),
+            "score_delta_mean": float(delta.mean()),
+            "score_delta_max": float(delta.max()),
+            "rows_per_sec": len(texts) / sec,
+            "speedup": b_sec / sec,
+        })
+
+    print(f"{'backend':<12}{'raw_agree':>10}{'agree':>8}{'Δmean':>10}{'Δmax':>10}{'rows/s':>10}{'speedup':>9}")
+    for r in results:
+        print(
+            f"{r['backend']:<12}{r['raw_label_agreement']:>10.3f}{r['label_agreement']:>8.3f}"
+            f"{r['score_delta_mean']:>10.4f}{r['score_delta_max']:>10.4f}"
+            f"{r['rows_per_sec']:>10.1f}{r['speedup']:>9.2f}"
+        )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark the DataFrame footprint per pipeline stage: load -> clean -> scored.
+
+Runs the real stages (io.load_csv, preprocess.clean_df,
+preprocess.set_predictions with random labels) on a synthetic CSV and
+compares each stage with the previous representation, where every text
+column was an object column of Python str, scores were float64 and the
+labels were plain strings.
+
+    python -m benchmarks.bench_memory --rows 1000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import LABEL_NEG, LABEL_NEU, LABEL_POS
+from app.core.io import load_csv
+from app.core.memory import frame_memory
+from app.core.preprocess import clean_df, set_predictions
+from benchmarks.synth import write_feedback_csv
+
+
+def _legacy(df: pd.DataFrame) -> pd.DataFrame:
+    """Same values in the previous dtypes (object strings, float64)."""
+    out = {}
+    for col, s in df.items():
+        if isinstance(s.dtype, (pd.CategoricalDtype, pd.StringDtype)) or s.dtype == object:
+            out[col] = s.astype(object).where(s.notna(), np.nan)
+        elif s.dtype.kind == "f" or isinstance(s.dtype, pd.Int8Dtype):
+            out[col] = s.astype("float64")
+        else:
+            out[col] = s
+    return pd.DataFrame(out)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_feedback_csv(str(Path(tmp) / "feedback.csv"), args.rows, seed=args.seed)
+
+        t0 = time.perf_counter()
+        loaded = load_csv(path)
+        t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cleaned = clean_df(loaded)
+    t_clean = time.perf_counter() - t0
+
+    rng = np.random.default_rng(args.seed)
+    labels = rng.choice(np.array([LABEL_POS, LABEL_NEG, LABEL_NEU], dtype=object), len(cleaned)).tolist()
+    scores = rng.uniform(0.3, 1.0, len(cleaned)).tolist()
+    t0 = time.perf_counter()
+    scored = set_predictions(cleaned.copy(deep=False), labels, scores)
+    t_scored = time.perf_counter() - t0
+
+    print(f"rows={args.rows}")
+    print(f"{'stage':<8}{'sec':>8}{'MB':>10}{'previous MB':>14}{'ratio':>8}")
+    for stage, df, sec in (("load", loaded, t_load), ("clean", cleaned, t_clean), ("scored", scored, t_scored)):
+        now = frame_memory(df)["total"] / 2**20
+        before = frame_memory(_legacy(df))["total"] / 2**20
+        print(f"{stage:<8}{sec:>8.2f}{now:>10.1f}{before:>14.1f}{now / before:>8.2f}")
+
+    print()
+    print(f"{'column':<24}{'dtype':<16}{'MB':>8}")
+    mem = frame_memory(scored)
+    for col in scored.columns:
+        print(f"{col:<24}{str(scored[col].dtype):<16}{mem[col] / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
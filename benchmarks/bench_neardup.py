@@ -0,0 +1,89 @@
+"""
+Measure near-duplicate collapsing against full inference.
+
+For a sample of rows (default: all of data/feedback.csv) and each Jaccard
+threshold, reports how many texts are inferred (representatives), the
+compression ratio over all rows and over unique texts, the final label
+agreement with full inference (rules applied per row in both) and the
+mean |score delta| on rows whose output was borrowed.
+
+    python -m benchmarks.bench_neardup --model-id .cache/tiny-bert
+    python -m benchmarks.bench_neardup --csv archive.csv --sample 20000 --thresholds 0.9 0.8 0.7
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.core.config import DEPT_COL, MODEL_ID, TEXT_COL
+from app.core.io import load_csv
+from app.core.preprocess import clean_df
+from app.core.sentiment import SentimentService
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--csv", default="data/feedback.csv")
+    p.add_argument("--model-id", default=MODEL_ID)
+    p.add_argument("--backend", default="torch")
+    p.add_argument("--sample", type=int, default=0, help="rows to sample (0 = all)")
+    p.add_argument("--thresholds", type=float, nargs="+", default=[0.9, 0.8, 0.7])
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=None, help="write results as JSON")
+    args = p.parse_args()
+
+    df = clean_df(load_csv(args.csv))
+    if args.sample and args.sample < len(df):
+        df = df.sample(args.sample, random_state=args.seed)
+    texts = df[TEXT_COL].astype(str).tolist()
+    depts = df[DEPT_COL].astype(str).tolist()
+    n_unique = len(set(texts))
+
+    svc = SentimentService.create(backend=args.backend, model_id=args.model_id, use_cache=False)
+    svc.near_dup_threshold = 0.0
+    t0 = time.perf_counter()
+    ref_labels, ref_scores = svc.predict_batch(texts, depts, sort_by_length=True)
+    ref_sec = time.perf_counter() - t0
+    ref_scores = np.asarray(ref_scores, dtype=np.float64)
+
+    results = []
+    for threshold in args.thresholds:
+        svc.near_dup_threshold = threshold
+        t0 = time.perf_counter()
+        labels, scores = svc.predict_batch(texts, depts, sort_by_length=True)
+        sec = time.perf_counter() - t0
+        stats = svc.last_stats
+
+        n_inferred = stats.n_inferred
+        agree = np.mean([a == b for a, b in zip(labels, ref_labels)])
+        borrowed = np.abs(np.asarray(scores, dtype=np.float64) - ref_scores)
+        results.append({
+            "threshold": threshold,
+            "rows": len(texts),
+            "unique": n_unique,
+            "inferred": n_inferred,
+            "compression": round(len(texts) / max(n_inferred, 1), 3),
+            "compression_unique": round(n_unique / max(n_inferred, 1), 3),
+            "near_dup_rows": stats.near_dup,
+            "label_agreement": round(float(agree), 4),
+            "mismatches": int(sum(a != b for a, b in zip(labels, ref_labels))),
+            "mean_abs_score_delta": round(float(borrowed.mean()), 5),
+            "sec": round(sec, 3),
+            "full_sec": round(ref_sec, 3),
+        })
+
+    print(f"{'threshold':>9}{'rows':>8}{'unique':>8}{'inferred':>9}{'x rows':>8}{'x uniq':>8}"
+          f"{'agree':>8}{'mismatch':>9}{'|Δscore|':>10}{'sec':>7}{'full':>7}")
+    for r in results:
+        print(f"{r['threshold']:>9.2f}{r['rows']:>8}{r['unique']:>8}{r['inferred']:>9}{r['compression']:>8.2f}"
+              f"{r['compression_unique']:>8.2f}{r['label_agreement']:>8.2%}{r['mismatches']:>9}"
+              f"{r['mean_abs_score_delta']:>10.4f}{r['sec']:>7.2f}{r['full_sec']:>7.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
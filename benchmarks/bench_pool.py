@@ -0,0 +1,161 @@
+"""
+Scaling benchmark for the inference worker pool (app.api.pool.ModelPool).
+
+Sends the same synthetic texts as small micro-batches (as the API's
+MicroBatcher does under concurrent traffic) first to one in-process
+SentimentService using every core (replicas=0, the default API setup) and
+then to pools of 1..N pinned worker processes. For each setup it reports
+throughput, batch latency percentiles, start-up time and the summed RSS /
+PSS of the workers (PSS shows the memory-mapped weights being shared).
+
+    python -m benchmarks.tiny_model .cache/tiny-bert
+    python -m benchmarks.bench_pool --model-id .cache/tiny-bert --replicas 1 2 4 8
+    python -m benchmarks.bench_pool --texts 4000 --batch 8 --out .cache/bench/pool.json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.api.batching import BatchRequest, predict_group
+from app.api.pool import ModelPool
+from app.core.config import MODEL_ID, TEXT_COL
+from benchmarks.synth import generate_feedback
+
+
+def _memory_mb(pid: int) -> Dict[str, float]:
+    """Rss / Pss of a process from /proc (Linux); zeros elsewhere."""
+    out = {"rss": 0.0, "pss": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    out[key.lower()] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return out
+
+
+def _summary(replicas: int, cores: List[List[int]], n_texts: int, sec: float, latencies: List[float], start_sec: float, mem: Dict[str, float]) -> Dict[str, object]:
+    lat = np.asarray(latencies) * 1000
+    return {
+        "replicas": replicas,
+        "cores": cores,
+        "texts": n_texts,
+        "sec": round(sec, 3),
+        "texts_per_sec": round(n_texts / sec, 1),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "start_sec": round(start_sec, 2),
+        "rss_mb": round(mem["rss"], 1),
+        "pss_mb": round(mem["pss"], 1),
+    }
+
+
+def run_in_process(batches: List[List[BatchRequest]], args) -> Dict[str, object]:
+    from app.core.sentiment import SentimentService
+
+    t0 = time.perf_counter()
+    svc = SentimentService.create(backend=args.backend, model_id=args.model_id, use_cache=False)
+    svc.warmup(args.warmup)
+    start_sec = time.perf_counter() - t0
+
+    # MicroBatcher と同じく 1 バッチずつ順番に推論する
+    latencies = []
+    t0 = time.perf_counter()
+    for batch in batches:
+        t1 = time.perf_counter()
+        predict_group(svc, batch, batch_size=args.batch, max_length=args.max_length)
+        latencies.append(time.perf_counter() - t1)
+    sec = time.perf_counter() - t0
+    n_texts = sum(len(r.texts) for b in batches for r in b)
+    return _summary(0, [sorted(os.sched_getaffinity(0))], n_texts, sec, latencies, start_sec, _memory_mb(os.getpid()))
+
+
+def run_pool(replicas: int, batches: List[List[BatchRequest]], args) -> Dict[str, object]:
+    pool = ModelPool(
+        replicas,
+        backend=args.backend,
+        model_id=args.model_id,
+        use_cache=False,
+        warmup_lengths=args.warmup,
+        cores_per_replica=args.cores_per_replica,
+    )
+    t0 = time.perf_counter()
+    pool.start()
+    start_sec = time.perf_counter() - t0
+    try:
+        # 同時に処理中のバッチ数を concurrency で抑えながら投入する
+        slots = threading.Semaphore(args.concurrency or 2 * replicas)
+        latencies: List[float] = []
+        futures = []
+        t0 = time.perf_counter()
+        for batch in batches:
+            slots.acquire()
+            t1 = time.perf_counter()
+            fut = pool.dispatch(batch, batch_size=args.batch, max_length=args.max_length)
+            fut.add_done_callback(lambda f, t1=t1: (latencies.append(time.perf_counter() - t1), slots.release()))
+            futures.append(fut)
+        for fut in futures:
+            fut.result()
+        sec = time.perf_counter() - t0
+
+        mem = {"rss": 0.0, "pss": 0.0}
+        for r in pool.replicas:
+            for k, v in _memory_mb(r.process.pid).items():
+                mem[k] += v
+    finally:
+        pool.stop()
+    n_texts = sum(len(r.texts) for b in batches for r in b)
+    return _summary(replicas, [r.cores for r in pool.replicas], n_texts, sec, latencies, start_sec, mem)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--model-id", default=MODEL_ID)
+    p.add_argument("--backend", default="torch")
+    p.add_argument("--replicas", type=int, nargs="+", default=None,
+                   help="pool sizes to run (default: 1, 2, 4, ... up to the available cores)")
+    p.add_argument("--cores-per-replica", type=int, default=0, help="0 = split the cores evenly")
+    p.add_argument("--texts", type=int, default=2000)
+    p.add_argument("--batch", type=int, default=16, help="texts per micro-batch")
+    p.add_argument("--concurrency", type=int, default=0, help="micro-batches in flight (0 = 2 x replicas)")
+    p.add_argument("--max-length", type=int, default=256)
+    p.add_argument("--warmup", type=int, nargs="*", default=[16, 64])
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=None, help="write results as JSON")
+    args = p.parse_args()
+
+    n_cores = len(os.sched_getaffinity(0))
+    replicas = args.replicas or [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= n_cores] or [1]
+
+    texts = generate_feedback(args.texts, seed=args.seed, dup_ratio=0.0)[TEXT_COL].astype(str).tolist()
+    batches = [
+        [BatchRequest(texts[i:i + args.batch], [""] * len(texts[i:i + args.batch]), False, True, False)]
+        for i in range(0, len(texts), args.batch)
+    ]
+
+    results = [run_in_process(batches, args)]
+    for n in replicas:
+        results.append(run_pool(n, batches, args))
+
+    base = results[0]["texts_per_sec"]
+    print(f"cores={n_cores}, texts={len(texts)}, batch={args.batch}")
+    print(f"{'replicas':>9}{'texts/s':>10}{'speedup':>9}{'p50 ms':>9}{'p95 ms':>9}{'start s':>9}{'RSS MB':>9}{'PSS MB':>9}")
+    for r in results:
+        name = "in-proc" if r["replicas"] == 0 else str(r["replicas"])
+        print(f"{name:>9}{r['texts_per_sec']:>10.1f}{r['texts_per_sec'] / base:>9.2f}{r['p50_ms']:>9.2f}"
+              f"{r['p95_ms']:>9.2f}{r['start_sec']:>9.2f}{r['rss_mb']:>9.1f}{r['pss_mb']:>9.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"cores": n_cores, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark /predict wire formats: JSON vs Arrow IPC (none / lz4 / zstd).
+
+Measures serialization cost only (no model, no HTTP): the client encoding
+the request, the API decoding it, the API encoding the response and the
+client decoding it, plus payload sizes. Texts come from the synthetic
+survey generator; labels and scores are random.
+
+    python -m benchmarks.bench_transport --rows 1000 10000 100000
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.api.main import PredictRequest, PredictResponse
+from app.core.config import LABEL_NEG, LABEL_NEU, LABEL_POS, TEXT_COL, DEPT_COL
+from app.core.transport import COMPRESSIONS, decode_request, decode_response, encode_request, encode_response
+from benchmarks.synth import generate_feedback
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _json_steps(texts, depts, labels, scores) -> Dict[str, Callable[[], object]]:
+    req = json.dumps({"texts": texts, "depts": depts, "use_dept_rules": True})
+    resp = PredictResponse(labels=labels, scores=scores).model_dump_json()
+    return {
+        "client_encode": lambda: json.dumps({"texts": texts, "depts": depts, "use_dept_rules": True}),
+        "server_decode": lambda: PredictRequest.model_validate_json(req),
+        "server_encode": lambda: PredictResponse(labels=labels, scores=scores).model_dump_json(),
+        "client_decode": lambda: json.loads(resp),
+        "_sizes": (len(req.encode("utf-8")), len(resp.encode("utf-8"))),
+    }
+
+
+def _arrow_steps(texts, depts, labels, scores, compression) -> Dict[str, Callable[[], object]]:
+    req = encode_request(texts, depts, compression)
+    resp = encode_response(labels, scores, compression)
+    return {
+        "client_encode": lambda: encode_request(texts, depts, compression),
+        "server_decode": lambda: decode_request(req),
+        "server_encode": lambda: encode_response(labels, scores, compression),
+        "client_decode": lambda: decode_response(resp),
+        "_sizes": (len(req), len(resp)),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    steps = ("client_encode", "server_decode", "server_encode", "client_decode")
+    print(f"{'rows':>8} {'format':<12}" + "".join(f"{s:>15}" for s in steps) + f"{'total':>10}{'req KB':>10}{'resp KB':>10}")
+    for rows in args.rows:
+        df = generate_feedback(rows, seed=args.seed)
+        texts: List[str] = df[TEXT_COL].tolist()
+        depts: List[str] = df[DEPT_COL].tolist()
+        rng = np.random.default_rng(args.seed)
+        labels = rng.choice(np.array([LABEL_POS, LABEL_NEG, LABEL_NEU], dtype=object), rows).tolist()
+        # モデル出力と同じく float32 で表現できる値にそろえる
+        scores = rng.uniform(0.3, 1.0, rows).astype(np.float32).tolist()
+
+        formats = {"json": _json_steps(texts, depts, labels, scores)}
+        for comp in COMPRESSIONS:
+            formats[f"arrow-{comp}"] = _arrow_steps(texts, depts, labels, scores, comp)
+
+        # 往復で内容が変わらないことを確認
+        for name, fns in formats.items():
+            if name.startswith("arrow"):
+                assert decode_request(encode_request(texts, depts, name.split("-")[1])) == (texts, depts)
+                assert decode_response(encode_response(labels, scores, name.split("-")[1])) == (labels, scores)
+
+        for name, fns in formats.items():
+            secs = [_best_of(fns[s], args.repeat) for s in steps]
+            req_b, resp_b = fns["_sizes"]
+            print(
+                f"{rows:>8} {name:<12}" + "".join(f"{s * 1000:>13.1f}ms" for s in secs)
+                + f"{sum(secs) * 1000:>8.1f}ms{req_b / 1024:>10.0f}{resp_b / 1024:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
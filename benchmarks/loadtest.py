@@ -0,0 +1,274 @@
+"""
+Closed-loop load test of POST /predict (latency percentiles and sustained throughput).
+
+Each of `concurrency` virtual users sends a request, waits for the answer and
+sends the next one. Every concurrency level runs for --duration seconds after
+--warmup seconds that are not recorded. The number of texts per request is
+drawn from a weighted distribution (--sizes SIZE:WEIGHT ...); the texts come
+from the synthetic survey corpus (benchmarks.synth).
+
+Without --url the FastAPI app runs in this process (httpx ASGI transport,
+no network) with a tiny randomly initialised local BERT in place of
+MODEL_ID, built on first use, so the run works offline. With --url an
+already running API is loaded over HTTP; start it on the same stand-in
+model to compare with an in-process baseline:
+
+    python -m benchmarks.loadtest --concurrency 1 8 32 --out .cache/bench/load_baseline.json
+    python -m benchmarks.loadtest --concurrency 1 8 32 --baseline .cache/bench/load_baseline.json
+
+    python -m benchmarks.tiny_model .cache/tiny-bert
+    MODEL_ID=.cache/tiny-bert uvicorn main:app --port 8000 &
+    python -m benchmarks.loadtest --url http://localhost:8000 --sizes 1:70 16:25 256:5
+
+With --baseline, a level whose p50/p95/p99 latency grew, or whose throughput
+fell, by more than --tolerance (or whose error rate rose) is reported and
+the exit code is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+# app.core.config は import 時に環境変数を読むため、app のモジュールは
+# 代替モデルの設定（configure_in_process）が済んでから関数内で import する
+
+# 遅くなると悪化する指標と、下がると悪化する指標
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_KEYS = ("texts_per_sec",)
+
+
+def parse_sizes(specs: List[str]) -> Tuple[List[int], List[float]]:
+    """["1:70", "16:25", "256:5"] -> ([1, 16, 256], [0.7, 0.25, 0.05]); a bare "8" has weight 1."""
+    sizes, weights = [], []
+    for spec in specs:
+        size, _, weight = spec.partition(":")
+        sizes.append(int(size))
+        weights.append(float(weight or 1))
+    if min(sizes) < 1 or min(weights) <= 0:
+        raise ValueError(f"sizes must be >= 1 and weights > 0: {specs}")
+    total = sum(weights)
+    return sizes, [w / total for w in weights]
+
+
+def configure_in_process(model_dir: str) -> None:
+    """Point the in-process app at the stand-in model (before anything from app is imported)."""
+    if "app.core.config" in sys.modules:
+        raise RuntimeError("configure_in_process must run before app.core.config is imported")
+    scratch = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["MODEL_ID"] = model_dir
+    # 同じテキストを繰り返し送るため、推論キャッシュは既定で無効にする
+    os.environ.setdefault("INFERENCE_CACHE", "false")
+    os.environ.setdefault("JOBS_DIR", str(Path(scratch) / "jobs"))
+    os.environ.setdefault("FEEDBACK_STORE_PATH", str(Path(scratch) / "store.sqlite3"))
+
+    from benchmarks.tiny_model import build_tiny_model
+    if not (Path(model_dir) / "config.json").exists():
+        build_tiny_model(model_dir)
+
+
+@asynccontextmanager
+async def in_process_client() -> AsyncIterator[httpx.AsyncClient]:
+    """The API app in this process (see configure_in_process), with its lifespan running."""
+    from app.api.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            yield client
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            r = await client.get("/ready")
+            if r.status_code == 200:
+                return
+            if r.json().get("status") == "failed":
+                raise RuntimeError(f"model failed to load: {r.json().get('error')}")
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"API not ready after {timeout:.0f}s")
+        await asyncio.sleep(0.5)
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, texts: List[str], args) -> Dict[str, object]:
+    sizes, weights = parse_sizes(args.sizes)
+    start = time.perf_counter()
+    record_from = start + args.warmup
+    end = record_from + args.duration
+    latencies: List[float] = []
+    sent_texts: List[int] = []
+    errors = 0
+    last_done = record_from
+
+    async def user(i: int) -> None:
+        nonlocal errors, last_done
+        rng = random.Random(args.seed * 1000 + i)
+        while time.perf_counter() < end:
+            n = rng.choices(sizes, weights)[0]
+            offset = rng.randrange(len(texts))
+            body = {"texts": [texts[(offset + k) % len(texts)] for k in range(n)], "rules_first": args.rules_first}
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/predict", json=body, timeout=args.timeout)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            t1 = time.perf_counter()
+            # ウォームアップ中に送ったリクエストは集計しない
+            if t0 < record_from:
+                continue
+            last_done = max(last_done, t1)
+            if ok:
+                latencies.append(t1 - t0)
+                sent_texts.append(n)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+
+    elapsed = max(last_done - record_from, 1e-9)
+    lat = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    requests = len(latencies) + errors
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 2),
+        "texts_per_sec": round(sum(sent_texts) / elapsed, 1),
+        "mean_texts": round(float(np.mean(sent_texts)), 2) if sent_texts else 0.0,
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "max_ms": round(float(lat.max()), 2),
+    }
+
+
+def compare(results: List[Dict[str, object]], baseline_path: str, tolerance: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["concurrency"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\n{'concurrency':>11}  {'metric':<14}{'baseline':>11}{'current':>11}{'ratio':>8}")
+    for r in results:
+        b = baseline.get(r["concurrency"])
+        if b is None:
+            continue
+        for key in LATENCY_KEYS + THROUGHPUT_KEYS + ("error_rate",):
+            if key == "error_rate":
+                ratio, bad = None, r[key] > b[key]
+            elif key in LATENCY_KEYS:
+                ratio = r[key] / b[key] if b[key] else float("inf")
+                bad = ratio > 1 + tolerance
+            else:
+                ratio = r[key] / b[key] if b[key] else 1.0
+                bad = ratio < 1 - tolerance
+            regressions += bad
+            ratio_s = f"{ratio:>8.2f}" if ratio is not None else " " * 8
+            flag = "  REGRESSION" if bad else ""
+            print(f"{r['concurrency']:>11}  {key:<14}{b[key]:>11}{r[key]:>11}{ratio_s}{flag}")
+    return regressions
+
+
+def _meta(args) -> Dict[str, object]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "target": args.url or f"in-process:{args.model_dir}",
+        "sizes": args.sizes,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "rules_first": args.rules_first,
+    }
+
+
+async def run(args) -> List[Dict[str, object]]:
+    from app.core.config import TEXT_COL
+    from benchmarks.synth import generate_feedback
+
+    texts = generate_feedback(args.corpus, seed=args.seed)[TEXT_COL].astype(str).tolist()
+    if args.url:
+        client_cm = httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_connections=max(args.concurrency)))
+    else:
+        client_cm = in_process_client()
+
+    results = []
+    async with client_cm as client:
+        await wait_ready(client, args.ready_timeout)
+        print(f"{'concurrency':>11}{'requests':>10}{'errors':>8}{'req/s':>9}{'texts/s':>10}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}", flush=True)
+        for c in args.concurrency:
+            r = await run_level(client, c, texts, args)
+            results.append(r)
+            print(f"{r['concurrency']:>11}{r['requests']:>10}{r['errors']:>8}{r['requests_per_sec']:>9.1f}"
+                  f"{r['texts_per_sec']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                  f"{r['max_ms']:>9.2f}", flush=True)
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--url", default=None, help="running API to load (default: the app in-process)")
+    p.add_argument("--model-dir", default=".cache/bench/tiny-bert", help="stand-in model for in-process runs")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="virtual users per level")
+    p.add_argument("--sizes", nargs="+", default=["1:60", "8:30", "64:10"], help="texts per request as SIZE:WEIGHT")
+    p.add_argument("--duration", type=float, default=20.0, help="recorded seconds per level")
+    p.add_argument("--warmup", type=float, default=3.0, help="unrecorded seconds before each level")
+    p.add_argument("--rules-first", action="store_true")
+    p.add_argument("--corpus", type=int, default=5000, help="synthetic texts to draw requests from")
+    p.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (counted as an error)")
+    p.add_argument("--ready-timeout", type=float, default=300.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=".cache/bench/loadtest.json")
+    p.add_argument("--baseline", default=None, help="results JSON of an earlier run to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline (0.2 = 20%%)")
+    args = p.parse_args()
+    parse_sizes(args.sizes)
+    if not args.url:
+        configure_in_process(args.model_dir)
+
+    results = asyncio.run(run(args))
+
+    out = {"meta": _meta(args), "results": results}
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    print(f"\nresults: {args.out}")
+
+    failed = sum(r["errors"] for r in results)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"{regressions} SLO check(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+    elif failed:
+        print(f"{failed} request(s) failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Per-stage benchmark harness (offline, CPU only).
+
+Generates synthetic survey CSVs (benchmarks.synth), builds a tiny local BERT
+(benchmarks.tiny_model) and times each pipeline stage at every size:
+
+    ingest, ingest_chunked, clean, tokenize, inference, rules, analytics, wordcloud
+
+Results are written as JSON; with --baseline, stages slower than the
+baseline by more than --tolerance are reported and the exit code is 1.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --out .cache/bench/current.json
+    python -m benchmarks.run --sizes 1000 10000 --baseline .cache/bench/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.core.analytics import AggregateState, dept_counts, pivot_dept_sentiment, score_hist
+from app.core.config import LABEL_NEG, LABEL_NEU, LABEL_POS, TEXT_COL, DEPT_COL, PRED_LABEL_COL
+from app.core.io import iter_csv, load_csv
+from app.core.preprocess import clean_df
+from app.core.rules import apply_rules_batch
+from app.core.sentiment import SentimentService
+from app.core.wordclouds import build_wordcloud, count_tokens, _tokenize_cached
+from benchmarks.synth import write_feedback_csv
+from benchmarks.tiny_model import build_tiny_model
+
+STAGES = ("ingest", "ingest_chunked", "clean", "tokenize", "inference", "rules", "analytics", "wordcloud")
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _meta() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    import torch
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "commit": commit,
+    }
+
+
+def run_size(rows: int, args, svc: SentimentService) -> List[Dict[str, object]]:
+    path = Path(args.data_dir) / f"feedback_{rows}_s{args.seed}.csv"
+    if not path.exists():
+        write_feedback_csv(str(path), rows, seed=args.seed)
+
+    df = clean_df(load_csv(str(path)))
+    rng = np.random.default_rng(args.seed)
+    raw = rng.choice(np.array([LABEL_POS, LABEL_NEG, LABEL_NEU], dtype=object), rows).tolist()
+    scores = rng.uniform(0.5, 1.0, rows).tolist()
+    texts = df[TEXT_COL].tolist()
+    depts = df[DEPT_COL].tolist()
+    scored = df.assign(**{PRED_LABEL_COL: raw})
+    freqs = count_tokens(df[TEXT_COL], workers=args.workers)
+    infer_rows = min(rows, args.infer_max_rows)
+
+    def tokenize():
+        # メモ化キャッシュを空にしてから計測する（毎回コールドな分かち書き）
+        _tokenize_cached.cache_clear()
+        count_tokens(df[TEXT_COL], workers=args.workers)
+
+    def analytics():
+        AggregateState().update(scored).pivot_dept_sentiment()
+        dept_counts(scored)
+        score_hist(scored)
+        pivot_dept_sentiment(scored, PRED_LABEL_COL, TEXT_COL)
+
+    stages = {
+        "ingest": (rows, lambda: load_csv(str(path))),
+        "ingest_chunked": (rows, lambda: sum(len(c) for c in iter_csv(str(path), chunksize=args.chunksize))),
+        "clean": (rows, lambda: clean_df(df)),
+        "tokenize": (rows, tokenize),
+        "inference": (infer_rows, lambda: svc.predict_batch(
+            texts[:infer_rows], depts[:infer_rows], sort_by_length=True
+        )),
+        "rules": (rows, lambda: apply_rules_batch(texts, raw, depts, scores, True)),
+        "analytics": (rows, analytics),
+        "wordcloud": (rows, lambda: build_wordcloud(freqs, width=400, height=240)),
+    }
+
+    results = []
+    for stage in args.stages:
+        n, fn = stages[stage]
+        sec = _best_of(fn, args.repeat)
+        results.append({"stage": stage, "rows": n, "seconds": sec, "rows_per_sec": n / sec if sec else None})
+        print(f"{stage:<16}{n:>10}{sec:>10.3f}s{n / sec if sec else 0:>14.0f} rows/s", flush=True)
+    return results
+
+
+def compare(results: List[Dict[str, object]], baseline_path: str, tolerance: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["stage"], r["rows"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\n{'stage':<16}{'rows':>10}{'baseline':>11}{'current':>11}{'ratio':>8}")
+    for r in results:
+        b = baseline.get((r["stage"], r["rows"]))
+        if b is None:
+            continue
+        ratio = r["seconds"] / b["seconds"] if b["seconds"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{r['stage']:<16}{r['rows']:>10}{b['seconds']:>10.3f}s{r['seconds']:>10.3f}s{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    p.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", type=int, default=1, help="tokenization processes")
+    p.add_argument("--chunksize", type=int, default=50_000)
+    p.add_argument("--infer-max-rows", type=int, default=5_000, help="cap rows for the inference stage")
+    p.add_argument("--data-dir", default=".cache/bench")
+    p.add_argument("--model-dir", default=".cache/bench/tiny-bert")
+    p.add_argument("--out", default=".cache/bench/results.json")
+    p.add_argument("--baseline", default=None)
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    args = p.parse_args()
+
+    Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+    if not (Path(args.model_dir) / "config.json").exists():
+        build_tiny_model(args.model_dir)
+    svc = SentimentService.create(backend="torch", model_id=args.model_dir, use_cache=False)
+
+    results = []
+    for rows in args.sizes:
+        print(f"\n== rows={rows}")
+        results.extend(run_size(rows, args, svc))
+
+    out = {"meta": _meta(), "results": results}
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    print(f"\nresults: {args.out}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"{regressions} stage(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Synthetic Japanese survey CSV generator modeled on data/feedback.csv.
+
+Answers are drawn from the sample file, then partly re-templated (swapped
+time phrases, products, features) so that the output has the same mix of
+exact duplicates, near-duplicates and unique answers as real exports.
+
+    python -m benchmarks.synth --rows 100000 --out .cache/bench/feedback_100k.csv
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import TEXT_COL, DEPT_COL, DATE_COL, SCORE_COL
+
+SAMPLE_CSV = "data/feedback.csv"
+
+# テンプレート化された回答のバリエーション用の置換候補
+SWAPS = [
+    ("今四半期は", ["今月は", "上期は", "今年度は", "先月は", "今四半期は"]),
+    ("直近のプロジェクト", ["今回のプロジェクト", "前回のプロジェクト", "直近の案件", "直近のプロジェクト"]),
+    ("プロダクトX", ["プロダクトA", "プロダクトB", "サービスZ", "プロダクトX"]),
+    ("新機能Y", ["新機能A", "新機能B", "新画面", "新機能Y"]),
+    ("関係部署", ["他部署", "関連チーム", "協力会社", "関係部署"]),
+]
+
+
+def generate_feedback(
+    rows: int,
+    seed: int = 0,
+    dup_ratio: float = 0.5,
+    empty_ratio: float = 0.01,
+    score_nan_ratio: float = 0.01,
+    sample_csv: str = SAMPLE_CSV,
+) -> pd.DataFrame:
+    """
+    Return a DataFrame with the feedback.csv schema and `rows` rows.
+
+    dup_ratio is the share of rows copied verbatim from the sample answers;
+    the rest are templated variants (a few swapped phrases each).
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(sample_csv, encoding="utf-8-sig")
+
+    idx = rng.integers(0, len(base), rows)
+    texts = base[TEXT_COL].astype(str).to_numpy(dtype=object)[idx]
+
+    templated = rng.random(rows) >= dup_ratio
+    for src, options in SWAPS:
+        picks = rng.integers(0, len(options), rows)
+        for i in np.flatnonzero(templated):
+            t = texts[i]
+            if src in t:
+                texts[i] = t.replace(src, options[picks[i]])
+
+    texts[rng.random(rows) < empty_ratio] = ""
+
+    scores = base[SCORE_COL].to_numpy(dtype=np.float64)[idx]
+    scores[rng.random(rows) < score_nan_ratio] = np.nan
+
+    start = np.datetime64("2022-01-01")
+    dates = pd.to_datetime(start + rng.integers(0, 3 * 365, rows).astype("timedelta64[D]"))
+
+    return pd.DataFrame({
+        "respondent_id": np.arange(1, rows + 1),
+        DEPT_COL: base[DEPT_COL].to_numpy(dtype=object)[idx],
+        DATE_COL: (
+            dates.year.astype(str) + "/" + dates.month.astype(str) + "/" + dates.day.astype(str)
+        ),
+        TEXT_COL: texts,
+        SCORE_COL: pd.array(scores).astype("Int64"),
+        "polarity_label": base["polarity_label"].to_numpy(dtype=object)[idx],
+    })
+
+
+def write_feedback_csv(path: str, rows: int, seed: int = 0, chunk: int = 200_000, **kwargs) -> str:
+    """Write a synthetic CSV in chunks (constant memory for large row counts)."""
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        for i, start in enumerate(range(0, rows, chunk)):
+            df = generate_feedback(min(chunk, rows - start), seed=seed + i, **kwargs)
+            df["respondent_id"] += start
+            df.to_csv(f, index=False, header=(i == 0))
+    return str(out)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--dup-ratio", type=float, default=0.5)
+    p.add_argument("--out", required=True)
+    args = p.parse_args()
+    print(write_feedback_csv(args.out, args.rows, seed=args.seed, dup_ratio=args.dup_ratio))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Build a tiny, randomly initialised BERT classifier for offline runs.
+
+The tokenizer is a character-level WordPiece vocabulary built from the
+characters in data/feedback.csv, so nothing is downloaded. Point MODEL_ID
+at the output directory to run the API, benchmarks or tests against it:
+
+    python -m benchmarks.tiny_model .cache/tiny-bert
+    MODEL_ID=.cache/tiny-bert uvicorn main:app
+"""
+import argparse
+import csv
+import string
+from pathlib import Path
+from typing import Iterable, Optional
+
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizer
+
+from app.core.config import TEXT_COL
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+ID2LABEL = {0: "NEUTRAL", 1: "POSITIVE", 2: "NEGATIVE"}
+
+
+def _corpus_chars(csv_path: str) -> set:
+    chars = set()
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            chars.update(row.get(TEXT_COL) or "")
+    return chars
+
+
+def build_tiny_model(
+    out_dir: str,
+    csv_path: str = "data/feedback.csv",
+    extra_chars: Optional[Iterable[str]] = None,
+    hidden_size: int = 32,
+    num_layers: int = 2,
+    seed: int = 0,
+) -> str:
+    """Write a tiny BERT model + tokenizer to out_dir and return the path."""
+    chars = _corpus_chars(csv_path) if Path(csv_path).exists() else set()
+    chars.update(string.ascii_letters + string.digits + string.punctuation)
+    chars.update("".join(extra_chars or []))
+    chars.discard(" ")
+    chars = sorted(c for c in chars if not c.isspace())
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    vocab = SPECIAL_TOKENS + chars + ["##" + c for c in chars]
+    (out / "vocab.txt").write_text("\n".join(vocab) + "\n", encoding="utf-8")
+
+    tokenizer = BertTokenizer(str(out / "vocab.txt"), do_lower_case=False)
+
+    torch.manual_seed(seed)
+    cfg = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 2,
+        max_position_embeddings=512,
+        num_labels=len(ID2LABEL),
+        id2label=ID2LABEL,
+        label2id={v: k for k, v in ID2LABEL.items()},
+    )
+    model = BertForSequenceClassification(cfg).eval()
+
+    model.save_pretrained(out, safe_serialization=True)
+    tokenizer.save_pretrained(out)
+    return str(out)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("out_dir", nargs="?", default=".cache/tiny-bert")
+    p.add_argument("--csv", default="data/feedback.csv")
+    p.add_argument("--hidden-size", type=int, default=32)
+    p.add_argument("--layers", type=int, default=2)
+    args = p.parse_args()
+    print(build_tiny_model(args.out_dir, args.csv, hidden_size=args.hidden_size, num_layers=args.layers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Shared fixtures. Everything runs offline against the tiny random BERT from
+benchmarks.tiny_model, built once per session.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parents[1]
+
+# app.core.config は import 時に環境変数を読むため、app を import する前に設定する
+_SCRATCH = tempfile.mkdtemp(prefix="feedback-tests-")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("INFERENCE_CACHE_PATH", os.path.join(_SCRATCH, "cache.sqlite3"))
+os.environ.setdefault("JOBS_DIR", os.path.join(_SCRATCH, "jobs"))
+os.environ.setdefault("FEEDBACK_STORE_PATH", os.path.join(_SCRATCH, "store.sqlite3"))
+os.environ.setdefault("ONNX_CACHE_DIR", os.path.join(_SCRATCH, "onnx"))
+os.environ.setdefault("SHARED_WEIGHTS_DIR", os.path.join(_SCRATCH, "shared_weights"))
+os.environ.setdefault("PROFILE_DIR", os.path.join(_SCRATCH, "profiles"))
+
+
+@pytest.fixture(scope="session")
+def feedback_df():
+    """data/feedback.csv, loaded and cleaned as the app does."""
+    from app.core.io import load_csv
+    from app.core.preprocess import clean_df
+    return clean_df(load_csv(str(REPO / "data" / "feedback.csv")))
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory) -> str:
+    from benchmarks.tiny_model import build_tiny_model
+    return build_tiny_model(
+        str(tmp_path_factory.mktemp("tiny-bert")),
+        csv_path=str(REPO / "data" / "feedback.csv"),
+        extra_chars="最高ひどい助かった",
+    )
+
+
+@pytest.fixture(scope="session")
+def svc(tiny_model_dir):
+    """SentimentService on the tiny model, without the inference cache."""
+    from app.core.sentiment import SentimentService
+    return SentimentService.create(backend="torch", model_id=tiny_model_dir, use_cache=False)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.analytics import AggregateState, score_edges
+from app.core.config import SCORE_COL
+
+
+def test_aggregate_score_hist_fixed_bins(feedback_df):
+    state = AggregateState()
+    for start in range(0, len(feedback_df), 7):
+        state.update(feedback_df.iloc[start:start + 7])
+    counts, edges = state.score_hist()
+
+    expected, _ = np.histogram(pd.to_numeric(feedback_df[SCORE_COL], errors="coerce").dropna(), bins=score_edges())
+    np.testing.assert_array_equal(edges, score_edges())
+    np.testing.assert_array_equal(counts, expected)
+    assert counts.sum() == feedback_df[SCORE_COL].notna().sum()
+
+
+def test_aggregate_score_hist_out_of_range_and_merge():
+    a = AggregateState().update(pd.DataFrame({SCORE_COL: [1, 2, 2, 5, 9, -3]}))
+    b = AggregateState().update(pd.DataFrame({SCORE_COL: [3, None, 4.2]}))
+    counts, _ = (a + b).score_hist()
+    assert counts.tolist() == [1, 2, 1, 1, 1]
+    assert (a + b).scores_out == 2
+    # 値の種類が増えてもビン数は変わらない
+    assert len(AggregateState().update(pd.DataFrame({SCORE_COL: np.linspace(1, 5, 10000)})).scores) == 5
+
+    with pytest.raises(ValueError):
+        a.merge(AggregateState(score_edges=score_edges(0, 10)))
+
+
+def test_pivots_agree_on_rows_and_label_order(feedback_df, tmp_path):
+    from app.core.analytics import pivot_dept_sentiment
+    from app.core.config import LABEL_NEG, LABEL_NEU, LABEL_POS
+    from app.core.preprocess import set_predictions
+    from app.core.store import FeedbackStore
+
+    df = feedback_df.copy()
+    # ラベル順（ポジ・ネガ・ニュートラル）と文字コード順が異なることを確かめるため 3 種類とも出す
+    set_predictions(df, [(LABEL_NEU, LABEL_NEG, LABEL_POS)[i % 3] for i in range(len(df))], [0.5] * len(df))
+    expected = pivot_dept_sentiment(df)
+
+    state = AggregateState()
+    for start in range(0, len(df), 11):
+        state.update(df.iloc[start:start + 11])
+    store = FeedbackStore(str(tmp_path / "s.sqlite3"))
+    store.ingest(df)
+
+    assert list(expected.columns) == [LABEL_POS, LABEL_NEG, LABEL_NEU]
+    for pivot in (state.pivot_dept_sentiment(), pivot_dept_sentiment(store)):
+        # 部署・ラベルが categorical かどうかは問わず、値と並び順を比べる
+        pd.testing.assert_frame_equal(
+            pivot, expected,
+            check_index_type=False, check_column_type=False, check_categorical=False, check_names=False,
+        )
@@ -0,0 +1,90 @@
+import random
+
+from app.core.budget import TokenBudget, is_oom
+
+
+def _lengths(n=500, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice([rng.randint(3, 20), rng.randint(50, 256)]) for _ in range(n)]
+
+
+def test_plan_respects_the_token_and_row_caps():
+    lengths = _lengths()
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    budget = TokenBudget(max_tokens=2048, max_rows=64)
+    batches = list(budget.plan(lengths, order, batch_size=32))
+
+    assert [j for b in batches for j in b] == order
+    for b in batches:
+        assert len(b) <= 64
+        assert len(b) == 1 or len(b) * max(lengths[j] for j in b) <= 2048
+
+
+def test_plan_without_budget_is_fixed_batch_size():
+    budget = TokenBudget(max_tokens=0)
+    batches = list(budget.plan([5] * 10, list(range(10)), batch_size=4))
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_plan_keeps_arrival_order_when_unsorted():
+    lengths = _lengths(100)
+    batches = list(TokenBudget(max_tokens=1024).plan(lengths, range(100), batch_size=32))
+    assert [j for b in batches for j in b] == list(range(100))
+
+
+def test_memory_ceiling_limits_rows():
+    budget = TokenBudget(max_tokens=1 << 20, max_rows=10000, memory_bytes=0)
+    unlimited = budget.rows_for(256)
+    budget.memory_bytes = budget.activation_bytes(8, 256)
+    assert budget.rows_for(256) == 8 < unlimited
+
+
+def test_backoff_halves_down_to_the_floor():
+    budget = TokenBudget(max_tokens=2048, min_tokens=256)
+    assert budget.backoff() and budget.max_tokens == 1024
+    assert budget.backoff() and budget.max_tokens == 512
+    assert budget.backoff() and budget.max_tokens == 256
+    assert not budget.backoff() and budget.max_tokens == 256
+    assert not TokenBudget(max_tokens=0).backoff()
+
+
+def test_backoff_applies_to_the_next_planned_batch():
+    lengths = [16] * 400
+    budget = TokenBudget(max_tokens=2048, max_rows=1000)
+    plan = budget.plan(lengths, range(400))
+    assert len(next(plan)) == 128
+    budget.backoff()
+    assert len(next(plan)) == 64
+
+
+def test_budget_recovers_after_successful_batches():
+    budget = TokenBudget(max_tokens=2048, min_tokens=256, recover_after=3)
+    budget.backoff()
+    budget.backoff()
+    assert budget.max_tokens == 512
+    assert not budget.record_success() and not budget.record_success()
+    assert budget.record_success() and budget.max_tokens == 1024
+    # 途中で再び失敗すると連続成功の数え直し
+    budget.record_success()
+    budget.backoff()
+    assert [budget.record_success() for _ in range(3)] == [False, False, True]
+    assert budget.max_tokens == 1024
+    for _ in range(6):
+        budget.record_success()
+    assert budget.max_tokens == budget.ceiling_tokens == 2048
+    assert not TokenBudget(max_tokens=2048, recover_after=0).record_success()
+
+
+def test_explicit_batch_size_caps_rows():
+    lengths = [16] * 400
+    budget = TokenBudget(max_tokens=4096, max_rows=1000)
+    assert len(next(budget.plan(lengths, range(400)))) == 256
+    assert {len(b) for b in budget.plan(lengths, range(400), batch_size=50)} == {50}
+    assert len(next(TokenBudget(max_tokens=0).plan(lengths, range(400)))) == 32
+
+
+def test_is_oom():
+    assert is_oom(MemoryError())
+    assert is_oom(RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB"))
+    assert is_oom(RuntimeError("[enforce fail at alloc_cpu.cpp:114] DefaultCPUAllocator: can't allocate memory"))
+    assert not is_oom(ValueError("shape mismatch"))
@@ -0,0 +1,60 @@
+from app.core import config
+from app.core.cache import InferenceCache, rules_fingerprint
+
+
+def test_key_normalizes_text():
+    cache = InferenceCache(model_id="m")
+    assert cache.key("  良い  ", 256) == cache.key("良い", 256)
+    assert cache.key("良い", 256) != cache.key("悪い", 256)
+
+
+def test_key_changes_with_model_and_max_length():
+    a = InferenceCache(model_id="m1:torch")
+    assert a.key("良い", 256) != a.key("良い", 128)
+    assert a.key("良い", 256) != InferenceCache(model_id="m2:torch").key("良い", 256)
+    assert a.key("良い", 256) != InferenceCache(model_id="m1:onnx").key("良い", 256)
+
+
+def test_key_changes_with_rule_markers(monkeypatch):
+    before = InferenceCache(model_id="m")
+    fp = rules_fingerprint()
+    monkeypatch.setattr(config, "POS_MARKERS_GLOBAL", config.POS_MARKERS_GLOBAL + ["感謝"])
+    assert rules_fingerprint() != fp
+    assert InferenceCache(model_id="m").key("良い", 256) != before.key("良い", 256)
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = InferenceCache(path, model_id="m")
+    key = first.key("良い", 256)
+    first.put_many({key: ("ポジ", 0.9)})
+
+    second = InferenceCache(path, model_id="m")
+    assert second.get_many([key, "missing"]) == {key: ("ポジ", 0.9)}
+    stats = second.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (0, 1, 1)
+    # 2 回目はメモリ側から返る
+    second.get_many([key])
+    assert second.stats()["memory_hits"] == 1
+
+
+def test_memory_tier_is_lru():
+    cache = InferenceCache(memory_entries=2, model_id="m")
+    cache.put_many({"a": ("ポジ", 0.9), "b": ("ネガ", 0.9)})
+    cache.get_many(["a"])
+    cache.put_many({"c": ("ニュートラル", 0.5)})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_disk_eviction_is_shared_between_instances(tmp_path):
+    # 推論ワーカープロセスは同じ SQLite ファイルを共有する
+    path = str(tmp_path / "cache.sqlite3")
+    a = InferenceCache(path, disk_entries=10, model_id="m")
+    b = InferenceCache(path, disk_entries=10, model_id="m")
+    a.put_many({f"a{i}": ("ポジ", 0.9) for i in range(8)})
+    b.put_many({f"b{i}": ("ネガ", 0.9) for i in range(8)})
+    assert a.stats()["disk_entries"] == b.stats()["disk_entries"] == 10
+    assert b.stats()["evictions"] == 6
+
+    fresh = InferenceCache(path, disk_entries=10, model_id="m")
+    assert len(fresh.get_many([f"a{i}" for i in range(8)] + [f"b{i}" for i in range(8)])) == 10
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.api.jobs import DONE, RUNNING, JobManager, JobStore
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    t = threading.Thread(target=loop.run_forever, daemon=True)
+    t.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    t.join()
+    loop.close()
+
+
+def _label(text: str) -> str:
+    return "ポジ" if "良" in text else "ネガ"
+
+
+class FakePredict:
+    """Stands in for MicroBatcher.submit and records every chunk it was given."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, texts, depts, use_dept_rules, rules_first):
+        self.calls.append(list(texts))
+        return [_label(t) for t in texts], [0.9] * len(texts)
+
+
+def _wait_done(store: JobStore, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job["status"] == DONE:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job not done: {store.get(job_id)}")
+
+
+def test_job_runs_in_chunks(tmp_path, loop):
+    store = JobStore(str(tmp_path))
+    predict = FakePredict()
+    manager = JobManager(store, predict, wait_ready=lambda: True, workers=1, chunk_rows=2)
+    manager.start(loop)
+    texts = ["良い", "悪い", "良かった", "普通", "良"]
+    job = manager.submit_texts(texts, [""] * len(texts))
+    job = _wait_done(store, job["id"])
+    manager.stop()
+
+    assert predict.calls == [["良い", "悪い"], ["良かった", "普通"], ["良"]]
+    assert (job["done"], job["chunks_done"], job["total"]) == (5, 3, 5)
+    assert store.results(job["id"]) == ([_label(t) for t in texts], [0.9] * 5)
+    assert store.results(job["id"], offset=1, limit=3)[0] == [_label(t) for t in texts[1:4]]
+
+
+def test_job_resumes_after_the_last_stored_chunk(tmp_path, loop):
+    store = JobStore(str(tmp_path))
+    texts = ["良い", "悪い", "良かった", "普通", "良"]
+
+    # 1 チャンク目を保存した時点でプロセスが終了した状態を作る
+    first = JobManager(store, FakePredict(), wait_ready=lambda: True, workers=0, chunk_rows=2)
+    job = first.submit_texts(texts, [""] * len(texts))
+    store.set_status(job["id"], RUNNING)
+    assert store.add_chunk(job["id"], 0, 0, ["ポジ", "ネガ"], [0.9, 0.9])
+
+    predict = FakePredict()
+    second = JobManager(JobStore(str(tmp_path)), predict, wait_ready=lambda: True, workers=1, chunk_rows=2)
+    second.start(loop)
+    job = _wait_done(second.store, job["id"])
+    second.stop()
+
+    assert predict.calls == [["良かった", "普通"], ["良"]]
+    assert second.store.results(job["id"]) == ([_label(t) for t in texts], [0.9] * 5)
+
+
+def test_cancelled_job_stops_storing_chunks(tmp_path):
+    store = JobStore(str(tmp_path))
+    manager = JobManager(store, FakePredict(), wait_ready=lambda: True, workers=0, chunk_rows=2)
+    job = manager.submit_texts(["a", "b", "c"], ["", "", ""])
+    store.set_status(job["id"], RUNNING)
+    manager.cancel(job["id"])
+    assert not store.add_chunk(job["id"], 0, 0, ["ポジ", "ネガ"], [0.9, 0.9])
+    assert store.results(job["id"]) == ([], [])
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from app.api.batching import BatchRequest
+from app.api.pool import ModelPool
+from app.core.metrics import POOL_REPLICA_FAILED
+
+
+def _wait(predicate, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+def test_pool_stops_restarting_after_repeated_init_failures(tiny_model_dir):
+    failures = []
+    pool = ModelPool(
+        2, backend="torch", model_id=tiny_model_dir, use_cache=False, share_weights=False,
+        restart_backoff=0.01, max_init_failures=2, on_failed=failures.append,
+    )
+    pool.start(timeout=120)
+    try:
+        request = BatchRequest(["助かった"], [""], False, True, False)
+        assert len(pool.dispatch([request]).result(timeout=60)[0][0]) == 1
+
+        # 以降の再起動ではモデルを読み込めないようにしてから、ワーカーを 1 つ落とす
+        pool.options["model_id"] = str(tiny_model_dir) + "-missing"
+        first, second = pool.replicas
+        first.process.kill()
+        _wait(lambda: first.failed)
+
+        # 残りのワーカーが動いている間はプールを failed にしない
+        assert first.init_failures == 2 and first.restarts == 2
+        assert pool.error is None and failures == []
+        info = pool.info()
+        assert info[0]["failed"] is True and info[0]["error"]
+        assert info[1]["failed"] is False and info[1]["up"] is True
+        assert POOL_REPLICA_FAILED.labels("0").state() == 1
+        time.sleep(0.5)
+        assert first.restarts == 2 and not first.process.is_alive()
+        assert len(pool.dispatch([request]).result(timeout=60)[0][0]) == 1
+
+        # すべてのワーカーが停止したらプールを failed にする
+        second.process.kill()
+        _wait(lambda: pool.error is not None)
+        assert second.failed and failures == [pool.error]
+        with pytest.raises(RuntimeError):
+            pool.dispatch([request]).result(timeout=5)
+    finally:
+        pool.stop()
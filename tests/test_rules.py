@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from app.core.config import (
+    DEV_DEPT, EIGYOU_DEPT, LABEL_NEG, LABEL_NEU, LABEL_POS,
+    NEU_MARKERS_DEV, NEU_MARKERS_EIGYOU, NEU_MARKERS_GLOBAL, POS_MARKERS_GLOBAL,
+)
+from app.core.rules import MarkerMatcher, apply_rule_chain, apply_rules_batch, rule_decided_labels
+
+EDGE_TEXTS = ["", "   ", "一部", "おかげで一部完了できました", "概ね満足", "予定通り進行しています", "普通です"]
+
+
+def _random_case(texts, seed):
+    rng = random.Random(seed)
+    labels = [rng.choice([LABEL_POS, LABEL_NEG, LABEL_NEU]) for _ in texts]
+    # TH_LOW / TH_HIGH の前後を多めに含める
+    scores = [rng.choice([rng.random(), rng.uniform(0.7, 0.99)]) for _ in texts]
+    depts = [rng.choice([DEV_DEPT, EIGYOU_DEPT, "人事", ""]) for _ in texts]
+    return labels, scores, depts
+
+
+@pytest.mark.parametrize("use_dept_rules", [False, True])
+def test_apply_rules_batch_matches_rule_chain(feedback_df, use_dept_rules):
+    texts = feedback_df["answer_text"].astype(str).tolist() + EDGE_TEXTS
+    for seed in range(3):
+        labels, scores, depts = _random_case(texts, seed)
+        expected = [apply_rule_chain(t, l, d, s, use_dept_rules) for t, l, d, s in zip(texts, labels, depts, scores)]
+        assert apply_rules_batch(texts, labels, depts, scores, use_dept_rules) == expected
+
+
+def test_apply_rules_batch_empty():
+    assert apply_rules_batch([], [], [], [], True) == []
+
+
+def test_marker_matcher_matches_naive_scan(feedback_df):
+    groups = {1: NEU_MARKERS_GLOBAL, 2: POS_MARKERS_GLOBAL, 4: NEU_MARKERS_DEV, 8: NEU_MARKERS_EIGYOU}
+    matcher = MarkerMatcher(groups)
+    texts = feedback_df["answer_text"].astype(str).tolist() + EDGE_TEXTS
+
+    def naive(t):
+        return sum(bit for bit, markers in groups.items() if any(m in t for m in markers))
+
+    assert [matcher.scan(t) for t in texts] == [naive(t) for t in texts]
+    assert matcher.scan_many(texts).tolist() == [naive(t) for t in texts]
+
+
+def test_marker_matcher_overlapping_and_nested_markers():
+    # "abc" は "ab"（1）と "bc"（2）の両方を含み、"b"（4）は両者に含まれる
+    matcher = MarkerMatcher({1: ["ab"], 2: ["bc"], 4: ["b"]})
+    texts = ["abc", "ab", "xbcx", "b", "", "ac", "abc"]
+    expected = [7, 5, 6, 4, 0, 0, 7]
+    assert [matcher.scan(t) for t in texts] == expected
+    assert matcher.scan_many(texts).tolist() == expected
+
+
+def test_rule_decided_labels_are_independent_of_the_model(feedback_df):
+    texts = feedback_df["answer_text"].astype(str).tolist() + EDGE_TEXTS
+    decided = rule_decided_labels(texts)
+    assert any(d is not None for d in decided)
+    for t, d in zip(texts, decided):
+        if d is None:
+            continue
+        for label in (LABEL_POS, LABEL_NEG, LABEL_NEU):
+            for score in (0.1, 0.8, 0.99):
+                assert apply_rule_chain(t, label, DEV_DEPT, score, True) == d
@@ -0,0 +1,161 @@
+import dataclasses
+
+import pytest
+
+from app.api.batching import BatchRequest, predict_group
+from app.core.cache import InferenceCache
+from app.core.config import LABEL_NEG, LABEL_NEU, LABEL_POS
+from app.core.sentiment import SentimentService
+
+LABELS = {LABEL_POS, LABEL_NEG, LABEL_NEU}
+
+
+@pytest.fixture(scope="module")
+def corpus(feedback_df):
+    # 重複・空テキスト・マーカー語を含む入力
+    texts = feedback_df["answer_text"].astype(str).tolist()[:200]
+    texts = texts + texts[:50] + ["", "   ", "おかげで助かった", "満足"]
+    depts = (feedback_df["department"].astype(str).tolist()[:200] * 2)[:len(texts)]
+    return texts, depts
+
+
+def _variant(svc: SentimentService, **changes) -> SentimentService:
+    return dataclasses.replace(svc, budget=dataclasses.replace(svc.budget, **changes))
+
+
+def test_predict_raw_is_the_same_in_every_batching_mode(svc, corpus):
+    texts, _ = corpus
+    ref_labels, ref_scores = _variant(svc, max_tokens=0).predict_raw(texts, batch_size=16, sort_by_length=False)
+    variants = [
+        (svc, True), (svc, False),
+        (_variant(svc, max_tokens=0), True),
+        (_variant(svc, max_tokens=300, max_rows=7), True),
+    ]
+    for variant, sort_by_length in variants:
+        labels, scores = variant.predict_raw(texts, batch_size=16, sort_by_length=sort_by_length)
+        assert labels == ref_labels
+        assert scores == pytest.approx(ref_scores, abs=1e-5)
+
+
+def test_predict_batch_modes_give_identical_labels(svc, corpus):
+    texts, depts = corpus
+    ref_labels, ref_scores = svc.predict_batch(texts, depts, use_dept_rules=True, sort_by_length=False)
+    assert len(ref_labels) == len(texts) and set(ref_labels) <= LABELS
+
+    for kwargs in ({}, {"sort_by_length": True}, {"rules_first": True}, {"rules_first": True, "sort_by_length": True}):
+        labels, scores = svc.predict_batch(texts, depts, use_dept_rules=True, **kwargs)
+        assert labels == ref_labels
+        if kwargs.get("rules_first"):
+            # ルールで確定した行は推論せず、スコアは None
+            assert scores[-4:] == [None, None, None, None]
+            assert sum(s is None for s in scores) == svc.last_stats.rule_decided
+        else:
+            assert scores == pytest.approx(ref_scores, abs=1e-5)
+
+    labels, _ = _variant(svc, max_tokens=0).predict_batch(texts, depts, use_dept_rules=True, batch_size=8)
+    assert labels == ref_labels
+
+
+def test_sort_by_length_reports_dedup_and_padding(svc, corpus):
+    texts, depts = corpus
+    svc.predict_batch(texts, depts, sort_by_length=False)
+    unsorted = svc.last_stats
+    svc.predict_batch(texts, depts, sort_by_length=True)
+    stats = svc.last_stats
+
+    assert stats.n_rows == len(texts)
+    assert stats.n_inferred == len({t for t in texts if t.strip()})
+    assert stats.dedup_ratio > 0
+    assert stats.padding_ratio < unsorted.padding_ratio
+
+
+def test_predict_group_matches_predict_batch(svc, corpus):
+    texts, depts = corpus
+    requests = [
+        BatchRequest(texts[:100], depts[:100], True, True, False),
+        BatchRequest(texts[100:180], depts[100:180], False, True, True),
+        BatchRequest(texts[180:], depts[180:], True, False, False),
+    ]
+    results = predict_group(svc, requests, batch_size=16)
+    for r, (labels, scores) in zip(requests, results):
+        exp_labels, exp_scores = svc.predict_batch(
+            r.texts, r.depts, use_dept_rules=r.use_dept_rules, rules_first=r.rules_first
+        )
+        assert labels == exp_labels
+        assert [s is None for s in scores] == [s is None for s in exp_scores]
+
+
+def test_predict_group_logs_like_predict_batch(svc, caplog):
+    requests = [
+        BatchRequest(["", "  ", "助かった"], ["", "", ""], False, True, False),
+        BatchRequest(["", "最高でした"], ["", ""], False, True, True),
+    ]
+    with caplog.at_level("INFO", logger="app.core.sentiment"):
+        predict_group(svc, requests)
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(m.startswith("推論完了") and "空テキスト=3(60.0%)" in m for m in messages)
+    assert any(m.startswith("空テキストの割合が高いです: 3/5") for m in messages)
+    assert svc.last_stats.n_rows == 5
+
+
+def test_predict_group_collapses_near_duplicates(svc, corpus):
+    texts, depts = corpus
+    near = dataclasses.replace(svc, near_dup_threshold=0.8)
+    # 句読点だけ違う回答を混ぜる
+    texts = texts + [t.replace("。", "！") for t in texts[:40]]
+    depts = depts + depts[:40]
+    requests = [
+        BatchRequest(texts[:150], depts[:150], True, True, False),
+        BatchRequest(texts[150:], depts[150:], True, True, False),
+    ]
+    results = predict_group(near, requests)
+    assert near.last_stats.near_dup > 0
+
+    exp_labels, _ = near.predict_batch(texts, depts, use_dept_rules=True)
+    assert [label for labels, _ in results for label in labels] == exp_labels
+
+
+def test_cached_service_returns_the_same_results(svc, corpus, tmp_path):
+    texts, depts = corpus
+    cached = dataclasses.replace(svc, cache=InferenceCache(str(tmp_path / "c.sqlite3"), model_id="tiny:torch"))
+    first = cached.predict_batch(texts, depts, use_dept_rules=True)
+    assert cached.last_stats.cache_hits == 0
+    second = cached.predict_batch(texts, depts, use_dept_rules=True)
+    assert second == first
+    assert cached.last_stats.n_inferred == 0
+    assert cached.last_stats.cache_hits == sum(1 for t in texts if t.strip())
+    assert first[0] == svc.predict_batch(texts, depts, use_dept_rules=True)[0]
+
+
+def test_empty_input(svc):
+    assert svc.predict_batch([], []) == ([], [])
+    with pytest.raises(ValueError):
+        svc.predict_batch(["a"], [])
+
+
+@pytest.mark.parametrize("backend", ["torch-int8", "onnx"])
+def test_backends_keep_the_predict_batch_contract(svc, tiny_model_dir, corpus, backend):
+    texts, depts = corpus
+    other = SentimentService.create(backend=backend, model_id=tiny_model_dir, use_cache=False)
+    labels, scores = other.predict_batch(texts, depts, use_dept_rules=True)
+    assert len(labels) == len(scores) == len(texts)
+    assert set(labels) <= LABELS
+    assert all(0.0 <= s <= 1.0 for s in scores)
+
+    if backend == "onnx":
+        # fp32 のままエクスポートしているため、torch とほぼ同じ出力になる
+        ref_raw, ref_scores = svc.predict_raw(texts)
+        raw, raw_scores = other.predict_raw(texts)
+        assert raw == ref_raw
+        assert raw_scores == pytest.approx(ref_scores, abs=1e-4)
+
+
+def test_padding_is_timed_separately_from_tokenization(svc, corpus):
+    from app.core.metrics import STAGE_SECONDS
+
+    texts, depts = corpus
+    before = {stage: STAGE_SECONDS.labels(stage).count for stage in ("tokenize", "pad")}
+    svc.predict_batch(texts, depts, sort_by_length=True)
+    # tokenize はトークナイズ 1 回分、pad はバッチごとに記録される
+    assert STAGE_SECONDS.labels("tokenize").count == before["tokenize"] + 1
+    assert STAGE_SECONDS.labels("pad").count > before["pad"]
@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.config import LABEL_NEG, LABEL_NEU, LABEL_POS
+from app.core.preprocess import set_predictions
+from app.core.store import FeedbackStore
+
+
+@pytest.fixture
+def scored_df(feedback_df):
+    df = feedback_df.copy()
+    labels = [(LABEL_POS, LABEL_NEG, LABEL_NEU)[i % 3] for i in range(len(df))]
+    return set_predictions(df, labels, [0.9] * len(df))
+
+
+def test_ingest_skips_a_source_already_stored(scored_df, tmp_path):
+    store = FeedbackStore(str(tmp_path / "s.sqlite3"))
+    assert store.ingest(scored_df, source="a") == len(scored_df)
+    assert store.ingest(scored_df, source="a") == 0
+    assert store.n_rows() == len(scored_df)
+
+
+def test_concurrent_ingest_of_one_source_stores_it_once(scored_df, tmp_path, monkeypatch):
+    path = str(tmp_path / "s.sqlite3")
+    stores = [FeedbackStore(path) for _ in range(4)]
+    # 事前確認をすり抜けた（同時に走った）場合を再現する
+    monkeypatch.setattr(FeedbackStore, "has_source", lambda self, source: False)
+
+    barrier = threading.Barrier(len(stores))
+    stored, errors = [], []
+
+    def ingest(store):
+        barrier.wait()
+        try:
+            stored.append(store.ingest(scored_df, source="same"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest, args=(s,)) for s in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sorted(stored) == [0, 0, 0, len(scored_df)]
+    assert FeedbackStore(path).n_rows() == len(scored_df)
+
+
+def test_score_hist_matches_aggregate_state(scored_df, tmp_path):
+    from app.core.analytics import AggregateState, score_edges
+    from app.core.config import DEPT_COL
+
+    path = str(tmp_path / "s.sqlite3")
+    store = FeedbackStore(path)
+    store.ingest(scored_df.iloc[:20], source="a")
+    store.ingest(scored_df.iloc[20:], source="b")
+
+    expected = AggregateState().update(scored_df).score_hist()
+    for actual in (store.score_hist(), FeedbackStore(path).score_hist()):
+        np.testing.assert_array_equal(actual[1], score_edges())
+        np.testing.assert_array_equal(actual[0], expected[0])
+
+    dept = scored_df[DEPT_COL].iloc[0]
+    counts, _ = store.score_hist(dept=dept)
+    np.testing.assert_array_equal(counts, AggregateState().update(scored_df[scored_df[DEPT_COL] == dept]).score_hist()[0])
+
+    # score_counts のない既存のストアは、開いたときに行テーブルから作り直す
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE score_counts")
+    np.testing.assert_array_equal(FeedbackStore(path).score_hist()[0], expected[0])
@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+from app.core.transport import (
+    COMPRESSIONS, decode_request, decode_response, encode_request, encode_response,
+    iter_request_batches, iter_request_stream, iter_response_batches, response_batch, ArrowStreamEncoder,
+    RESPONSE_SCHEMA,
+)
+
+TEXTS = ["満足しています", "", "改善してほしい\n2 行目", "😀 emoji", "a" * 5000]
+DEPTS = ["営業", "", "開発", "人事", ""]
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_request_round_trip(compression):
+    assert decode_request(encode_request(TEXTS, DEPTS, compression)) == (TEXTS, DEPTS)
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_response_round_trip(compression):
+    labels = ["ポジ", "ニュートラル", "ネガ", "ポジ", "ネガ"]
+    scores = [0.5, 0.25, 0.75, 1.0, 0.125]      # float32 で正確に表せる値
+    assert decode_response(encode_response(labels, scores, compression)) == (labels, scores)
+
+
+def test_response_keeps_null_scores():
+    labels, scores = decode_response(encode_response(["ポジ", "ネガ"], [None, 0.5]))
+    assert labels == ["ポジ", "ネガ"]
+    assert scores == [None, 0.5]
+
+
+def test_request_stream_is_split_into_record_batches():
+    data = b"".join(iter_request_stream(TEXTS * 3, DEPTS * 3, rows_per_batch=4))
+    batches = list(iter_request_batches(io.BytesIO(data)))
+    assert [len(t) for t, _ in batches] == [4, 4, 4, 3]
+    assert [t for ts, _ in batches for t in ts] == TEXTS * 3
+    assert [d for _, ds in batches for d in ds] == DEPTS * 3
+
+
+def test_error_metadata_is_raised():
+    enc = ArrowStreamEncoder(RESPONSE_SCHEMA)
+    data = enc.write(response_batch(["ポジ"], [0.9]))
+    data += enc.write(response_batch([], []), custom_metadata={"error": "壊れた入力"})
+    data += enc.close()
+    it = iter_response_batches(data)
+    assert next(it)[0] == ["ポジ"]
+    with pytest.raises(ValueError, match="壊れた入力"):
+        next(it)
@@ -0,0 +1,33 @@
+from collections import Counter
+
+import pandas as pd
+from wordcloud import WordCloud
+
+from app.core.wordclouds import build_wordcloud, count_tokens, make_wc_text, token_pool
+
+
+def test_count_tokens_shared_pool_matches_in_process(feedback_df):
+    texts = feedback_df["answer_text"]
+    expected = count_tokens(texts, workers=1)
+    with token_pool(2) as pool:
+        # 同じプールを複数チャンクで使い回しても結果は変わらない
+        merged: Counter = Counter()
+        for part in (texts.iloc[: len(texts) // 2], texts.iloc[len(texts) // 2:]):
+            merged += count_tokens(part, min_parallel=1, chunk=7, pool=pool)
+    assert merged == expected
+
+
+def test_build_wordcloud_matches_generate_on_text(feedback_df):
+    # words_ は上位 max_words 語だけなので、語彙が収まる件数で比べる
+    texts = pd.concat([
+        feedback_df["answer_text"].head(20),
+        pd.Series(["2024年10月の対応は The サポート 10 件", "Support team and the 2024 サポート"] * 3),
+    ], ignore_index=True)
+    freqs = count_tokens(texts, workers=1)
+    assert "2024" in freqs and len(freqs) < 200
+
+    # 以前の make_wc_text + WordCloud.generate と同じ語（数字・ストップワードを除く）になる
+    wc = build_wordcloud(freqs, width=200, height=120)
+    expected = WordCloud(width=200, height=120, collocations=False).generate(make_wc_text(texts))
+    assert wc.words_ == expected.words_
+    assert not any(w.isdigit() or w.lower() == "the" for w in wc.words_)